@@ -4,9 +4,23 @@ from flask_login import LoginManager
 from flask_babel import Babel
 
 from config import Config
-from .modelos import db, Usuario
+from .modelos import db, Usuario, atualizar_esquema
 from .rotas import site_bp
 from .painel_admin import configurar_admin
+from .instrumentacao import configurar_instrumentacao
+from .metricas import configurar_metricas
+from .perfilador import configurar_perfilador
+from .dados_analise import configurar_dados_analise
+from .dominio import configurar_dominio
+from .estatisticas_itens import configurar_estatisticas_itens
+from .irt import configurar_irt
+from .selecao_adaptativa import configurar_selecao_adaptativa
+from .contadores import configurar_contadores
+from .cache_http import configurar_cache_http
+from .formulas import configurar_formulas
+from .imagens import configurar_imagens
+from .estaticos import configurar_estaticos
+from .transporte import configurar_transporte
 
 
 def create_app():
@@ -19,6 +33,20 @@ def create_app():
     Babel(app)
 
     db.init_app(app)
+    configurar_transporte(app)  # primeiro: a compressão roda depois dos outros after_request
+    configurar_instrumentacao(app)
+    configurar_metricas(app)
+    configurar_perfilador(app)
+    configurar_dados_analise(app)
+    configurar_dominio(app)
+    configurar_estatisticas_itens(app)
+    configurar_irt(app)
+    configurar_selecao_adaptativa(app)
+    configurar_contadores(app)
+    configurar_cache_http(app)
+    configurar_formulas(app)
+    configurar_imagens(app)
+    configurar_estaticos(app)
 
     login = LoginManager()
     login.login_view = "site.entrar"
@@ -30,6 +58,7 @@ def create_app():
 
     with app.app_context():
         db.create_all()
+        atualizar_esquema()
 
     app.register_blueprint(site_bp)
     configurar_admin(app)
@@ -0,0 +1,328 @@
+# app/agrupamento.py
+"""
+Grupos (k-means) por turma sem recalcular tudo a cada visita.
+
+Os centróides de cada (turma_id, k) ficam em centroides_turma junto com a
+atribuição de cada aluno (grupo + nº de interações quando foi atribuído).
+A cada consulta, com o snapshot da turma (app/dados_analise.py):
+
+  - dados iguais aos do último cálculo (mesma versao_dados): usa o que está salvo;
+  - alunos novos ou com interações novas: vão para o centróide mais próximo
+    (atribuição online, sem mexer nos demais);
+  - reajuste completo (k-means partindo dos centróides atuais) só quando há
+    drift: inércia média acima de AGRUPAMENTO_LIMIAR_INERCIA em relação ao
+    último ajuste, fração de alunos reatribuídos acima de
+    AGRUPAMENTO_LIMIAR_ALTERADOS, ou mudança no conjunto de tópicos / k efetivo.
+
+Depois de um reajuste, os novos centróides são casados com os antigos
+(algoritmo húngaro sobre a distância entre centróides), para que o "Grupo 2"
+continue sendo o mesmo grupo e cards/gráficos já gerados continuem válidos.
+
+"k automático" (varredura_k): ajusta k=2..AGRUPAMENTO_K_MAX em paralelo
+(ThreadPoolExecutor; o grosso do Lloyd é numpy, que solta o GIL), pontua cada
+k com inércia (cotovelo) e silhueta numa amostra, e guarda a varredura inteira
+por (turma, versão dos dados). Enquanto os dados não mudam, trocar de k na
+tela reaproveita o ajuste da varredura em vez de rodar o k-means de novo.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+from scipy.optimize import linear_sum_assignment
+from sklearn.metrics import silhouette_score
+from sqlalchemy.exc import IntegrityError
+
+from .dados_analise import snapshot_turma
+from .metricas import kmeans_segundos
+from .modelos import db, CentroideTurma
+
+
+def kmeans_np(X: np.ndarray, k: int, iters: int = 60, seed: int = 42,
+              iniciais: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Lloyd vetorizado. Retorna (labels 0..k-1, centróides k x d)."""
+    n = len(X)
+    k = max(1, min(int(k), n))
+    rnd = np.random.default_rng(seed)
+    if iniciais is not None and iniciais.shape == (k, X.shape[1]):
+        C = iniciais.astype(np.float64, copy=True)
+    else:
+        C = X[rnd.choice(n, size=k, replace=False)].astype(np.float64, copy=True)
+
+    labels = np.full(n, -1, dtype=np.int64)
+    for _ in range(iters):
+        novos = _distancias2(X, C).argmin(axis=1)
+        if np.array_equal(novos, labels):
+            break
+        labels = novos
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(C)
+        np.add.at(sums, labels, X)
+        vazios = counts == 0
+        C[~vazios] = sums[~vazios] / counts[~vazios, None]
+        if vazios.any():
+            C[vazios] = X[rnd.choice(n, size=int(vazios.sum()))]  # reinit
+    return labels, C
+
+
+def _distancias2(X: np.ndarray, C: np.ndarray) -> np.ndarray:
+    return ((X[:, None, :] - C[None, :, :]) ** 2).sum(axis=2)
+
+
+def casar_rotulos(antigos: np.ndarray, novos: np.ndarray) -> np.ndarray:
+    """
+    perm[j] = rótulo (índice antigo) que o novo centróide j deve herdar,
+    minimizando a distância total entre pares (linear_sum_assignment).
+    Mesmo k dos dois lados.
+    """
+    perm = np.arange(len(novos), dtype=np.int64)
+    lin, col = linear_sum_assignment(_distancias2(novos, antigos))
+    perm[lin] = col
+    return perm
+
+
+def _inercia_media(X: np.ndarray, C: np.ndarray, labels: np.ndarray) -> float:
+    if len(X) == 0:
+        return 0.0
+    return float(((X - C[labels]) ** 2).sum(axis=1).mean())
+
+
+def grupos_da_turma(turma_id: int, k: int) -> Dict[str, Any]:
+    """
+    Retorna:
+      usados     posições (no snapshot) dos alunos com dados
+      X          matriz de taxas desses alunos
+      labels     grupo 0..k_eff-1 de cada linha de X
+      clusters   {usuario_id: grupo 1..k_eff}
+      k_eff, reajustado (bool), online (nº de alunos atribuídos online)
+    """
+    snap = snapshot_turma(turma_id)
+    usados, X = snap.matriz_taxas()
+    vazio = {"usados": usados, "X": X, "labels": np.zeros(0, dtype=np.int64),
+             "clusters": {}, "k_eff": 0, "reajustado": False, "online": 0, "snapshot": snap}
+    if len(usados) == 0:
+        return vazio
+
+    uids = snap.aluno_ids[usados].tolist()
+    totais = snap.total[usados].sum(axis=1).tolist()
+    topicos = snap.topico_ids.tolist()
+    versao = int(snap.versao[0])
+    k_eff = max(1, min(int(k), len(uids)))
+
+    estado = CentroideTurma.query.filter_by(turma_id=int(turma_id), k=int(k)).first()
+
+    labels = None
+    reajustar = (
+        estado is None
+        or estado.k_eff != k_eff
+        or list(estado.topico_ids or []) != topicos
+    )
+    online = 0
+
+    if not reajustar:
+        C = np.asarray(estado.centroides, dtype=np.float64)
+        atrib = estado.atribuicoes or {}
+
+        # nada mudou desde o último cálculo
+        if estado.versao_dados == versao and all(str(u) in atrib for u in uids):
+            labels = np.array([atrib[str(u)][0] for u in uids], dtype=np.int64)
+            return {**vazio, "labels": labels, "k_eff": k_eff,
+                    "clusters": {u: int(g) + 1 for u, g in zip(uids, labels.tolist())}}
+
+        mudaram = [
+            i for i, (u, t) in enumerate(zip(uids, totais))
+            if str(u) not in atrib or int(atrib[str(u)][1]) != int(t)
+        ]
+        labels = np.array([int(atrib.get(str(u), [0])[0]) for u in uids], dtype=np.int64)
+        if mudaram:
+            labels[mudaram] = _distancias2(X[mudaram], C).argmin(axis=1)
+        online = len(mudaram)
+
+        cfg = current_app.config
+        inercia = _inercia_media(X, C, labels)
+        base = max(float(estado.inercia_ajuste or 0.0), 1e-9)
+        alterados = int(estado.alterados or 0) + online
+        reajustar = (
+            inercia > base * (1.0 + float(cfg.get("AGRUPAMENTO_LIMIAR_INERCIA", 0.25)))
+            or alterados > float(cfg.get("AGRUPAMENTO_LIMIAR_ALTERADOS", 0.3)) * len(uids)
+        )
+
+    if reajustar:
+        antigos = None
+        if estado is not None and estado.centroides:
+            antigos = _centroides_nas_colunas(estado, topicos)
+
+        # com k_eff diferente não há como manter os rótulos: ajuste do zero
+        if antigos is not None and len(antigos) != k_eff:
+            antigos = None
+
+        pronto = _ajuste_da_varredura(turma_id, snap.versao, topicos, k_eff)
+        if pronto is not None:
+            labels, C = pronto
+        else:
+            with kmeans_segundos.cronometrar(origem="agrupamento"):
+                labels, C = kmeans_np(X, k_eff, iters=60, seed=42, iniciais=antigos)
+
+        if antigos is not None:
+            perm = casar_rotulos(antigos, C)
+            ordem = np.argsort(perm)
+            C = C[ordem]
+            labels = perm[labels]
+        online = 0
+
+    atribuicoes = {str(u): [int(g), int(t)] for u, g, t in zip(uids, labels.tolist(), totais)}
+    _salvar(estado, turma_id, k, k_eff, topicos, C, atribuicoes, versao, X, labels, reajustar, online)
+
+    return {
+        **vazio,
+        "labels": labels,
+        "k_eff": k_eff,
+        "clusters": {u: int(g) + 1 for u, g in zip(uids, labels.tolist())},
+        "reajustado": bool(reajustar),
+        "online": online,
+    }
+
+
+def _centroides_nas_colunas(estado: CentroideTurma, topicos: List[int]) -> np.ndarray:
+    """Centróides antigos reprojetados nas colunas atuais (tópico novo = média 0.5)."""
+    antigos = np.asarray(estado.centroides, dtype=np.float64)
+    pos = {int(t): j for j, t in enumerate(estado.topico_ids or [])}
+    out = np.full((len(antigos), len(topicos)), 0.5)
+    for j, t in enumerate(topicos):
+        if t in pos:
+            out[:, j] = antigos[:, pos[t]]
+    return out
+
+
+def _salvar(estado, turma_id, k, k_eff, topicos, C, atribuicoes, versao, X, labels, reajustado, online) -> None:
+    agora = datetime.utcnow()
+    if estado is None:
+        estado = CentroideTurma(turma_id=int(turma_id), k=int(k))
+        db.session.add(estado)
+
+    estado.k_eff = int(k_eff)
+    estado.topico_ids = list(topicos)
+    estado.centroides = np.round(C, 6).tolist()
+    estado.atribuicoes = atribuicoes
+    estado.versao_dados = versao
+    if reajustado:
+        estado.inercia_ajuste = _inercia_media(X, C, labels)
+        estado.alterados = 0
+        estado.ajustado_em = agora
+    else:
+        estado.alterados = int(estado.alterados or 0) + int(online)
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # outro request criou o estado desta (turma, k) ao mesmo tempo
+        db.session.rollback()
+
+
+# =========================
+# k automático
+# =========================
+
+MAX_VARREDURAS = 32
+
+_varreduras: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_lock_varreduras = threading.Lock()
+
+
+def _avaliar_k(X: np.ndarray, k: int, amostra: np.ndarray) -> Dict[str, Any]:
+    labels, C = kmeans_np(X, k, iters=60, seed=42)
+    silhueta = None
+    if len(np.unique(labels[amostra])) > 1:
+        silhueta = float(silhouette_score(X[amostra], labels[amostra]))
+    return {"k": int(k), "inercia": _inercia_media(X, C, labels), "silhueta": silhueta,
+            "labels": labels, "centroides": C}
+
+
+def varredura_k(turma_id: int) -> Dict[str, Any]:
+    """
+    Retorna {"recomendado": k, "scores": [{k, inercia, silhueta}, ...], "n_alunos"}.
+    Recomendado = maior silhueta (empate: menor k); sem k avaliável, 1.
+    """
+    snap = snapshot_turma(turma_id)
+    chave = int(turma_id)
+    with _lock_varreduras:
+        pronta = _varreduras.get(chave)
+        if pronta is not None and pronta["versao"] == snap.versao:
+            _varreduras.move_to_end(chave)
+            return _resumo(pronta)
+
+    _usados, X = snap.matriz_taxas()
+    cfg = current_app.config
+    # silhueta exige 2 <= k <= n-1
+    ks = list(range(2, min(int(cfg.get("AGRUPAMENTO_K_MAX", 10)), len(X) - 1) + 1))
+    n_amostra = min(len(X), int(cfg.get("AGRUPAMENTO_SILHUETA_AMOSTRA", 2000)))
+    amostra = np.sort(np.random.default_rng(42).choice(len(X), size=n_amostra, replace=False))
+
+    avaliados: List[Dict[str, Any]] = []
+    if ks:
+        with kmeans_segundos.cronometrar(origem="varredura_k"):
+            with ThreadPoolExecutor(max_workers=max(1, int(cfg.get("AGRUPAMENTO_THREADS", 4)))) as pool:
+                avaliados = list(pool.map(lambda k: _avaliar_k(X, k, amostra), ks))
+
+    com_silhueta = [a for a in avaliados if a["silhueta"] is not None]
+    recomendado = max(com_silhueta, key=lambda a: (a["silhueta"], -a["k"]))["k"] if com_silhueta else 1
+
+    varredura = {
+        "versao": snap.versao,
+        "topico_ids": snap.topico_ids.tolist(),
+        "n_alunos": int(len(X)),
+        "recomendado": int(recomendado),
+        "avaliados": {a["k"]: a for a in avaliados},
+    }
+    with _lock_varreduras:
+        _varreduras[chave] = varredura
+        _varreduras.move_to_end(chave)
+        while len(_varreduras) > MAX_VARREDURAS:
+            _varreduras.popitem(last=False)
+    return _resumo(varredura)
+
+
+def varredura_em_cache(turma_id: int) -> Optional[Dict[str, Any]]:
+    """Varredura já calculada para os dados atuais da turma (sem calcular)."""
+    snap = snapshot_turma(turma_id)
+    with _lock_varreduras:
+        pronta = _varreduras.get(int(turma_id))
+        if pronta is None or pronta["versao"] != snap.versao:
+            return None
+        return _resumo(pronta)
+
+
+def tem_varredura(turma_id: int, versao) -> bool:
+    """Há varredura em cache para essa versão dos dados (sem carregar o snapshot)."""
+    with _lock_varreduras:
+        pronta = _varreduras.get(int(turma_id))
+        return pronta is not None and pronta["versao"] == versao
+
+
+def _resumo(varredura: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "recomendado": varredura["recomendado"],
+        "n_alunos": varredura["n_alunos"],
+        "scores": [
+            {"k": k, "inercia": round(a["inercia"], 6),
+             "silhueta": None if a["silhueta"] is None else round(a["silhueta"], 4)}
+            for k, a in sorted(varredura["avaliados"].items())
+        ],
+    }
+
+
+def _ajuste_da_varredura(turma_id: int, versao, topicos: List[int], k_eff: int):
+    """(labels, centróides) da varredura em cache, se for dos mesmos dados."""
+    with _lock_varreduras:
+        pronta = _varreduras.get(int(turma_id))
+    if pronta is None or pronta["versao"] != versao or pronta["topico_ids"] != topicos:
+        return None
+    a = pronta["avaliados"].get(int(k_eff))
+    if a is None:
+        return None
+    return a["labels"].copy(), a["centroides"].copy()
@@ -1,47 +1,71 @@
 import os
 import os.path as osp
 
+import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.preprocessing import StandardScaler
-from sqlalchemy import create_engine
+from sqlalchemy import case, exists, func, select
 
+from .dados_analise import snapshot_turma
+from .metricas import kmeans_segundos, relatorio_segundos
+from .modelos import db, Interacao, Matricula, TentativaDesafio, Topico, Usuario
 
-def rodar_analise(instance_path: str, turma_id: int | None = None):
-    db_path = osp.join(instance_path, "app.db")
-    if not os.path.exists(db_path):
-        return None, None
 
-    engine = create_engine(f"sqlite:///{db_path}")
+# alunos por lote no modo "minibatch"
+LOTE_ALUNOS = 5_000
 
-    where = ""
-    params = {}
-    if turma_id:
-        where = "WHERE t.turma_id = :turma_id"
-        params["turma_id"] = turma_id
-
-    query = f"""
-        SELECT
-            t.usuario_id,
-            u.nome AS aluno,
-            tp.nome AS topico,
-            1.0 - AVG(CASE WHEN i.foi_correta THEN 1.0 ELSE 0.0 END) AS taxa_erro
-        FROM interacoes i
-        JOIN tentativas_desafio t ON i.tentativa_id = t.id
-        JOIN usuarios u ON t.usuario_id = u.id
-        JOIN topicos tp ON i.topico_id = tp.id
-        {where}
-        GROUP BY t.usuario_id, u.nome, tp.nome;
+
+def rodar_analise(instance_path: str, turma_id: int | None = None, modo: str = "lote",
+                  lote_alunos: int = LOTE_ALUNOS):
     """
+    Gera relatorio_alunos*.csv e relatorio_grupos*.csv em <projeto>/reports.
 
-    df = pd.read_sql(query, engine, params=params)
-    if df.empty:
-        return None, None
+    modo="lote": matriz inteira em memória (snapshot) + KMeans.
+    modo="minibatch": lê os vetores dos alunos do banco em lotes de
+    lote_alunos e ajusta StandardScaler/MiniBatchKMeans incrementalmente
+    (memória limitada ao lote; indicado para turma_id=None em bancos grandes).
+    """
+    with relatorio_segundos.cronometrar():
+        if modo == "minibatch":
+            return _rodar_analise_minibatch(instance_path, turma_id, lote_alunos)
+        return _rodar_analise(instance_path, turma_id)
+
+
+def _arquivos_relatorio(instance_path: str, turma_id: int | None):
+    reports_dir = osp.join(osp.dirname(instance_path), "reports")
+    os.makedirs(reports_dir, exist_ok=True)
+
+    sufixo = f"_turma_{turma_id}" if turma_id else ""
+    return reports_dir, f"relatorio_alunos{sufixo}.csv", f"relatorio_grupos{sufixo}.csv"
 
-    matriz = df.pivot_table(index=["usuario_id", "aluno"], columns="topico", values="taxa_erro").fillna(0)
-    if matriz.empty:
+
+def _rodar_analise(instance_path: str, turma_id: int | None = None):
+    # matriz aluno x tópico vem do snapshot compartilhado (precisa de app context)
+    snap = snapshot_turma(turma_id)
+    usados = np.nonzero(snap.total.sum(axis=1) > 0)[0]
+    if len(usados) == 0 or len(snap.topico_ids) == 0:
         return None, None
 
+    # mesmo formato do antigo pivot_table: uma coluna por nome de tópico, em
+    # ordem (tópicos homônimos de disciplinas diferentes somam na mesma coluna)
+    nomes = sorted(set(snap.topico_nomes))
+    pos = {nome: j for j, nome in enumerate(nomes)}
+    M = np.zeros((len(snap.topico_nomes), len(nomes)))
+    M[np.arange(len(snap.topico_nomes)), [pos[nm] for nm in snap.topico_nomes]] = 1.0
+
+    tot = snap.total[usados] @ M
+    taxa = np.divide(snap.erros[usados] @ M, tot, out=np.zeros_like(tot), where=tot > 0)
+
+    matriz = pd.DataFrame(
+        taxa,
+        index=pd.MultiIndex.from_arrays(
+            [snap.aluno_ids[usados], [snap.aluno_nomes[i] for i in usados]],
+            names=["usuario_id", "aluno"],
+        ),
+        columns=pd.Index(nomes, name="topico"),
+    ).sort_index()
+
     n = len(matriz.index)
     if n == 1:
         clusters = [0]
@@ -49,7 +73,8 @@ def rodar_analise(instance_path: str, turma_id: int | None = None):
         X = StandardScaler().fit_transform(matriz.values)
         k = min(3, n)
         kmeans = KMeans(n_clusters=k, random_state=42, n_init="auto")
-        clusters = kmeans.fit_predict(X)
+        with kmeans_segundos.cronometrar(origem="relatorio"):
+            clusters = kmeans.fit_predict(X)
 
     matriz.reset_index(inplace=True)
     matriz["cluster"] = [f"Grupo {chr(65 + int(c))}" for c in clusters]
@@ -58,14 +83,135 @@ def rodar_analise(instance_path: str, turma_id: int | None = None):
     rel_alunos = matriz[["usuario_id", "aluno", "cluster"] + cols]
     rel_grupos = matriz.groupby("cluster")[cols].mean().reset_index()
 
-    reports_dir = osp.join(osp.dirname(instance_path), "reports")
-    os.makedirs(reports_dir, exist_ok=True)
+    reports_dir, f1, f2 = _arquivos_relatorio(instance_path, turma_id)
+    rel_alunos.to_csv(osp.join(reports_dir, f1), index=False)
+    rel_grupos.to_csv(osp.join(reports_dir, f2), index=False)
 
-    sufixo = f"_turma_{turma_id}" if turma_id else ""
-    f1 = f"relatorio_alunos{sufixo}.csv"
-    f2 = f"relatorio_grupos{sufixo}.csv"
+    return f1, f2
 
-    rel_alunos.to_csv(osp.join(reports_dir, f1), index=False)
+
+# =========================
+# Modo minibatch (streaming do banco)
+# =========================
+
+def _topicos_relatorio(turma_id: int | None):
+    """Nomes de tópico com interações, na ordem das colunas do pivot."""
+    q = (
+        select(Topico.nome)
+        .distinct()
+        .where(exists().where(Interacao.topico_id == Topico.id).where(*_filtro_turma(turma_id)))
+    )
+    return sorted(str(n) for n in db.session.scalars(q))
+
+
+def _filtro_turma(turma_id: int | None):
+    conds = [TentativaDesafio.id == Interacao.tentativa_id]
+    if turma_id:
+        conds.append(TentativaDesafio.turma_id == int(turma_id))
+    return conds
+
+
+def _lotes_de_alunos(turma_id: int | None, col_por_topico: dict, lote_alunos: int):
+    """
+    Gera (usuario_ids, nomes, taxas[n_lote, n_topicos]) lendo do banco em
+    streaming, já agregado por aluno × nome de tópico e ordenado por aluno.
+    Tópico sem resposta fica 0 (como o fillna(0) do modo lote).
+    """
+    # mesmos alunos do snapshot: matriculados como aluno (na turma, se houver)
+    alunos = select(Matricula.usuario_id).where(Matricula.papel == "aluno")
+    if turma_id:
+        alunos = alunos.where(Matricula.turma_id == int(turma_id))
+
+    erros = func.sum(case((Interacao.foi_correta.is_(False), 1), else_=0))
+    q = (
+        select(TentativaDesafio.usuario_id, Usuario.nome, Topico.nome,
+               (erros * 1.0 / func.count(Interacao.id)).label("taxa"))
+        .join(Interacao, Interacao.tentativa_id == TentativaDesafio.id)
+        .join(Topico, Topico.id == Interacao.topico_id)
+        .join(Usuario, Usuario.id == TentativaDesafio.usuario_id)
+        .where(TentativaDesafio.usuario_id.in_(alunos))
+        .group_by(TentativaDesafio.usuario_id, Usuario.nome, Topico.nome)
+        .order_by(TentativaDesafio.usuario_id)
+    )
+    if turma_id:
+        q = q.where(TentativaDesafio.turma_id == int(turma_id))
+
+    n_top = len(col_por_topico)
+    uids, nomes = [], []
+    X = np.zeros((lote_alunos, n_top))
+    atual = None
+    res = db.session.execute(q.execution_options(stream_results=True, yield_per=10_000))
+    for uid, nome, topico, taxa in res:
+        if uid != atual:
+            if len(uids) == lote_alunos:
+                yield np.array(uids, dtype=np.int64), nomes, X
+                uids, nomes = [], []
+                X = np.zeros((lote_alunos, n_top))
+            atual = uid
+            uids.append(int(uid))
+            nomes.append(str(nome))
+        j = col_por_topico.get(topico)
+        if j is not None:
+            X[len(uids) - 1, j] = float(taxa or 0.0)
+    if uids:
+        yield np.array(uids, dtype=np.int64), nomes, X[: len(uids)]
+
+
+def _rodar_analise_minibatch(instance_path: str, turma_id: int | None, lote_alunos: int):
+    cols = _topicos_relatorio(turma_id)
+    if not cols:
+        return None, None
+    col_por_topico = {nome: j for j, nome in enumerate(cols)}
+    lote_alunos = max(1, int(lote_alunos))
+
+    # 1ª passada: média/variância para padronizar (como o StandardScaler do modo lote)
+    scaler = StandardScaler()
+    n = 0
+    for _uids, _nomes, X in _lotes_de_alunos(turma_id, col_por_topico, lote_alunos):
+        scaler.partial_fit(X)
+        n += len(X)
+    if n == 0:
+        return None, None
+
+    # 2ª passada: centróides incrementais
+    k = min(3, n)
+    km = None
+    if n > 1:
+        km = MiniBatchKMeans(n_clusters=k, random_state=42, n_init=3)
+        with kmeans_segundos.cronometrar(origem="relatorio_minibatch"):
+            # o primeiro partial_fit precisa de pelo menos k amostras
+            pendente = None
+            for _uids, _nomes, X in _lotes_de_alunos(turma_id, col_por_topico, lote_alunos):
+                Xs = scaler.transform(X)
+                if pendente is not None:
+                    Xs = np.vstack([pendente, Xs])
+                    pendente = None
+                if not hasattr(km, "cluster_centers_") and len(Xs) < k:
+                    pendente = Xs
+                    continue
+                km.partial_fit(Xs)
+
+    # 3ª passada: atribui e grava o CSV por lote; médias por grupo acumuladas
+    reports_dir, f1, f2 = _arquivos_relatorio(instance_path, turma_id)
+    somas = np.zeros((k, len(cols)))
+    contagens = np.zeros(k, dtype=np.int64)
+    caminho_alunos = osp.join(reports_dir, f1)
+    primeiro = True
+    for uids, nomes, X in _lotes_de_alunos(turma_id, col_por_topico, lote_alunos):
+        labels = km.predict(scaler.transform(X)) if km is not None else np.zeros(len(X), dtype=np.int64)
+        np.add.at(somas, labels, X)
+        contagens += np.bincount(labels, minlength=k)
+
+        df = pd.DataFrame(X, columns=cols)
+        df.insert(0, "usuario_id", uids)
+        df.insert(1, "aluno", nomes)
+        df.insert(2, "cluster", [f"Grupo {chr(65 + int(c))}" for c in labels])
+        df.to_csv(caminho_alunos, index=False, mode="w" if primeiro else "a", header=primeiro)
+        primeiro = False
+
+    usados = np.nonzero(contagens)[0]
+    rel_grupos = pd.DataFrame(somas[usados] / contagens[usados, None], columns=cols)
+    rel_grupos.insert(0, "cluster", [f"Grupo {chr(65 + int(c))}" for c in usados])
     rel_grupos.to_csv(osp.join(reports_dir, f2), index=False)
 
     return f1, f2
@@ -0,0 +1,109 @@
+# app/cache_http.py
+"""
+GET condicional (ETag / 304 Not Modified).
+
+As telas de análise e o conteúdo do tutor são funções de poucas versões já
+mantidas no banco:
+
+    Turma.versao_dados      respostas, matrículas, nomes (app/dados_analise.py)
+    versão do cadastro      turmas, conteúdo, matrículas (app/contadores.py)
+    Desafio.versao          enunciado, perguntas, nome do tópico/disciplina
+
+O ETag é um hash dessas versões e dos parâmetros do request. Se o navegador
+manda o mesmo ETag em If-None-Match, a resposta é 304 sem montar snapshot,
+k-means ou template: o custo é só a leitura das versões.
+
+Desafio.versao é incrementada aqui, na mesma transação da mudança (flush ou
+UPDATE/DELETE em massa). Incluir criado_em no ETag evita confundir um desafio
+apagado com outro criado depois reaproveitando o id.
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Callable, Iterable
+
+from flask import current_app, request
+from sqlalchemy import event, inspect as sa_inspect, or_, select, update
+from sqlalchemy.orm import Session
+
+from .modelos import Desafio, Disciplina, Pergunta, Topico
+
+
+def etag(partes: Iterable[Any]) -> str:
+    return hashlib.blake2b(repr(tuple(partes)).encode(), digest_size=10).hexdigest()
+
+
+def responder_se_modificado(partes: Iterable[Any], gerar: Callable[[], Any]):
+    """304 se o cliente já tem a versão `partes`; senão gera a resposta e anexa o ETag."""
+    tag = etag(partes)
+    if request.if_none_match.contains_weak(tag):
+        resp = current_app.response_class(status=304)
+    else:
+        resp = current_app.make_response(gerar())
+        if resp.status_code != 200 or resp.cache_control.no_store:
+            return resp  # erro ou resposta provisória não leva ETag (nem vira 304 depois)
+    resp.set_etag(tag, weak=True)
+    # o navegador guarda, mas sempre revalida (conteúdo por usuário)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+# =========================
+# Versão do conteúdo (Desafio.versao)
+# =========================
+
+def _mudou(obj, *colunas) -> bool:
+    estado = sa_inspect(obj)
+    return any(estado.attrs[c].history.has_changes() for c in colunas)
+
+
+def _tocar_desafios(conn, desafio_ids=(), topico_ids=(), disciplina_ids=(), todos=False) -> None:
+    t = Desafio.__table__
+    stmt = update(t).values(versao=t.c.versao + 1)
+    if not todos:
+        filtros = []
+        if desafio_ids:
+            filtros.append(t.c.id.in_(sorted(desafio_ids)))
+        if topico_ids:
+            filtros.append(t.c.topico_id.in_(sorted(topico_ids)))
+        if disciplina_ids:
+            filtros.append(t.c.topico_id.in_(
+                select(Topico.__table__.c.id).where(Topico.__table__.c.disciplina_id.in_(sorted(disciplina_ids)))
+            ))
+        if not filtros:
+            return
+        stmt = stmt.where(or_(*filtros))
+    conn.execute(stmt)
+
+
+def _depois_flush(session, _ctx) -> None:
+    desafios, topicos, disciplinas = set(), set(), set()
+    for obj in list(session.deleted) + list(session.dirty) + list(session.new):
+        if isinstance(obj, Pergunta):
+            desafios.add(obj.desafio_id)
+            if obj in session.dirty:
+                desafios.update(v for v in sa_inspect(obj).attrs.desafio_id.history.deleted or () if v)
+        elif isinstance(obj, Desafio) and obj in session.dirty and session.is_modified(obj, include_collections=False):
+            desafios.add(obj.id)
+        elif isinstance(obj, Topico) and obj in session.dirty and _mudou(obj, "nome"):
+            topicos.add(obj.id)
+        elif isinstance(obj, Disciplina) and obj in session.dirty and _mudou(obj, "nome"):
+            disciplinas.add(obj.id)
+    desafios.discard(None)
+    if desafios or topicos or disciplinas:
+        _tocar_desafios(session.connection(), desafios, topicos, disciplinas)
+
+
+def _orm_execute(estado) -> None:
+    # UPDATE/DELETE em massa não dizem quais desafios: incrementa todos
+    mapper = estado.bind_mapper
+    if mapper is None or not (estado.is_update or estado.is_delete):
+        return
+    if mapper.class_ in (Pergunta, Topico, Disciplina) or (estado.is_update and mapper.class_ is Desafio):
+        _tocar_desafios(estado.session.connection(), todos=True)
+
+
+def configurar_cache_http(app) -> None:
+    if not event.contains(Session, "after_flush", _depois_flush):
+        event.listen(Session, "after_flush", _depois_flush)
+        event.listen(Session, "do_orm_execute", _orm_execute)
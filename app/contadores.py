@@ -0,0 +1,170 @@
+# app/contadores.py
+"""
+Contadores (KPIs) do painel inicial do admin.
+
+Os totais do cadastro (turmas, alunos matriculados, disciplinas, tópicos,
+questões, perguntas e as pendências do guia) ficam na tabela contadores,
+cada um com a versão em que foi calculado. A linha "_versao" guarda a versão
+atual: qualquer flush que cria/apaga turmas, matrículas ou conteúdo (ou
+DELETE/UPDATE/INSERT em massa nessas tabelas) a incrementa na mesma
+transação (inserção direta pelo engine, como em gerar_dados.py, chama
+invalidar_contadores()). Na leitura, se algum contador está em versão antiga, todos são
+recalculados numa única consulta (subqueries escalares) e regravados com a
+versão lida nessa mesma consulta: uma mudança que chegue no meio do cálculo
+deixa os valores gravados já vencidos, sem corrida.
+
+Painel aberto sem mudança no cadastro = uma consulta (todas as linhas de
+contadores), sem COUNT nem DISTINCT sobre matriculas.
+
+A atividade recente (interações hoje, alunos ativos na semana) muda a cada
+resposta e não é guardada: sai dos resumos por período (app/resumos.py),
+algumas dezenas de linhas por turma, sem varrer interacoes.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy import event, exists, func, select, update
+from sqlalchemy.orm import Session
+
+from .modelos import (
+    db, insert_dialeto, Contador, Desafio, Disciplina, Matricula, Pergunta, ResumoAluno, ResumoTopico,
+    Topico, Turma, turmas_disciplinas,
+)
+from .resumos import inicio_do_periodo
+
+VERSAO = "_versao"
+
+
+def _consultas():
+    return {
+        "turmas": select(func.count(Turma.id)),
+        "alunos": select(func.count(func.distinct(Matricula.usuario_id))).where(Matricula.papel == "aluno"),
+        "disciplinas": select(func.count(Disciplina.id)),
+        "topicos": select(func.count(Topico.id)),
+        "desafios": select(func.count(Desafio.id)),
+        "perguntas": select(func.count(Pergunta.id)),
+        "desafios_sem_perguntas": select(func.count(Desafio.id)).where(
+            ~exists().where(Pergunta.desafio_id == Desafio.id)
+        ),
+        "turmas_sem_disciplinas": select(func.count(Turma.id)).where(
+            ~exists().where(turmas_disciplinas.c.turma_id == Turma.id)
+        ),
+    }
+
+
+# =========================
+# Leitura
+# =========================
+
+def contadores() -> Dict[str, int]:
+    """Totais do cadastro, recalculados só quando a versão mudou."""
+    linhas = {nome: (valor, versao) for nome, valor, versao in
+              db.session.query(Contador.nome, Contador.valor, Contador.versao)}
+    atual = linhas.get(VERSAO, (None, None))[0]
+    consultas = _consultas()
+    if atual is not None and all(linhas.get(n, (0, None))[1] == atual for n in consultas):
+        return {n: int(linhas[n][0]) for n in consultas}
+    return _recalcular(consultas)
+
+
+def versao_cadastro() -> int:
+    """Versão atual do cadastro (muda a cada turma/matrícula/conteúdo criado ou apagado)."""
+    v = db.session.query(Contador.valor).filter(Contador.nome == VERSAO).scalar()
+    if v is None:
+        contadores()  # cria a linha de versão
+        v = db.session.query(Contador.valor).filter(Contador.nome == VERSAO).scalar()
+    return int(v or 0)
+
+
+def _recalcular(consultas) -> Dict[str, int]:
+    t = Contador.__table__
+    nomes = list(consultas)
+    # versão e contagens na mesma consulta (mesmo snapshot)
+    row = db.session.execute(select(
+        select(func.coalesce(func.max(Contador.valor), 0)).where(Contador.nome == VERSAO).scalar_subquery(),
+        *[consultas[n].scalar_subquery() for n in nomes],
+    )).one()
+    versao, valores = int(row[0]), dict(zip(nomes, (int(v or 0) for v in row[1:])))
+
+    agora = datetime.utcnow()
+    linhas = [{"nome": n, "valor": v, "versao": versao, "atualizado_em": agora} for n, v in valores.items()]
+    linhas.append({"nome": VERSAO, "valor": versao, "versao": versao, "atualizado_em": agora})
+    stmt = insert_dialeto(t)
+    if stmt is not None:
+        stmt = stmt.values(linhas)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=["nome"],
+            set_={"valor": stmt.excluded.valor, "versao": stmt.excluded.versao,
+                  "atualizado_em": stmt.excluded.atualizado_em},
+            # a linha de versão não é sobrescrita (outro flush pode tê-la incrementado)
+            where=t.c.nome != VERSAO,
+        ))
+    else:
+        existentes = {n for (n,) in db.session.query(Contador.nome)}
+        for linha in linhas:
+            if linha["nome"] == VERSAO and VERSAO in existentes:
+                continue
+            if linha["nome"] in existentes:
+                db.session.execute(update(t).where(t.c.nome == linha["nome"]).values(**linha))
+            else:
+                db.session.execute(t.insert().values(**linha))
+    db.session.commit()
+    return valores
+
+
+def atividade_recente() -> Dict[str, int]:
+    """Interações hoje / na semana e alunos ativos na semana (UTC), pelos resumos."""
+    hoje = datetime.utcnow().date()
+    semana = inicio_do_periodo(hoje, "semana")
+    hoje_total = db.session.query(func.coalesce(func.sum(ResumoTopico.total), 0)).filter(
+        ResumoTopico.periodo == "dia", ResumoTopico.inicio == hoje
+    ).scalar()
+    semana_total, ativos = db.session.query(
+        func.coalesce(func.sum(ResumoAluno.total), 0), func.count(func.distinct(ResumoAluno.usuario_id))
+    ).filter(ResumoAluno.periodo == "semana", ResumoAluno.inicio == semana, ResumoAluno.total > 0).one()
+    return {
+        "interacoes_hoje": int(hoje_total or 0),
+        "interacoes_semana": int(semana_total or 0),
+        "alunos_ativos_semana": int(ativos or 0),
+    }
+
+
+# =========================
+# Invalidação
+# =========================
+
+_MODELOS = (Turma, Matricula, Disciplina, Topico, Desafio, Pergunta)
+_TABELAS = {m.__table__.name for m in _MODELOS} | {turmas_disciplinas.name}
+# UPDATE só muda contagem nestas (papel da matrícula, pergunta trocada de desafio);
+# turmas.versao_dados, por exemplo, é incrementada a cada resposta
+_TABELAS_UPDATE = {Matricula.__table__.name, Pergunta.__table__.name}
+
+
+def invalidar_contadores(conn=None) -> None:
+    """Incrementa a versão (os contadores são recalculados na próxima leitura)."""
+    t = Contador.__table__
+    (conn or db.session).execute(update(t).where(t.c.nome == VERSAO).values(valor=t.c.valor + 1))
+
+
+def _depois_flush(session, _ctx) -> None:
+    for obj in list(session.new) + list(session.deleted) + list(session.dirty):
+        # conteúdo editado só muda contagem se trocar de vínculo (matrícula, pergunta, disciplinas da turma)
+        if isinstance(obj, _MODELOS) and (obj not in session.dirty or isinstance(obj, (Turma, Matricula, Pergunta))):
+            invalidar_contadores(session.connection())
+            return
+
+
+def _orm_execute(estado) -> None:
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+    nome = getattr(getattr(estado.statement, "table", None), "name", None)
+    if nome in (_TABELAS_UPDATE if estado.is_update else _TABELAS):
+        invalidar_contadores(estado.session.connection())
+
+
+def configurar_contadores(app) -> None:
+    if not event.contains(Session, "after_flush", _depois_flush):
+        event.listen(Session, "after_flush", _depois_flush)
+        event.listen(Session, "do_orm_execute", _orm_execute)
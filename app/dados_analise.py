@@ -0,0 +1,302 @@
+# app/dados_analise.py
+"""
+Camada de dados das análises por turma.
+
+Em vez de cada tela montar sua própria matriz aluno × tópico (dicts de
+tuplas, listas de listas, pivots do pandas), a turma é carregada UMA vez em
+arrays NumPy compactos:
+
+    aluno_ids   int64[n]      (matriculados como aluno, ordem por nome)
+    topico_ids  int64[m]      (tópicos com interações na turma, ordem por nome)
+    total       int32[n, m]   interações por aluno × tópico
+    erros       int32[n, m]   respostas erradas por aluno × tópico
+
+O snapshot fica em cache por processo, chaveado pela turma e validado por
+Turma.versao_dados (incrementada a cada resposta e a cada mudança de
+matrícula). Tabelas, donuts, cards e k-means leem todos do mesmo snapshot.
+
+turma_id=None carrega todas as turmas juntas (usado no relatório CSV geral).
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import g, has_request_context
+from sqlalchemy import event, func, inspect as sa_inspect, update
+from sqlalchemy.orm import Session
+
+from .modelos import db, Interacao, Matricula, TentativaDesafio, Topico, Turma, Usuario
+from .motor_analitico import agregados_aluno_topico
+
+MAX_SNAPSHOTS = 32
+
+
+class SnapshotTurma:
+    __slots__ = (
+        "turma_id", "versao", "aluno_ids", "aluno_nomes", "aluno_emails",
+        "topico_ids", "topico_nomes", "total", "erros", "_ordem",
+    )
+
+    def __init__(self, turma_id, versao, aluno_ids, aluno_nomes, aluno_emails,
+                 topico_ids, topico_nomes, total, erros):
+        self.turma_id = turma_id
+        self.versao = versao
+        self.aluno_ids = aluno_ids
+        self.aluno_nomes = aluno_nomes
+        self.aluno_emails = aluno_emails
+        self.topico_ids = topico_ids
+        self.topico_nomes = topico_nomes
+        self.total = total
+        self.erros = erros
+        self._ordem = np.argsort(aluno_ids, kind="stable")
+
+    # ---------- consulta ----------
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.aluno_ids.nbytes + self.topico_ids.nbytes + self.total.nbytes + self.erros.nbytes)
+
+    def posicao(self, aluno_id: Optional[int]) -> Optional[int]:
+        if aluno_id is None or len(self.aluno_ids) == 0:
+            return None
+        ordenados = self.aluno_ids[self._ordem]
+        i = int(np.searchsorted(ordenados, int(aluno_id)))
+        if i < len(ordenados) and int(ordenados[i]) == int(aluno_id):
+            return int(self._ordem[i])
+        return None
+
+    def tem_aluno(self, aluno_id: Optional[int]) -> bool:
+        return self.posicao(aluno_id) is not None
+
+    def _linhas(self, aluno_id: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        if aluno_id is None:
+            return self.total.sum(axis=0), self.erros.sum(axis=0)
+        i = self.posicao(aluno_id)
+        if i is None:
+            vazio = np.zeros(len(self.topico_ids), dtype=np.int64)
+            return vazio, vazio
+        return self.total[i].astype(np.int64), self.erros[i].astype(np.int64)
+
+    def dados_por_topico(self, aluno_id: Optional[int] = None, incluir_vazios: bool = False) -> List[Dict[str, Any]]:
+        """Linhas {topico_id, topico_nome, total, erros, taxa_erro} em ordem de nome."""
+        tot, err = self._linhas(aluno_id)
+        out = []
+        for j in range(len(self.topico_ids)):
+            t = int(tot[j])
+            if not t and not incluir_vazios:
+                continue
+            e = int(err[j])
+            out.append({
+                "topico_id": int(self.topico_ids[j]),
+                "topico_nome": self.topico_nomes[j],
+                "total": t,
+                "erros": e,
+                "taxa_erro": float(e / t) if t else 0.0,
+            })
+        return out
+
+    def donut(self, aluno_id: Optional[int] = None) -> Tuple[int, Dict[str, int]]:
+        tot, err = self._linhas(aluno_id)
+        total, erros = int(tot.sum()), int(err.sum())
+        return total, {"acertos": max(0, total - erros), "erros": erros, "total": total}
+
+    def totais_por_aluno(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.total.sum(axis=1), self.erros.sum(axis=1)
+
+    def matriz_taxas(self, min_interacoes: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Matriz de taxa de erro (float64) dos alunos com pelo menos
+        min_interacoes respostas. Tópico sem resposta do aluno recebe a média
+        do tópico entre esses alunos (0 se ninguém respondeu).
+
+        Retorna (posições dos alunos usados, X).
+        """
+        usados = np.nonzero(self.total.sum(axis=1) >= max(1, int(min_interacoes)))[0]
+        if len(usados) == 0 or len(self.topico_ids) == 0:
+            return usados, np.zeros((len(usados), len(self.topico_ids)))
+
+        tot = self.total[usados].astype(np.float64)
+        err = self.erros[usados].astype(np.float64)
+        com_dado = tot > 0
+        X = np.divide(err, tot, out=np.zeros_like(tot), where=com_dado)
+
+        n_por_topico = com_dado.sum(axis=0)
+        medias = np.divide(
+            np.where(com_dado, X, 0.0).sum(axis=0),
+            n_por_topico,
+            out=np.zeros(len(self.topico_ids)),
+            where=n_por_topico > 0,
+        )
+        X = np.where(com_dado, X, medias[None, :])
+        return usados, X
+
+
+# =========================
+# Carga
+# =========================
+
+def versao_turma(turma_id: Optional[int]) -> Tuple[int, ...]:
+    if turma_id is None:
+        r = db.session.query(
+            func.count(Turma.id), func.coalesce(func.sum(Turma.versao_dados), 0), func.coalesce(func.max(Turma.id), 0)
+        ).one()
+        return tuple(int(x) for x in r)
+    v = db.session.query(Turma.versao_dados).filter(Turma.id == int(turma_id)).scalar()
+    return (int(v or 0),)
+
+
+def _carregar(turma_id: Optional[int], versao: Tuple[int, ...]) -> SnapshotTurma:
+    qa = (
+        db.session.query(Usuario.id, Usuario.nome, Usuario.email)
+        .join(Matricula, Matricula.usuario_id == Usuario.id)
+        .filter(Matricula.papel == "aluno")
+    )
+    if turma_id is not None:
+        qa = qa.filter(Matricula.turma_id == int(turma_id))
+    alunos = qa.distinct().order_by(Usuario.nome.asc(), Usuario.id.asc()).all()
+
+    # (usuario_id, topico_id, total, erros) — SQLite ou DuckDB (app/motor_analitico.py)
+    rows = agregados_aluno_topico(turma_id)
+
+    aluno_ids = np.array([a[0] for a in alunos], dtype=np.int64)
+
+    # tópicos com interação na turma, em ordem de nome
+    tids = np.unique(rows[:, 1]) if len(rows) else np.zeros(0, dtype=np.int64)
+    nomes = dict(db.session.query(Topico.id, Topico.nome).filter(Topico.id.in_(tids.tolist())).all()) if len(tids) else {}
+    ordem_t = sorted(range(len(tids)), key=lambda j: (str(nomes.get(int(tids[j]), "")).lower(), int(tids[j])))
+    topico_ids = tids[ordem_t] if len(tids) else tids
+    topico_nomes = [str(nomes.get(int(t), f"Tópico {int(t)}")) for t in topico_ids]
+
+    total = np.zeros((len(aluno_ids), len(topico_ids)), dtype=np.int32)
+    erros = np.zeros_like(total)
+    if len(rows) and len(aluno_ids) and len(topico_ids):
+        ordem_a = np.argsort(aluno_ids)
+        a_ord = aluno_ids[ordem_a]
+        pa = np.clip(np.searchsorted(a_ord, rows[:, 0]), 0, len(a_ord) - 1)
+        ok = a_ord[pa] == rows[:, 0]  # só matriculados
+        col_t = np.argsort(topico_ids)  # posto do id -> coluna
+        pt = col_t[np.searchsorted(topico_ids[col_t], rows[:, 1])]
+        lin, col = ordem_a[pa[ok]], pt[ok]
+        total[lin, col] = rows[ok, 2]
+        erros[lin, col] = rows[ok, 3]
+
+    return SnapshotTurma(
+        turma_id=turma_id,
+        versao=versao,
+        aluno_ids=aluno_ids,
+        aluno_nomes=[str(a[1]) for a in alunos],
+        aluno_emails=[a[2] for a in alunos],
+        topico_ids=topico_ids,
+        topico_nomes=topico_nomes,
+        total=total,
+        erros=erros,
+    )
+
+
+_cache: "OrderedDict[Optional[int], SnapshotTurma]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def snapshot_turma(turma_id: Optional[int]) -> SnapshotTurma:
+    """
+    Snapshot da turma (ou de todas, com None). Dentro de um request a versão
+    é conferida uma vez só; entre requests, uma consulta a turmas.versao_dados.
+    """
+    chave = None if turma_id is None else int(turma_id)
+    por_request = g.setdefault("_snapshots", {}) if has_request_context() else {}
+    if chave in por_request:
+        return por_request[chave]
+
+    versao = versao_turma(chave)
+    with _lock:
+        snap = _cache.get(chave)
+        if snap is not None and snap.versao == versao:
+            _cache.move_to_end(chave)
+            por_request[chave] = snap
+            return snap
+
+    snap = _carregar(chave, versao)
+    with _lock:
+        _cache[chave] = snap
+        _cache.move_to_end(chave)
+        while len(_cache) > MAX_SNAPSHOTS:
+            _cache.popitem(last=False)
+    por_request[chave] = snap
+    return snap
+
+
+def limpar_cache() -> None:
+    with _lock:
+        _cache.clear()
+
+
+# =========================
+# Versão dos dados da turma
+# =========================
+
+def tocar_turmas(conn, turma_ids=None) -> None:
+    """Incrementa Turma.versao_dados (todas, se turma_ids for None)."""
+    t = Turma.__table__
+    stmt = update(t).values(versao_dados=t.c.versao_dados + 1)
+    if turma_ids is not None:
+        ids = sorted({int(x) for x in turma_ids if x is not None})
+        if not ids:
+            return
+        stmt = stmt.where(t.c.id.in_(ids))
+    conn.execute(stmt)
+
+
+def _depois_flush(session, _ctx) -> None:
+    turmas = set()
+    tentativas = set()
+    todas = False
+
+    for obj in list(session.new) + list(session.deleted) + list(session.dirty):
+        if isinstance(obj, Matricula):
+            turmas.add(obj.turma_id)
+        elif isinstance(obj, Interacao):
+            tentativas.add(obj.tentativa_id)
+        elif isinstance(obj, TentativaDesafio) and obj in session.deleted:
+            turmas.add(obj.turma_id)
+        elif isinstance(obj, (Usuario, Topico)) and obj in session.dirty:
+            estado = sa_inspect(obj)
+            if any(estado.attrs[c].history.has_changes() for c in ("nome", "email") if c in estado.attrs):
+                todas = True
+
+    if not (turmas or tentativas or todas):
+        return
+    conn = session.connection()
+    if todas:
+        tocar_turmas(conn)
+        return
+    if tentativas:
+        turmas.update(
+            r[0] for r in conn.execute(
+                TentativaDesafio.__table__.select()
+                .with_only_columns(TentativaDesafio.__table__.c.turma_id)
+                .where(TentativaDesafio.__table__.c.id.in_([t for t in tentativas if t is not None]))
+            )
+        )
+    tocar_turmas(conn, turmas)
+
+
+def _orm_execute(estado) -> None:
+    # DELETE/UPDATE em massa (query.delete()) não passam pelo flush
+    if not (estado.is_delete or estado.is_update):
+        return
+    mapper = estado.bind_mapper
+    if mapper is not None and mapper.class_ in (Matricula, Interacao, TentativaDesafio):
+        tocar_turmas(estado.session.connection())
+
+
+def _registrar_eventos() -> None:
+    if not event.contains(Session, "after_flush", _depois_flush):
+        event.listen(Session, "after_flush", _depois_flush)
+        event.listen(Session, "do_orm_execute", _orm_execute)
+
+
+def configurar_dados_analise(app) -> None:
+    _registrar_eventos()
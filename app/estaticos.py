@@ -0,0 +1,184 @@
+# app/estaticos.py
+"""
+Arquivos estáticos: URLs com impressão digital e cache de longa duração.
+
+Sem isso, cada página revalidava tutor.js, treino.js, CSS e imagens (um
+If-Modified-Since por arquivo). Agora:
+
+  - url_for("static", filename=...) acrescenta ?v=<hash do conteúdo> (12 hex);
+    o static responde com `Cache-Control: public, max-age=1 ano, immutable`
+    quando o v bate com o arquivo atual. Mudou o arquivo, muda a URL.
+    Os templates não mudam: o hash entra via url_defaults.
+  - uploads de enunciado e fórmulas já têm nome único (hash / uuid, ver
+    app/imagens.py e app/formulas.py): imutáveis pelo próprio nome, sem ?v.
+  - `flask estaticos-build` grava em static/dist/ uma cópia minificada de
+    cada JS/CSS (rjsmin / rcssmin, se instalados; senão cópia como está),
+    com o hash no nome, e um manifest.json. Com ESTATICOS_MINIFICADOS, o
+    url_for troca js/tutor.js por dist/js/tutor.<hash>.min.js. Cada página
+    tem seu script (tutor.js inicia o tutor assim que carrega), então é um
+    arquivo por script em vez de um pacote único.
+  - ESTATICOS_SERVIDOR = "x-sendfile" (Apache/lighttpd, USE_X_SENDFILE do
+    Flask) ou "x-accel" (nginx, X-Accel-Redirect para um location internal
+    que aponta para app/static/): o Flask só responde os cabeçalhos e o
+    servidor web manda o arquivo (sendfile, sem passar pelo Python).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+import click
+from flask import request
+
+try:
+    import rjsmin
+except ImportError:  # opcional
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:  # opcional
+    rcssmin = None
+
+UM_ANO = 365 * 24 * 3600
+IMUTAVEIS = ("uploads/enunciados/", "formulas/", "dist/")  # nome já identifica o conteúdo
+PASTA_DIST = "dist"
+
+_hashes: Dict[str, Tuple[float, int, str]] = {}
+
+
+def impressao_digital(static_folder: str, filename: str) -> Optional[str]:
+    """Hash (12 hex) do conteúdo do arquivo; recalcula só se mtime/tamanho mudarem."""
+    caminho = os.path.join(static_folder, *filename.split("/"))
+    try:
+        st = os.stat(caminho)
+    except OSError:
+        return None
+    cache = _hashes.get(caminho)
+    if cache is not None and cache[:2] == (st.st_mtime, st.st_size):
+        return cache[2]
+    h = hashlib.blake2b(digest_size=6)
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 16), b""):
+            h.update(bloco)
+    _hashes[caminho] = (st.st_mtime, st.st_size, h.hexdigest())
+    return h.hexdigest()
+
+
+def _imutavel_pelo_nome(filename: str) -> bool:
+    return filename.startswith(IMUTAVEIS)
+
+
+# =========================
+# Build (minificação)
+# =========================
+
+def _minificar(conteudo: str, ext: str) -> Tuple[str, bool]:
+    if ext == ".js" and rjsmin is not None:
+        return rjsmin.jsmin(conteudo), True
+    if ext == ".css" and rcssmin is not None:
+        return rcssmin.cssmin(conteudo), True
+    return conteudo, False
+
+
+def construir(static_folder: str) -> Dict[str, str]:
+    """Gera static/dist/ e o manifest {'js/tutor.js': 'dist/js/tutor.<hash>.min.js'}."""
+    dist = os.path.join(static_folder, PASTA_DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifesto: Dict[str, str] = {}
+    for sub in ("js", "css"):
+        pasta = os.path.join(static_folder, sub)
+        if not os.path.isdir(pasta):
+            continue
+        for nome in sorted(os.listdir(pasta)):
+            base, ext = os.path.splitext(nome)
+            if ext not in {".js", ".css"} or base.endswith(".min"):
+                continue
+            with open(os.path.join(pasta, nome), encoding="utf-8") as f:
+                conteudo, minificado = _minificar(f.read(), ext)
+            dados = conteudo.encode("utf-8")
+            h = hashlib.blake2b(dados, digest_size=6).hexdigest()
+            destino = f"{PASTA_DIST}/{sub}/{base}.{h}{'.min' if minificado else ''}{ext}"
+            os.makedirs(os.path.join(dist, sub), exist_ok=True)
+            with open(os.path.join(static_folder, *destino.split("/")), "wb") as f:
+                f.write(dados)
+            manifesto[f"{sub}/{nome}"] = destino
+    with open(os.path.join(dist, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2, sort_keys=True)
+    return manifesto
+
+
+def _ler_manifesto(static_folder: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(static_folder, PASTA_DIST, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# =========================
+# Hook
+# =========================
+
+def configurar_estaticos(app) -> None:
+    servidor = str(app.config.get("ESTATICOS_SERVIDOR") or "").lower()
+    if servidor == "x-sendfile":
+        app.config["USE_X_SENDFILE"] = True  # send_file do Werkzeug já manda X-Sendfile
+
+    # lido ao iniciar: rode `flask estaticos-build` no deploy, antes de subir o app
+    manifesto = _ler_manifesto(app.static_folder) if app.config.get("ESTATICOS_MINIFICADOS") else {}
+
+    @app.cli.command("estaticos-build")
+    def _estaticos_build():
+        """Gera static/dist/ (JS/CSS minificados com hash no nome) e o manifest.json."""
+        gerado = construir(app.static_folder)
+        faltam = [m for m, mod in (("rjsmin", rjsmin), ("rcssmin", rcssmin)) if mod is None]
+        click.echo(f"{len(gerado)} arquivos em static/{PASTA_DIST}/")
+        if faltam:
+            click.echo(f"(sem minificação: pip install {' '.join(faltam)})")
+        if not app.config.get("ESTATICOS_MINIFICADOS"):
+            click.echo("(ESTATICOS_MINIFICADOS=1 para os templates usarem static/dist/)")
+
+    fingerprint = bool(app.config.get("ESTATICOS_FINGERPRINT", True))
+
+    @app.url_defaults
+    def _versao_estatico(endpoint, values):
+        if endpoint != "static" or "v" in values:
+            return
+        filename = values.get("filename")
+        if not filename:
+            return
+        if filename in manifesto:
+            values["filename"] = manifesto[filename]
+            return
+        if not fingerprint or _imutavel_pelo_nome(filename):
+            return
+        v = impressao_digital(app.static_folder, filename)
+        if v is not None:
+            values["v"] = v
+
+    @app.after_request
+    def _cache_estatico(resp):
+        if request.endpoint != "static" or resp.status_code not in (200, 304):
+            return resp
+        filename = (request.view_args or {}).get("filename", "")
+        v = request.args.get("v")
+        if _imutavel_pelo_nome(filename) or (fingerprint and v and v == impressao_digital(app.static_folder, filename)):
+            resp.cache_control.public = True
+            resp.cache_control.max_age = UM_ANO
+            resp.cache_control.immutable = True
+            resp.cache_control.no_cache = None
+
+        if servidor == "x-accel" and resp.status_code == 200 and resp.direct_passthrough:
+            # nginx: location /_estaticos/ { internal; alias /caminho/app/static/; }
+            prefixo = str(app.config.get("ESTATICOS_X_ACCEL_PREFIXO", "/_estaticos/")).rstrip("/")
+            resp.headers["X-Accel-Redirect"] = f"{prefixo}/{quote(filename)}"
+            if hasattr(resp.response, "close"):
+                resp.response.close()  # arquivo já aberto pelo send_file
+            resp.response = []
+            resp.headers.pop("Content-Length", None)
+        return resp
@@ -0,0 +1,229 @@
+# app/estatisticas_itens.py
+"""
+Estatísticas de item por pergunta (teoria clássica dos testes).
+
+Para cada Pergunta, estatisticas_pergunta guarda:
+
+    respostas, acertos        contagens
+    escolhas_a .. escolhas_d  quantas vezes cada alternativa foi marcada
+    taxa_acerto               índice de dificuldade clássico (p = acertos / respostas)
+    discriminacao             ponto-bisserial entre acertar o item e o escore do
+                              aluno sem o item ((corretas - acerto) / (respondidas - 1))
+
+O cálculo é uma passada vetorizada sobre interacoes (np.bincount por
+pergunta e por pergunta × alternativa; as somas da correlação também saem de
+bincount com pesos). O escore de cada aluno vem dos contadores de
+tentativas_desafio (respondidas/corretas), sem varrer interacoes.
+
+atualizar_estatisticas() é incremental: recalcula só as perguntas com
+interações depois da última considerada (ate_interacao_id). Se o total
+gravado não bate com o de interacoes até essa marca (respostas apagadas),
+refaz tudo. Troca de alternativa numa resposta antiga não muda a marca e só
+entra no recálculo completo (`flask estatisticas-perguntas --completo`). A
+discriminação das perguntas não recalculadas usa os escores da época.
+
+O AtividadesHubView só lê a tabela. Ao abrir, agendar_atualizacao() põe
+atualizar_estatisticas() num worker em segundo plano (no máximo uma vez a
+cada ESTATISTICAS_INTERVALO segundos): incremental, ou a passada completa
+quando a tabela está vazia (banco novo / migrado) ou a marca não vale mais.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+import click
+import numpy as np
+from flask import current_app
+from sqlalchemy import case, func, select
+
+from .modelos import db, EstatisticaPergunta, Interacao, TentativaDesafio
+
+ALTERNATIVAS = ("a", "b", "c", "d")
+
+
+# =========================
+# Cálculo (vetorizado)
+# =========================
+
+def _interacoes(ate_id: int, pergunta_ids=None) -> np.ndarray:
+    """int64[n, 4]: pergunta_id, usuario_id, alternativa (0..3, -1 inválida), foi_correta."""
+    alt = case({a: i for i, a in enumerate(ALTERNATIVAS)}, value=func.lower(Interacao.alternativa), else_=-1)
+    q = (
+        select(Interacao.pergunta_id, TentativaDesafio.usuario_id, alt, Interacao.foi_correta)
+        .join(TentativaDesafio, TentativaDesafio.id == Interacao.tentativa_id)
+        .where(Interacao.id <= ate_id)
+    )
+    if pergunta_ids is not None:
+        q = q.where(Interacao.pergunta_id.in_(pergunta_ids))
+    # tuple(r): numpy converte Row elemento a elemento (muito mais lento)
+    return np.array([tuple(r) for r in db.session.execute(q)], dtype=np.int64).reshape(-1, 4)
+
+
+def _placar():
+    """(usuario_ids ordenados, respondidas, corretas) de todos os alunos, pelos contadores das tentativas."""
+    rows = db.session.execute(
+        select(TentativaDesafio.usuario_id, func.sum(TentativaDesafio.respondidas), func.sum(TentativaDesafio.corretas))
+        .group_by(TentativaDesafio.usuario_id)
+        .order_by(TentativaDesafio.usuario_id)
+    )
+    arr = np.array([tuple(r) for r in rows], dtype=np.int64).reshape(-1, 3)
+    return arr[:, 0], arr[:, 1], arr[:, 2]
+
+
+def calcular(linhas: np.ndarray) -> Dict[int, dict]:
+    """{pergunta_id: estatísticas} a partir de _interacoes()."""
+    if not len(linhas):
+        return {}
+    perg, usr, alt, cor = linhas[:, 0], linhas[:, 1], linhas[:, 2], linhas[:, 3].astype(np.float64)
+    pergunta_ids, pi = np.unique(perg, return_inverse=True)
+    m = len(pergunta_ids)
+
+    respostas = np.bincount(pi, minlength=m)
+    acertos = np.bincount(pi, weights=cor, minlength=m)
+    ok = alt >= 0
+    escolhas = np.bincount(pi[ok] * 4 + alt[ok], minlength=4 * m).reshape(m, 4)
+
+    # escore do aluno sem o próprio item
+    uids, n_resp, n_corr = _placar()
+    ui = np.minimum(np.searchsorted(uids, usr), len(uids) - 1)
+    n_resto = n_resp[ui] - 1
+    valido = (uids[ui] == usr) & (n_resto > 0)
+    y = np.zeros(len(usr))
+    y[valido] = (n_corr[ui][valido] - cor[valido]) / n_resto[valido]
+
+    # correlação de Pearson por pergunta (x binário: sum x^2 = sum x)
+    pv, x, y = pi[valido], cor[valido], y[valido]
+    n = np.bincount(pv, minlength=m).astype(np.float64)
+    sx = np.bincount(pv, weights=x, minlength=m)
+    sy = np.bincount(pv, weights=y, minlength=m)
+    sxy = np.bincount(pv, weights=x * y, minlength=m)
+    syy = np.bincount(pv, weights=y * y, minlength=m)
+    den = (n * sx - sx ** 2) * (n * syy - sy ** 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = (n * sxy - sx * sy) / np.sqrt(den)
+    r = np.where((n >= 2) & (den > 1e-12), r, np.nan)
+
+    out = {}
+    for j, pid in enumerate(pergunta_ids):
+        out[int(pid)] = {
+            "respostas": int(respostas[j]),
+            "acertos": int(acertos[j]),
+            **{f"escolhas_{a}": int(escolhas[j, i]) for i, a in enumerate(ALTERNATIVAS)},
+            "taxa_acerto": float(acertos[j] / respostas[j]) if respostas[j] else None,
+            "discriminacao": None if np.isnan(r[j]) else round(float(r[j]), 4),
+        }
+    return out
+
+
+# =========================
+# Tabela (completa / incremental)
+# =========================
+
+def _gravar(stats: Dict[int, dict], ate_id: int, pergunta_ids: Optional[Iterable[int]] = None) -> None:
+    q = db.session.query(EstatisticaPergunta)
+    if pergunta_ids is not None:
+        q = q.filter(EstatisticaPergunta.pergunta_id.in_(list(pergunta_ids)))
+    q.delete(synchronize_session=False)
+    agora = datetime.utcnow()
+    if stats:
+        db.session.execute(EstatisticaPergunta.__table__.insert(), [
+            {"pergunta_id": pid, **v, "ate_interacao_id": ate_id, "atualizado_em": agora}
+            for pid, v in stats.items()
+        ])
+
+
+def recalcular_estatisticas() -> int:
+    """Refaz a tabela inteira numa passada. Faz commit; retorna nº de perguntas."""
+    ate_id = int(db.session.query(func.coalesce(func.max(Interacao.id), 0)).scalar())
+    stats = calcular(_interacoes(ate_id))
+    _gravar(stats, ate_id)
+    db.session.commit()
+    return len(stats)
+
+
+def atualizar_estatisticas() -> int:
+    """
+    Recalcula só as perguntas com interações novas (tudo, se a tabela está
+    vazia ou a marca não vale mais). Faz commit; retorna nº de perguntas recalculadas.
+    """
+    marca, gravadas = db.session.query(
+        func.max(EstatisticaPergunta.ate_interacao_id), func.coalesce(func.sum(EstatisticaPergunta.respostas), 0)
+    ).one()
+    if marca is None:
+        return recalcular_estatisticas()
+    existentes = db.session.query(func.count(Interacao.id)).filter(Interacao.id <= marca).scalar()
+    if int(existentes) != int(gravadas):
+        return recalcular_estatisticas()  # interações apagadas desde a última passada
+
+    ate_id = int(db.session.query(func.coalesce(func.max(Interacao.id), 0)).scalar())
+    if ate_id <= marca:
+        return 0
+    novas = [r[0] for r in db.session.query(Interacao.pergunta_id).filter(Interacao.id > marca).distinct()]
+    stats = calcular(_interacoes(ate_id, novas))
+    _gravar(stats, ate_id, novas)
+    db.session.commit()
+    return len(stats)
+
+
+# =========================
+# Segundo plano (AtividadesHubView)
+# =========================
+
+_pool: Optional[ThreadPoolExecutor] = None
+_rodando = False
+_ultima = 0.0
+_lock = threading.Lock()
+
+
+def _rodar(app) -> None:
+    global _rodando
+    try:
+        with app.app_context():
+            try:
+                atualizar_estatisticas()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("falha ao atualizar estatisticas_pergunta")
+            finally:
+                db.session.remove()
+    finally:
+        with _lock:
+            _rodando = False
+
+
+def agendar_atualizacao() -> bool:
+    """Põe atualizar_estatisticas() no worker, se não há uma rodando nem uma recente. Não bloqueia."""
+    global _pool, _rodando, _ultima
+    intervalo = float(current_app.config.get("ESTATISTICAS_INTERVALO", 60))
+    with _lock:
+        if _rodando or time.monotonic() - _ultima < intervalo:
+            return False
+        _rodando, _ultima = True, time.monotonic()
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="estatisticas")
+    _pool.submit(_rodar, current_app._get_current_object())
+    return True
+
+
+def distrator_principal(est: EstatisticaPergunta, correta: str) -> Optional[str]:
+    """Alternativa errada mais marcada (None se nenhuma errada foi marcada)."""
+    erradas = [(getattr(est, f"escolhas_{a}"), a) for a in ALTERNATIVAS if a != (correta or "").lower()]
+    n, letra = max(erradas)
+    return letra if n else None
+
+
+# =========================
+# Comando
+# =========================
+
+def configurar_estatisticas_itens(app) -> None:
+    @app.cli.command("estatisticas-perguntas")
+    @click.option("--completo", is_flag=True, help="refaz todas as perguntas (padrão: só as com respostas novas)")
+    def _estatisticas_perguntas(completo: bool):
+        """Atualiza estatisticas_pergunta (dificuldade, discriminação, alternativas)."""
+        n = recalcular_estatisticas() if completo else atualizar_estatisticas()
+        click.echo(f"{n} perguntas recalculadas")
@@ -0,0 +1,222 @@
+# app/formulas.py
+"""
+Fórmulas LaTeX pré-renderizadas em SVG (matplotlib mathtext).
+
+Enunciados e alternativas trazem LaTeX entre $...$ ou $$...$$, que o tutor
+tipografava com MathJax no navegador a cada pergunta (lento em celular
+simples). Aqui cada trecho vira um SVG uma vez só:
+
+    static/formulas/<h[:2]>/<h>.svg     h = sha256(versão do render, bloco, LaTeX)
+
+O nome é o hash do conteúdo: o mesmo trecho em várias perguntas é um arquivo
+só, e um arquivo nunca muda (pode ir para cache do navegador sem revalidar).
+
+  - ao salvar desafio/pergunta no AtividadesHubView, os trechos novos vão
+    para um pool em segundo plano (um worker: matplotlib não é thread-safe);
+  - o payload do tutor leva `formulas` = {trecho: url} só com os já
+    renderizados; o resto segue em LaTeX cru e o navegador usa o MathJax
+    (também para o que o mathtext não entende, como \\begin{pmatrix}: fica
+    marcado como falha e não é tentado de novo);
+  - trecho visto pelo tutor e ainda sem SVG entra no pool na hora.
+
+`flask formulas-renderizar` renderiza o catálogo inteiro (conteúdo antigo).
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import click
+from flask import current_app, url_for
+
+VERSAO_RENDER = "1"  # muda o hash de tudo se o jeito de renderizar mudar
+SUBPASTA = "formulas"
+
+# $$...$$ antes de $...$; \$ é dólar literal
+_TRECHO = re.compile(r"(?<!\\)\$\$(.+?)(?<!\\)\$\$|(?<!\\)\$(.+?)(?<!\\)\$", re.S)
+
+
+def trechos(texto: Optional[str]) -> List[Tuple[str, str, bool]]:
+    """[(trecho com delimitadores, LaTeX, bloco)] na ordem do texto."""
+    out = []
+    for m in _TRECHO.finditer(texto or ""):
+        latex = (m.group(1) if m.group(1) is not None else m.group(2)).strip()
+        if latex:
+            out.append((m.group(0), latex, m.group(1) is not None))
+    return out
+
+
+def chave(latex: str, bloco: bool) -> str:
+    return hashlib.sha256(f"{VERSAO_RENDER}|{int(bloco)}|{latex}".encode()).hexdigest()[:32]
+
+
+def _caminho(pasta: str, h: str, ext: str = "svg") -> str:
+    return os.path.join(pasta, h[:2], f"{h}.{ext}")
+
+
+def _pasta() -> str:
+    return os.path.join(current_app.static_folder, SUBPASTA)
+
+
+# =========================
+# Render
+# =========================
+
+def renderizar_svg(latex: str, bloco: bool = False, tamanho: float = 14.0) -> bytes:
+    """SVG do trecho (ValueError se o mathtext não entende o LaTeX)."""
+    from matplotlib.figure import Figure
+    from matplotlib.font_manager import FontProperties
+    from matplotlib.mathtext import MathTextParser
+
+    s = f"${latex}$"
+    prop = FontProperties(size=tamanho * (1.2 if bloco else 1.0))
+    largura, altura, profundidade, _, _ = MathTextParser("path").parse(s, dpi=72, prop=prop)
+    fig = Figure(figsize=(largura / 72.0, altura / 72.0))
+    fig.text(0, profundidade / altura, s, fontproperties=prop)
+    buf = io.BytesIO()
+    # sem fundo e sem data nos metadados: mesmo LaTeX, mesmos bytes
+    fig.savefig(buf, format="svg", dpi=72, transparent=True, metadata={"Date": None})
+    return buf.getvalue()
+
+
+def _gravar(pasta: str, h: str, latex: str, bloco: bool, tamanho: float) -> bool:
+    destino = _caminho(pasta, h)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    try:
+        dados, ext = renderizar_svg(latex, bloco, tamanho), "svg"
+    except Exception:  # mathtext cobre só parte do LaTeX: fica para o MathJax
+        dados, ext = b"", "erro"
+    final = _caminho(pasta, h, ext)
+    tmp = f"{final}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(dados)
+    os.replace(tmp, final)  # atômico: quem lê nunca vê arquivo pela metade
+    return ext == "svg"
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pendentes: set = set()
+_prontas: set = set()
+_falhas: set = set()
+_lock = threading.Lock()
+
+
+def _rodar(pasta: str, h: str, latex: str, bloco: bool, tamanho: float) -> None:
+    try:
+        ok = _gravar(pasta, h, latex, bloco, tamanho)
+        with _lock:
+            (_prontas if ok else _falhas).add(h)
+    finally:
+        with _lock:
+            _pendentes.discard(h)
+
+
+def _estado(pasta: str, h: str) -> str:
+    """'pronta', 'falha' ou 'falta'."""
+    if h in _prontas:
+        return "pronta"
+    if h in _falhas:
+        return "falha"
+    if os.path.exists(_caminho(pasta, h)):
+        with _lock:
+            _prontas.add(h)
+        return "pronta"
+    if os.path.exists(_caminho(pasta, h, "erro")):
+        with _lock:
+            _falhas.add(h)
+        return "falha"
+    return "falta"
+
+
+def agendar(*textos: Optional[str]) -> int:
+    """Põe no pool os trechos ainda sem SVG. Retorna quantos foram agendados."""
+    global _pool
+    cfg = current_app.config
+    if not cfg.get("FORMULAS_HABILITADAS", True):
+        return 0
+    pasta, tamanho = _pasta(), float(cfg.get("FORMULAS_TAMANHO", 14))
+    n = 0
+    for texto in textos:
+        for _trecho, latex, bloco in trechos(texto):
+            h = chave(latex, bloco)
+            with _lock:
+                if h in _pendentes:
+                    continue
+            if _estado(pasta, h) != "falta":
+                continue
+            with _lock:
+                if h in _pendentes:
+                    continue
+                _pendentes.add(h)
+                if _pool is None:
+                    _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="formulas")
+            _pool.submit(_rodar, pasta, h, latex, bloco, tamanho)
+            n += 1
+    return n
+
+
+def formulas_prontas(*textos: Optional[str]) -> Tuple[Dict[str, str], bool]:
+    """
+    ({trecho: url do SVG} dos já renderizados, completo). Os que faltam vão
+    para o pool; completo=False enquanto algum ainda está sendo renderizado.
+    """
+    if not current_app.config.get("FORMULAS_HABILITADAS", True):
+        return {}, True
+    pasta = _pasta()
+    urls: Dict[str, str] = {}
+    faltam = False
+    for texto in textos:
+        for trecho, latex, bloco in trechos(texto):
+            if trecho in urls:
+                continue
+            h = chave(latex, bloco)
+            estado = _estado(pasta, h)
+            if estado == "pronta":
+                urls[trecho] = url_for("static", filename=f"{SUBPASTA}/{h[:2]}/{h}.svg")
+            elif estado == "falta":
+                faltam = True
+    if faltam:
+        agendar(*textos)
+    return urls, not faltam
+
+
+def textos_do_desafio(desafio) -> List[Optional[str]]:
+    return [desafio.enunciado_texto, desafio.enunciado_latex]
+
+
+def textos_da_pergunta(pergunta) -> List[Optional[str]]:
+    return [pergunta.enunciado, pergunta.alt_a, pergunta.alt_b, pergunta.alt_c, pergunta.alt_d]
+
+
+# =========================
+# Comando
+# =========================
+
+def configurar_formulas(app) -> None:
+    @app.cli.command("formulas-renderizar")
+    def _formulas_renderizar():
+        """Renderiza em SVG todas as fórmulas do catálogo (desafios e perguntas)."""
+        from .modelos import Desafio, Pergunta
+
+        cfg = app.config
+        pasta, tamanho = _pasta(), float(cfg.get("FORMULAS_TAMANHO", 14))
+        vistos, ok, falhas = set(), 0, 0
+        textos = [t for d in Desafio.query.all() for t in textos_do_desafio(d)]
+        textos += [t for p in Pergunta.query.all() for t in textos_da_pergunta(p)]
+        for texto in textos:
+            for _trecho, latex, bloco in trechos(texto):
+                h = chave(latex, bloco)
+                if h in vistos:
+                    continue
+                vistos.add(h)
+                estado = _estado(pasta, h)
+                if estado == "falta":
+                    estado = "pronta" if _gravar(pasta, h, latex, bloco, tamanho) else "falha"
+                ok += estado == "pronta"
+                falhas += estado == "falha"
+        click.echo(f"{len(vistos)} fórmulas: {ok} em SVG, {falhas} ficam para o MathJax")
@@ -0,0 +1,386 @@
+# app/imagens.py
+"""
+Imagens de enunciado: validação, variantes responsivas e deduplicação.
+
+O upload (até MAX_CONTENT_LENGTH, 10 MB) era gravado como veio e servido
+inteiro a todo aluno: foto de celular de 4000 px com EXIF (e GPS) para
+ocupar ~900 px na tela. Agora:
+
+  - no request do upload (admin): Pillow valida o cabeçalho (formato,
+    dimensões, limite de pixels), o hash do conteúdo vira o nome, o arquivo
+    bruto vai para instance/uploads/enunciados/ (fora do static: nunca é
+    servido) e o principal sai já reduzido e sem metadados: o tutor tem
+    imagem desde o primeiro request (com no-store até as variantes ficarem
+    prontas, ver rotas.api_desafio);
+  - em segundo plano (pool de um worker): decodifica uma vez, aplica a
+    orientação do EXIF, descarta os metadados e grava em static/
+
+        uploads/enunciados/en_<h>.<jpg|png>            principal (maior largura)
+        uploads/enunciados/en_<h>-<v>-<largura>.webp   variantes WebP
+        uploads/enunciados/en_<h>-<v>-<largura>.<jpg|png>
+        uploads/enunciados/en_<h>-<v>.json             manifesto (larguras, tamanho)
+
+    JPEG para fotos; PNG se a imagem tem transparência. v = hash de
+    VERSAO_RENDER + larguras/qualidades da config: os arquivos são servidos
+    como imutáveis, então mudar o jeito de gerar gera outros nomes. O
+    principal é gravado uma vez e nunca reescrito. Requests de aluno nunca
+    decodificam imagem: sem variantes, levam o principal.
+
+Mesmo arquivo enviado duas vezes = mesmo hash = mesmo nome: processa uma
+vez e os desafios compartilham as variantes (por isso só se apaga quando
+nenhum outro desafio usa). Uploads antigos (en_<uuid>.<ext>) são
+processados na primeira vez que o tutor os pede, ou todos de uma vez com
+`flask imagens-processar` (também depois de mudar VERSAO_RENDER ou a config).
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import click
+from flask import current_app, url_for
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+VERSAO_RENDER = "1"  # muda o nome de todas as variantes se o jeito de gerar mudar
+PASTA = "uploads/enunciados"
+FORMATOS = {"JPEG", "PNG", "WEBP", "GIF"}
+
+
+def _cfg(nome: str, padrao):
+    return current_app.config.get(nome, padrao)
+
+
+def _privada() -> str:
+    return os.path.join(current_app.instance_path, "uploads", "enunciados")
+
+
+def _publica() -> str:
+    return os.path.join(current_app.static_folder, *PASTA.split("/"))
+
+
+def normalizar(rel: Optional[str]) -> Optional[str]:
+    """'uploads/enunciados/<nome>' a partir do valor salvo (caminho ou só o nome)."""
+    if not rel:
+        return None
+    nome = str(rel).replace("\\", "/").strip().lstrip("/")
+    if nome.lower() in {"none", "null", ""}:
+        return None
+    if nome.startswith(PASTA + "/"):
+        nome = nome[len(PASTA) + 1:]
+    if "/" in nome:
+        return None  # fora da pasta de enunciados: não é nosso
+    return f"{PASTA}/{nome}"
+
+
+def _base(rel: str) -> str:
+    """'en_<h>' de 'uploads/enunciados/en_<h>.<ext>'."""
+    return os.path.splitext(rel.rsplit("/", 1)[1])[0]
+
+
+def _larguras(config):
+    return sorted(int(w) for w in config.get("IMAGENS_LARGURAS", (480, 960, 1440)))
+
+
+def versao(config) -> str:
+    """Vai no nome das variantes: outra versão do render ou outra config = outros arquivos."""
+    partes = (VERSAO_RENDER, _larguras(config),
+              config.get("IMAGENS_QUALIDADE_WEBP", 75), config.get("IMAGENS_QUALIDADE_JPEG", 82))
+    return hashlib.sha256(repr(partes).encode()).hexdigest()[:8]
+
+
+# =========================
+# Upload (no request)
+# =========================
+
+def salvar_upload(file_storage) -> Optional[str]:
+    """
+    Valida e guarda o upload e grava o principal (reduzido, sem metadados);
+    retorna 'uploads/enunciados/en_<hash>.<jpg|png>' (ValueError se não for
+    imagem válida). As variantes saem em segundo plano.
+    """
+    if not file_storage or not getattr(file_storage, "filename", ""):
+        return None
+
+    dados = file_storage.read()
+    try:
+        with Image.open(io.BytesIO(dados)) as img:
+            formato, (largura, altura), modo = img.format, img.size, img.mode
+            transparente = modo in {"RGBA", "LA", "PA"} or "transparency" in img.info
+            img.verify()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+        raise ValueError("Arquivo de imagem inválido. Use PNG/JPG/WebP/GIF.")
+    if formato not in FORMATOS:
+        raise ValueError("Formato de imagem inválido. Use PNG/JPG/WebP/GIF.")
+    if largura * altura > int(_cfg("IMAGENS_MAX_PIXELS", 40_000_000)):
+        raise ValueError("Imagem grande demais.")
+
+    h = hashlib.sha256(dados).hexdigest()[:32]
+    ext = "png" if transparente else "jpg"
+    rel = f"{PASTA}/en_{h}.{ext}"
+    original = os.path.join(_privada(), f"en_{h}")  # sem extensão: o Pillow lê o formato
+    if not os.path.exists(original):  # mesmo conteúdo já enviado: reaproveita
+        os.makedirs(_privada(), exist_ok=True)
+        _gravar_atomico(original, dados)
+    principal = os.path.join(_publica(), f"en_{h}.{ext}")
+    if not os.path.exists(principal):
+        config = current_app.config
+        try:
+            img = _abrir(io.BytesIO(dados), _larguras(config)[-1], ext)
+        except (OSError, SyntaxError):  # cabeçalho ok, dados truncados
+            raise ValueError("Arquivo de imagem inválido. Use PNG/JPG/WebP/GIF.")
+        os.makedirs(_publica(), exist_ok=True)
+        _gravar_atomico(principal, _codificar(_reduzir(img, _larguras(config)[-1]), ext, config))
+    with _lock:
+        _falhas.discard(rel)
+    agendar(rel)
+    return rel
+
+
+def _gravar_atomico(destino: str, dados: bytes) -> None:
+    tmp = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(dados)
+    os.replace(tmp, destino)
+
+
+# =========================
+# Variantes (em segundo plano)
+# =========================
+
+def _origem(rel: str) -> Optional[str]:
+    """Arquivo a processar: o original privado ou, para uploads antigos, o do static."""
+    original = os.path.join(_privada(), _base(rel))
+    if os.path.exists(original):
+        return original
+    legado = os.path.join(current_app.static_folder, *rel.split("/"))
+    return legado if os.path.exists(legado) else None
+
+
+def _codificar(img: Image.Image, formato: str, config) -> bytes:
+    buf = io.BytesIO()
+    if formato == "webp":
+        img.save(buf, "WEBP", quality=int(config.get("IMAGENS_QUALIDADE_WEBP", 75)), method=4)
+    elif formato == "png":
+        img.save(buf, "PNG", optimize=True)
+    else:
+        img.convert("RGB").save(buf, "JPEG", quality=int(config.get("IMAGENS_QUALIDADE_JPEG", 82)),
+                                optimize=True, progressive=True)
+    return buf.getvalue()  # sem exif=/icc: metadados ficam para trás
+
+
+def _abrir(origem, largura_max: int, ext: Optional[str] = None) -> Image.Image:
+    """
+    Decodifica (JPEG já reduzido pelo draft) e aplica a orientação do EXIF;
+    RGBA para png, RGB para jpg (ext None: decide pela transparência).
+    """
+    with Image.open(origem) as bruta:
+        if bruta.format == "JPEG":
+            bruta.draft("RGB", (largura_max, largura_max))  # decodifica já reduzida (DCT)
+        img = ImageOps.exif_transpose(bruta)
+        img.load()
+    if ext not in {"jpg", "png"}:
+        ext = "png" if img.mode in {"RGBA", "LA", "P"} else "jpg"
+    return img.convert("RGBA" if ext == "png" else "RGB")
+
+
+def _reduzir(img: Image.Image, largura: int) -> Image.Image:
+    if img.width <= largura:
+        return img
+    return img.resize((largura, round(img.height * largura / img.width)), Image.LANCZOS)
+
+
+def processar(origem: str, destino: str, rel: str, config) -> Dict:
+    """Gera principal, variantes e manifesto de `rel` em `destino` (pasta do static)."""
+    base, ext = os.path.splitext(rel.rsplit("/", 1)[1])
+    ext = ext.lstrip(".")
+    larguras = _larguras(config)
+    v_render = versao(config)
+
+    img = _abrir(origem, larguras[-1], ext)
+    if ext not in {"jpg", "png"}:  # upload antigo (.webp/.gif/.jpeg): principal continua o arquivo
+        ext = "png" if img.mode == "RGBA" else "jpg"
+
+    os.makedirs(destino, exist_ok=True)
+    variantes = []
+    for w in sorted({w for w in larguras if w < img.width} | {min(img.width, larguras[-1])}):
+        reduzida = _reduzir(img, w)
+        v = {"largura": w, "altura": reduzida.height}
+        for formato in ("webp", ext):
+            nome = f"{base}-{v_render}-{w}.{formato}"
+            _gravar_atomico(os.path.join(destino, nome), _codificar(reduzida, formato, config))
+            v[formato if formato == "webp" else "padrao"] = nome
+        variantes.append(v)
+
+    maior = variantes[-1]
+    principal = os.path.join(destino, rel.rsplit("/", 1)[1])
+    if not os.path.exists(principal):  # servido como imutável: nunca reescrito
+        with open(os.path.join(destino, maior["padrao"]), "rb") as f:
+            _gravar_atomico(principal, f.read())
+    manifesto = {"largura": maior["largura"], "altura": maior["altura"], "variantes": variantes}
+    _gravar_atomico(os.path.join(destino, f"{base}-{v_render}.json"), json.dumps(manifesto).encode())
+    return manifesto
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pendentes: set = set()
+_manifestos: Dict[str, Dict] = {}
+_falhas: set = set()  # não tenta de novo a cada request (até reiniciar)
+_lock = threading.Lock()
+
+
+def _rodar(app, rel: str) -> None:
+    try:
+        with app.app_context():
+            m = processar(_origem(rel), _publica(), rel, app.config)
+            with _lock:
+                _manifestos[rel] = m
+    except Exception:
+        app.logger.exception("falha ao processar imagem %s", rel)
+        with _lock:
+            _falhas.add(rel)
+    finally:
+        with _lock:
+            _pendentes.discard(rel)
+
+
+def agendar(rel: Optional[str]) -> bool:
+    """Põe `rel` no pool se ainda não tem variantes."""
+    global _pool
+    rel = normalizar(rel)
+    if rel is None or manifesto(rel, agendar_se_falta=False) is not None:
+        return False
+    with _lock:
+        if rel in _pendentes or rel in _falhas:
+            return False
+    if _origem(rel) is None:  # arquivo sumiu: nada a fazer
+        with _lock:
+            _falhas.add(rel)
+        return False
+    with _lock:
+        if rel in _pendentes:
+            return False
+        _pendentes.add(rel)
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="imagens")
+    _pool.submit(_rodar, current_app._get_current_object(), rel)
+    return True
+
+
+def manifesto(rel: Optional[str], agendar_se_falta: bool = True) -> Optional[Dict]:
+    rel = normalizar(rel)
+    if rel is None:
+        return None
+    m = _manifestos.get(rel)
+    if m is not None:
+        return m
+    caminho = os.path.join(_publica(), f"{_base(rel)}-{versao(current_app.config)}.json")
+    try:
+        with open(caminho, "rb") as f:
+            m = json.loads(f.read())
+    except (OSError, ValueError):
+        if agendar_se_falta:
+            agendar(rel)
+        return None
+    with _lock:
+        _manifestos[rel] = m  # nome por hash + versão: o manifesto não muda
+    return m
+
+
+def imagem_responsiva(rel: Optional[str]) -> Optional[Dict]:
+    """
+    {'url', 'largura', 'altura', 'srcset', 'srcset_webp'} para o tutor (url = maior
+    variante), ou None enquanto as variantes não existem (o tutor usa url_imagem).
+    """
+    m = manifesto(rel)
+    if m is None:
+        return None
+    rel = normalizar(rel)
+
+    def _url(nome):
+        return url_for("static", filename=f"{PASTA}/{nome}")
+
+    return {
+        "url": _url(m["variantes"][-1]["padrao"]),
+        "largura": m["largura"],
+        "altura": m["altura"],
+        "srcset": ", ".join(f"{_url(v['padrao'])} {v['largura']}w" for v in m["variantes"]),
+        "srcset_webp": ", ".join(f"{_url(v['webp'])} {v['largura']}w" for v in m["variantes"]),
+    }
+
+
+def imagem_pendente(rel: Optional[str]) -> bool:
+    """Variantes ainda por gerar (na fila ou sendo processadas)."""
+    rel = normalizar(rel)
+    if rel is None or manifesto(rel) is not None:
+        return False
+    return rel in _pendentes
+
+
+def url_imagem(rel: Optional[str]) -> Optional[str]:
+    """URL do arquivo principal (ou do upload antigo, como está)."""
+    rel = normalizar(rel)
+    if rel is None:
+        return None
+    if not os.path.exists(os.path.join(_publica(), rel.rsplit("/", 1)[1])):
+        return None  # arquivo sumiu do disco
+    return url_for("static", filename=rel)
+
+
+# =========================
+# Remoção
+# =========================
+
+def remover(rel: Optional[str], exceto_desafio_id: Optional[int] = None) -> None:
+    """Apaga principal, variantes e original se nenhum outro desafio usa a imagem."""
+    from .modelos import Desafio
+
+    rel = normalizar(rel)
+    if rel is None:
+        return
+    usada = Desafio.query.filter(Desafio.enunciado_imagem.in_([rel, rel.rsplit("/", 1)[1]]))
+    if exceto_desafio_id is not None:
+        usada = usada.filter(Desafio.id != exceto_desafio_id)
+    if usada.first() is not None:
+        return
+
+    base = _base(rel)
+    with _lock:
+        _manifestos.pop(rel, None)
+    for pasta in (_publica(), _privada()):
+        if not os.path.isdir(pasta):
+            continue
+        for nome in os.listdir(pasta):
+            if os.path.splitext(nome)[0] == base or nome.startswith(base + "-"):
+                try:
+                    os.remove(os.path.join(pasta, nome))
+                except OSError:
+                    pass
+
+
+# =========================
+# Comando
+# =========================
+
+def configurar_imagens(app) -> None:
+    @app.cli.command("imagens-processar")
+    def _imagens_processar():
+        """Gera as variantes das imagens de enunciado que ainda não têm (uploads antigos)."""
+        from .modelos import Desafio
+
+        feitas, sem_arquivo = 0, 0
+        rels = {normalizar(r) for (r,) in Desafio.query.with_entities(Desafio.enunciado_imagem)}
+        for rel in sorted(r for r in rels if r):
+            if manifesto(rel, agendar_se_falta=False) is not None:
+                continue
+            origem = _origem(rel)
+            if origem is None:
+                sem_arquivo += 1
+                continue
+            processar(origem, _publica(), rel, app.config)
+            feitas += 1
+        click.echo(f"{len(rels - {None})} imagens: {feitas} processadas, {sem_arquivo} sem arquivo")
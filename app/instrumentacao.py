@@ -0,0 +1,204 @@
+# app/instrumentacao.py
+"""
+Instrumentação de SQL por request.
+
+Para cada request conta as consultas executadas, o tempo total gasto no banco
+e guarda as mais lentas. No fim do request os números são agregados por
+endpoint (histogramas de nº de consultas e de tempo de banco) e, quando a
+mesma "forma" de SQL (statement sem literais/listas de IN) se repete muitas
+vezes no mesmo request, o endpoint é marcado como suspeito de N+1.
+
+Em modo debug (ou com SQL_HEADERS=True) a resposta ganha os headers
+X-DB-Queries, X-DB-Time-ms e X-DB-N1.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metricas import sql_consultas_por_request
+
+log = logging.getLogger(__name__)
+
+# limites superiores dos buckets (o último é +Inf implícito)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200)
+BUCKETS_TEMPO_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+TOP_LENTAS = 5
+
+_RE_LISTA = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+|%s)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+|%s)\s*\)")
+_RE_NUMERO = re.compile(r"\b\d+\b")
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_ESPACO = re.compile(r"\s+")
+
+
+def forma_sql(statement: str) -> str:
+    """Normaliza um statement para agrupar repetições (N+1)."""
+    s = _RE_STRING.sub("'?'", statement)
+    s = _RE_LISTA.sub("(?...)", s)
+    s = _RE_NUMERO.sub("?", s)
+    return _RE_ESPACO.sub(" ", s).strip()
+
+
+def _bucket(valor: float, limites) -> int:
+    for i, lim in enumerate(limites):
+        if valor <= lim:
+            return i
+    return len(limites)
+
+
+# =========================
+# Agregado por endpoint
+# =========================
+
+class EstatisticasSQL:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_endpoint: Dict[str, Dict[str, Any]] = {}
+
+    def _novo(self) -> Dict[str, Any]:
+        return {
+            "requests": 0,
+            "consultas": 0,
+            "tempo_ms": 0.0,
+            "max_consultas": 0,
+            "hist_consultas": [0] * (len(BUCKETS_CONSULTAS) + 1),
+            "hist_tempo_ms": [0] * (len(BUCKETS_TEMPO_MS) + 1),
+            "lentas": [],  # [(ms, sql)]
+            "n_mais_1": {},  # forma -> {"requests": n, "max_repeticoes": m}
+        }
+
+    def registrar(self, endpoint: str, n: int, tempo_ms: float, lentas: List[tuple], repetidas: Dict[str, int]) -> None:
+        with self._lock:
+            e = self._por_endpoint.setdefault(endpoint, self._novo())
+            e["requests"] += 1
+            e["consultas"] += n
+            e["tempo_ms"] += tempo_ms
+            e["max_consultas"] = max(e["max_consultas"], n)
+            e["hist_consultas"][_bucket(n, BUCKETS_CONSULTAS)] += 1
+            e["hist_tempo_ms"][_bucket(tempo_ms, BUCKETS_TEMPO_MS)] += 1
+
+            if lentas:
+                e["lentas"] = sorted(e["lentas"] + lentas, key=lambda x: x[0], reverse=True)[:TOP_LENTAS]
+
+            for forma, rep in repetidas.items():
+                info = e["n_mais_1"].setdefault(forma, {"requests": 0, "max_repeticoes": 0})
+                info["requests"] += 1
+                info["max_repeticoes"] = max(info["max_repeticoes"], rep)
+
+    def resumo(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for endpoint, e in sorted(self._por_endpoint.items()):
+                reqs = e["requests"] or 1
+                out[endpoint] = {
+                    "requests": e["requests"],
+                    "consultas_media": round(e["consultas"] / reqs, 2),
+                    "consultas_max": e["max_consultas"],
+                    "tempo_db_ms_medio": round(e["tempo_ms"] / reqs, 3),
+                    # [[limite, n], ...] (lista para manter a ordem no JSON)
+                    "hist_consultas": [list(x) for x in zip([*map(str, BUCKETS_CONSULTAS), "+Inf"], e["hist_consultas"])],
+                    "hist_tempo_ms": [list(x) for x in zip([*map(str, BUCKETS_TEMPO_MS), "+Inf"], e["hist_tempo_ms"])],
+                    "lentas": [{"ms": round(ms, 3), "sql": sql} for ms, sql in e["lentas"]],
+                    "n_mais_1": e["n_mais_1"],
+                }
+            return out
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._por_endpoint.clear()
+
+
+estatisticas_sql = EstatisticasSQL()
+
+
+# =========================
+# Eventos do SQLAlchemy (todas as engines)
+# =========================
+
+def _estado() -> Optional[Dict[str, Any]]:
+    if not has_request_context():
+        return None
+    return g.get("_sql_instr")
+
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    if _estado() is not None:
+        conn.info.setdefault("_sql_t0", []).append(time.perf_counter())
+
+
+def _depois(conn, cursor, statement, parameters, context, executemany):
+    est = _estado()
+    if est is None:
+        return
+    pilha = conn.info.get("_sql_t0")
+    if not pilha:
+        return
+    t0 = pilha.pop()
+    ms = (time.perf_counter() - t0) * 1000.0
+    est["n"] += 1
+    est["tempo_ms"] += ms
+    est["formas"][forma_sql(statement)] += 1
+    est["consultas"].append((ms, statement, t0))
+
+
+def _registrar_eventos() -> None:
+    if not event.contains(Engine, "before_cursor_execute", _antes):
+        event.listen(Engine, "before_cursor_execute", _antes)
+        event.listen(Engine, "after_cursor_execute", _depois)
+
+
+# =========================
+# Ciclo do request (Flask)
+# =========================
+
+def configurar_instrumentacao(app) -> None:
+    if not app.config.get("SQL_INSTRUMENTACAO", True):
+        return
+
+    _registrar_eventos()
+
+    @app.before_request
+    def _sql_inicio():
+        # consultas: [(ms, statement, perf_counter do início)]
+        g._sql_instr = {"n": 0, "tempo_ms": 0.0, "formas": Counter(), "consultas": []}
+
+    @app.after_request
+    def _sql_fim(resp):
+        est = g.pop("_sql_instr", None)
+        if est is None:
+            return resp
+
+        limiar = int(app.config.get("SQL_N_MAIS_1_LIMIAR", 5))
+        repetidas = {f: c for f, c in est["formas"].items() if c >= limiar}
+        lentas = [c[:2] for c in sorted(est["consultas"], key=lambda x: x[0], reverse=True)[:TOP_LENTAS]]
+        endpoint = request.endpoint or "<sem endpoint>"
+
+        estatisticas_sql.registrar(endpoint, est["n"], est["tempo_ms"], lentas, repetidas)
+        if request.endpoint and request.endpoint != "static":
+            sql_consultas_por_request.observar(est["n"], endpoint=endpoint)
+
+        if repetidas:
+            log.warning(
+                "Possível N+1 em %s: %s",
+                endpoint,
+                "; ".join(f"{c}x {f[:120]}" for f, c in repetidas.items()),
+            )
+
+        mostrar = app.config.get("SQL_HEADERS")
+        if mostrar is None:
+            mostrar = app.debug
+        if mostrar:
+            resp.headers["X-DB-Queries"] = str(est["n"])
+            resp.headers["X-DB-Time-ms"] = f"{est['tempo_ms']:.2f}"
+            if repetidas:
+                resp.headers["X-DB-N1"] = str(max(repetidas.values()))
+        return resp
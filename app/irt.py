@@ -0,0 +1,360 @@
+# app/irt.py
+"""
+Calibração TRI (teoria de resposta ao item) do banco de perguntas.
+
+Modelo logístico com 1 ou 2 parâmetros (IRT_MODELO = "1pl" | "2pl"):
+
+    P(acerto do aluno u na pergunta i) = 1 / (1 + exp(-a_i (theta_u - b_i)))
+
+    theta_u  habilidade do aluno        (habilidades_aluno)
+    b_i      dificuldade da pergunta    (calibracao_perguntas)
+    a_i      discriminação (2PL; 1 no 1PL), a = exp(alfa)
+
+O ajuste é MAP conjunto (máxima verossimilhança com priors normais em theta,
+b e alfa, que fixam a escala e evitam estimativas infinitas para quem acertou
+ou errou tudo). As respostas ficam como três vetores (aluno, pergunta,
+acerto) — a matriz esparsa aluno × pergunta em formato COO — e perda e
+gradiente saem de operações vetorizadas com np.bincount; o otimizador é o
+L-BFGS-B do SciPy. Com muitas respostas, o cálculo é dividido em blocos
+processados em paralelo (IRT_THREADS; o NumPy libera o GIL nas operações).
+
+calibrar() é incremental:
+  - sem calibração anterior, ou com muitas respostas novas (mais que
+    IRT_FRACAO_INCREMENTAL do total): ajuste conjunto, partindo dos valores
+    gravados (warm start: poucas iterações quando pouco mudou);
+  - com poucas respostas novas: perguntas fixas, só as habilidades dos alunos
+    que responderam algo são reestimadas (Newton vetorizado por aluno).
+
+Usado pelo AnaliseView (habilidade do aluno e da turma) e pela seleção
+adaptativa (desafios do tópico em ordem de dificuldade próxima à habilidade).
+"""
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+import click
+import numpy as np
+from flask import current_app
+from scipy.optimize import minimize
+from scipy.special import expit
+from sqlalchemy import func, select
+
+from .dados_analise import tocar_turmas
+from .modelos import db, CalibracaoPergunta, HabilidadeAluno, Interacao, Pergunta, TentativaDesafio
+
+# desvios dos priors: theta ~ N(0, 1), b ~ N(0, 2), alfa = log a ~ N(0, 0.5)
+SIGMA_THETA = 1.0
+SIGMA_B = 2.0
+SIGMA_ALFA = 0.5
+LIMITE = 6.0        # |theta|, |b| <= 6
+LIMITE_ALFA = 2.0   # a entre e^-2 e e^2 (evita overflow nas buscas de linha)
+
+BLOCO_PARALELO = 250_000  # respostas por bloco quando o cálculo é dividido entre threads
+
+
+def _cfg(chave: str, padrao):
+    return current_app.config.get(chave, padrao)
+
+
+# =========================
+# Ajuste (vetorizado)
+# =========================
+
+class Respostas:
+    """Respostas em COO: índices de aluno e pergunta (0..n-1) e acerto (0/1)."""
+
+    __slots__ = ("aluno", "item", "y", "usuario_ids", "pergunta_ids")
+
+    def __init__(self, usuarios: np.ndarray, perguntas: np.ndarray, y: np.ndarray):
+        self.usuario_ids, self.aluno = np.unique(usuarios, return_inverse=True)
+        self.pergunta_ids, self.item = np.unique(perguntas, return_inverse=True)
+        self.y = y.astype(np.float64)
+
+    def __len__(self) -> int:
+        return len(self.y)
+
+
+def _blocos(n: int, threads: int):
+    if threads <= 1 or n < 2 * BLOCO_PARALELO:
+        return [slice(0, n)]
+    passo = max(BLOCO_PARALELO, -(-n // threads))
+    return [slice(i, min(i + passo, n)) for i in range(0, n, passo)]
+
+
+def _perda_bloco(sl, aluno, item, y, theta, b, a, n_u, n_i, dois_pl):
+    u, i, yy = aluno[sl], item[sl], y[sl]
+    ai = a[i]
+    d = theta[u] - b[i]
+    z = ai * d
+    # softplus(z) - y z, estável para |z| grande
+    nll = float(np.sum(np.maximum(z, 0) + np.log1p(np.exp(-np.abs(z))) - yy * z))
+    r = expit(z) - yy
+    ra = r * ai
+    g_theta = np.bincount(u, weights=ra, minlength=n_u)
+    g_b = -np.bincount(i, weights=ra, minlength=n_i)
+    g_alfa = np.bincount(i, weights=ra * d, minlength=n_i) if dois_pl else None
+    return nll, g_theta, g_b, g_alfa
+
+
+def _objetivo(x, resp: Respostas, dois_pl: bool, pool: Optional[ThreadPoolExecutor], blocos):
+    n_u, n_i = len(resp.usuario_ids), len(resp.pergunta_ids)
+    theta, b = x[:n_u], x[n_u:n_u + n_i]
+    alfa = x[n_u + n_i:] if dois_pl else None
+    a = np.exp(alfa) if dois_pl else np.ones(n_i)
+
+    args = (resp.aluno, resp.item, resp.y, theta, b, a, n_u, n_i, dois_pl)
+    if pool is None or len(blocos) == 1:
+        partes = [_perda_bloco(sl, *args) for sl in blocos]
+    else:
+        partes = list(pool.map(lambda sl: _perda_bloco(sl, *args), blocos))
+
+    nll = sum(p[0] for p in partes)
+    g_theta = sum(p[1] for p in partes)
+    g_b = sum(p[2] for p in partes)
+
+    # priors
+    nll += 0.5 * (theta @ theta) / SIGMA_THETA ** 2 + 0.5 * (b @ b) / SIGMA_B ** 2
+    g_theta = g_theta + theta / SIGMA_THETA ** 2
+    g_b = g_b + b / SIGMA_B ** 2
+    if not dois_pl:
+        return nll, np.concatenate([g_theta, g_b])
+
+    g_alfa = sum(p[3] for p in partes) + alfa / SIGMA_ALFA ** 2
+    nll += 0.5 * (alfa @ alfa) / SIGMA_ALFA ** 2
+    return nll, np.concatenate([g_theta, g_b, g_alfa])
+
+
+def ajustar(resp: Respostas, modelo: str = "2pl", theta0=None, b0=None, alfa0=None,
+            max_iter: int = 500, threads: int = 1) -> Dict[str, np.ndarray]:
+    """Ajuste conjunto (MAP). theta0/b0/alfa0: ponto de partida (warm start)."""
+    dois_pl = modelo == "2pl"
+    n_u, n_i = len(resp.usuario_ids), len(resp.pergunta_ids)
+    x0 = [np.zeros(n_u) if theta0 is None else theta0, np.zeros(n_i) if b0 is None else b0]
+    if dois_pl:
+        x0.append(np.zeros(n_i) if alfa0 is None else alfa0)
+
+    limites = [(-LIMITE, LIMITE)] * (n_u + n_i) + ([(-LIMITE_ALFA, LIMITE_ALFA)] * n_i if dois_pl else [])
+    blocos = _blocos(len(resp), threads)
+    pool = ThreadPoolExecutor(max_workers=threads) if len(blocos) > 1 else None
+    try:
+        res = minimize(_objetivo, np.concatenate(x0), args=(resp, dois_pl, pool, blocos), jac=True,
+                       method="L-BFGS-B", bounds=limites, options={"maxiter": int(max_iter)})
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    x = res.x
+    return {
+        "theta": x[:n_u],
+        "b": x[n_u:n_u + n_i],
+        "a": np.exp(x[n_u + n_i:]) if dois_pl else np.ones(n_i),
+        "iteracoes": int(res.nit),
+        "convergiu": bool(res.success),
+    }
+
+
+def ajustar_habilidades(resp: Respostas, b: np.ndarray, a: np.ndarray, theta0=None, passos: int = 15) -> np.ndarray:
+    """Perguntas fixas: Newton vetorizado na habilidade de cada aluno (b, a alinhados a resp.pergunta_ids)."""
+    n_u = len(resp.usuario_ids)
+    theta = np.zeros(n_u) if theta0 is None else theta0.astype(np.float64).copy()
+    ai, bi = a[resp.item], b[resp.item]
+    for _ in range(passos):
+        p = expit(ai * (theta[resp.aluno] - bi))
+        g = np.bincount(resp.aluno, weights=(p - resp.y) * ai, minlength=n_u) + theta / SIGMA_THETA ** 2
+        h = np.bincount(resp.aluno, weights=p * (1 - p) * ai * ai, minlength=n_u) + 1 / SIGMA_THETA ** 2
+        passo = np.clip(g / h, -1.0, 1.0)  # amortecido: longe do ótimo h ~ prior
+        theta = np.clip(theta - passo, -LIMITE, LIMITE)
+        if np.max(np.abs(passo), initial=0.0) < 1e-6:
+            break
+    return theta
+
+
+# =========================
+# Dados e tabelas
+# =========================
+
+def _respostas(ate_id: int, usuarios_desde: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(usuario_id, pergunta_id, acerto) até a interação ate_id; usuarios_desde: só alunos com interação nova."""
+    q = (
+        select(TentativaDesafio.usuario_id, Interacao.pergunta_id, Interacao.foi_correta)
+        .join(TentativaDesafio, TentativaDesafio.id == Interacao.tentativa_id)
+        .where(Interacao.id <= ate_id)
+    )
+    if usuarios_desde is not None:
+        novos = (
+            select(TentativaDesafio.usuario_id)
+            .join(Interacao, Interacao.tentativa_id == TentativaDesafio.id)
+            .where(Interacao.id > usuarios_desde)
+        )
+        q = q.where(TentativaDesafio.usuario_id.in_(novos))
+    # tuple(r): numpy converte Row elemento a elemento (muito mais lento)
+    arr = np.array([tuple(r) for r in db.session.execute(q)], dtype=np.int64).reshape(-1, 3)
+    return arr[:, 0], arr[:, 1], arr[:, 2]
+
+
+def _gravados(modelo, chave, ids: np.ndarray, colunas) -> Tuple[np.ndarray, ...]:
+    """Valores gravados alinhados a ids (NaN onde não há)."""
+    saida = [np.full(len(ids), np.nan) for _ in colunas]
+    if not len(ids):
+        return tuple(saida)
+    rows = db.session.execute(select(getattr(modelo, chave), *[getattr(modelo, c) for c in colunas]))
+    arr = np.array([tuple(r) for r in rows], dtype=np.float64).reshape(-1, 1 + len(colunas))
+    pos = np.searchsorted(ids, arr[:, 0])
+    ok = (pos < len(ids)) & (ids[np.minimum(pos, len(ids) - 1)] == arr[:, 0])
+    for k in range(len(colunas)):
+        saida[k][pos[ok]] = arr[ok, 1 + k]
+    return tuple(saida)
+
+
+def _gravar_habilidades(resp: Respostas, theta: np.ndarray, ate_id: int, substituir_tudo: bool) -> None:
+    if substituir_tudo:
+        db.session.query(HabilidadeAluno).delete(synchronize_session=False)
+    else:
+        ids = resp.usuario_ids.tolist()
+        for k in range(0, len(ids), 10_000):  # limite de parâmetros do SQLite
+            db.session.query(HabilidadeAluno).filter(
+                HabilidadeAluno.usuario_id.in_(ids[k:k + 10_000])
+            ).delete(synchronize_session=False)
+    n = np.bincount(resp.aluno, minlength=len(resp.usuario_ids))
+    agora = datetime.utcnow()
+    db.session.execute(HabilidadeAluno.__table__.insert(), [
+        {"usuario_id": int(uid), "habilidade": float(t), "respostas": int(k),
+         "ate_interacao_id": ate_id, "atualizado_em": agora}
+        for uid, t, k in zip(resp.usuario_ids, theta, n)
+    ])
+
+
+def calibrar(completo: bool = False, modelo: Optional[str] = None) -> Dict[str, object]:
+    """
+    Calibra (ou atualiza) perguntas e habilidades. Faz commit.
+    Retorna um resumo {modo, respostas, alunos, perguntas, iteracoes, segundos}.
+    """
+    t0 = time.perf_counter()
+    modelo = str(modelo or _cfg("IRT_MODELO", "2pl")).lower()
+    ate_id = int(db.session.query(func.coalesce(func.max(Interacao.id), 0)).scalar())
+    marca = db.session.query(func.max(HabilidadeAluno.ate_interacao_id)).scalar()
+    base = int(db.session.query(func.coalesce(func.sum(CalibracaoPergunta.respostas), 0)).scalar())
+
+    if marca is not None and not completo:
+        if ate_id <= marca:
+            return {"modo": "nada novo", "respostas": 0, "segundos": time.perf_counter() - t0}
+        novas = db.session.query(func.count(Interacao.id)).filter(Interacao.id > marca).scalar()
+        if base and novas <= float(_cfg("IRT_FRACAO_INCREMENTAL", 0.05)) * base:
+            return _atualizar_habilidades(int(marca), ate_id, t0)
+
+    usuarios, perguntas, y = _respostas(ate_id)
+    if not len(y):
+        return {"modo": "sem respostas", "respostas": 0, "segundos": time.perf_counter() - t0}
+    resp = Respostas(usuarios, perguntas, y)
+
+    # warm start a partir do que está gravado (novos começam em 0 / a = 1)
+    (theta0,) = _gravados(HabilidadeAluno, "usuario_id", resp.usuario_ids, ("habilidade",))
+    b0, a0 = _gravados(CalibracaoPergunta, "pergunta_id", resp.pergunta_ids, ("dificuldade", "discriminacao"))
+    fit = ajustar(
+        resp, modelo,
+        theta0=np.nan_to_num(theta0), b0=np.nan_to_num(b0), alfa0=np.log(np.nan_to_num(a0, nan=1.0)),
+        max_iter=int(_cfg("IRT_MAX_ITER", 500)),
+        threads=int(_cfg("IRT_THREADS", 0) or os.cpu_count() or 1),
+    )
+
+    agora = datetime.utcnow()
+    n_item = np.bincount(resp.item, minlength=len(resp.pergunta_ids))
+    db.session.query(CalibracaoPergunta).delete(synchronize_session=False)
+    db.session.execute(CalibracaoPergunta.__table__.insert(), [
+        {"pergunta_id": int(pid), "dificuldade": float(b), "discriminacao": float(a), "respostas": int(k),
+         "modelo": modelo, "atualizado_em": agora}
+        for pid, b, a, k in zip(resp.pergunta_ids, fit["b"], fit["a"], n_item)
+    ])
+    _gravar_habilidades(resp, fit["theta"], ate_id, substituir_tudo=True)
+    tocar_turmas(db.session)  # habilidade aparece na análise (ETag das telas)
+    db.session.commit()
+    return {
+        "modo": f"ajuste {modelo}", "respostas": len(resp), "alunos": len(resp.usuario_ids),
+        "perguntas": len(resp.pergunta_ids), "iteracoes": fit["iteracoes"], "convergiu": fit["convergiu"],
+        "segundos": time.perf_counter() - t0,
+    }
+
+
+def _atualizar_habilidades(marca: int, ate_id: int, t0: float) -> Dict[str, object]:
+    usuarios, perguntas, y = _respostas(ate_id, usuarios_desde=marca)
+    if not len(y):
+        return {"modo": "nada novo", "respostas": 0, "segundos": time.perf_counter() - t0}
+    resp = Respostas(usuarios, perguntas, y)
+    b, a = _gravados(CalibracaoPergunta, "pergunta_id", resp.pergunta_ids, ("dificuldade", "discriminacao"))
+    calibradas = ~np.isnan(b)
+    # perguntas ainda não calibradas ficam de fora até o próximo ajuste conjunto
+    manter = calibradas[resp.item]
+    resp = Respostas(usuarios[manter], perguntas[manter], y[manter])
+    b, a = b[calibradas], a[calibradas]
+    if not len(resp):
+        return {"modo": "nada novo", "respostas": 0, "segundos": time.perf_counter() - t0}
+
+    (theta0,) = _gravados(HabilidadeAluno, "usuario_id", resp.usuario_ids, ("habilidade",))
+    theta = ajustar_habilidades(resp, b, a, theta0=np.nan_to_num(theta0))
+    _gravar_habilidades(resp, theta, ate_id, substituir_tudo=False)
+    tocar_turmas(db.session)
+    db.session.commit()
+    return {"modo": "habilidades", "respostas": len(resp), "alunos": len(resp.usuario_ids),
+            "segundos": time.perf_counter() - t0}
+
+
+# =========================
+# Leitura (análise e seleção)
+# =========================
+
+def habilidades(usuario_ids: Iterable[int]) -> Dict[int, float]:
+    ids = [int(u) for u in usuario_ids]
+    if not ids:
+        return {}
+    rows = db.session.query(HabilidadeAluno.usuario_id, HabilidadeAluno.habilidade).filter(
+        HabilidadeAluno.usuario_id.in_(ids)
+    )
+    return {int(u): float(t) for u, t in rows}
+
+
+def habilidade_turma(turma_id: int) -> Optional[Dict[str, float]]:
+    """Média e desvio da habilidade dos alunos da turma (None sem calibração)."""
+    from .modelos import Matricula
+
+    media, media_q, n = db.session.query(
+        func.avg(HabilidadeAluno.habilidade),
+        func.avg(HabilidadeAluno.habilidade * HabilidadeAluno.habilidade),
+        func.count(HabilidadeAluno.id),
+    ).join(Matricula, Matricula.usuario_id == HabilidadeAluno.usuario_id).filter(
+        Matricula.turma_id == int(turma_id), Matricula.papel == "aluno"
+    ).one()
+    if not n:
+        return None
+    return {"media": float(media), "desvio": float(max(media_q - media * media, 0.0)) ** 0.5, "n": int(n)}
+
+
+def dificuldade_por_desafio(desafio_ids: Iterable[int]) -> Dict[int, float]:
+    """Dificuldade média (b) das perguntas calibradas de cada desafio."""
+    ids = [int(d) for d in desafio_ids]
+    if not ids:
+        return {}
+    rows = (
+        db.session.query(Pergunta.desafio_id, func.avg(CalibracaoPergunta.dificuldade))
+        .join(CalibracaoPergunta, CalibracaoPergunta.pergunta_id == Pergunta.id)
+        .filter(Pergunta.desafio_id.in_(ids))
+        .group_by(Pergunta.desafio_id)
+    )
+    return {int(d): float(b) for d, b in rows}
+
+
+# =========================
+# Comando
+# =========================
+
+def configurar_irt(app) -> None:
+    @app.cli.command("irt-calibrar")
+    @click.option("--completo", is_flag=True, help="ajuste conjunto mesmo com poucas respostas novas")
+    @click.option("--modelo", type=click.Choice(["1pl", "2pl"]), default=None, help="padrão: IRT_MODELO")
+    def _irt_calibrar(completo: bool, modelo: Optional[str]):
+        """Calibra dificuldade/discriminação das perguntas e habilidade dos alunos (TRI)."""
+        r = calibrar(completo=completo, modelo=modelo)
+        click.echo(", ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in r.items()))
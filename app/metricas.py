@@ -0,0 +1,254 @@
+# app/metricas.py
+"""
+Métricas no formato de exposição de texto do Prometheus (sem dependências).
+
+Contadores e histogramas vivem em memória, por processo. Com vários workers
+(gunicorn) cada processo expõe os seus; o Prometheus soma na consulta.
+
+Endpoint: GET /metrics
+  - liberado para admin logado, ou
+  - com "Authorization: Bearer <METRICS_TOKEN>" (para o scraper), se configurado.
+"""
+from __future__ import annotations
+
+import hmac
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+from flask import Response, abort, g, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _escapar(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(nomes: Tuple[str, ...], valores: Tuple[str, ...], extra: str = "") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class _Metrica(ABC):
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, labels: Iterable[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.label_nomes = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _chave(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.label_nomes)
+
+    @abstractmethod
+    def linhas(self) -> List[str]:
+        """Linhas de amostra no formato de texto (sem # HELP/# TYPE)."""
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, labels=()):
+        super().__init__(nome, ajuda, labels)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, valor: float = 1.0, **labels) -> None:
+        k = self._chave(labels)
+        with self._lock:
+            self._valores[k] = self._valores.get(k, 0.0) + valor
+
+    def valor(self, **labels) -> float:
+        with self._lock:
+            return self._valores.get(self._chave(labels), 0.0)
+
+    def linhas(self) -> List[str]:
+        with self._lock:
+            itens = sorted(self._valores.items())
+        return [f"{self.nome}{_labels(self.label_nomes, k)} {_fmt(v)}" for k, v in itens]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, labels=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nome, ajuda, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # [contagens..., soma, total]
+
+    def observar(self, valor: float, **labels) -> None:
+        k = self._chave(labels)
+        with self._lock:
+            s = self._series.get(k)
+            if s is None:
+                s = self._series[k] = [0.0] * (len(self.buckets) + 2)
+            for i, lim in enumerate(self.buckets):
+                if valor <= lim:
+                    s[i] += 1
+                    break
+            s[-2] += valor
+            s[-1] += 1
+
+    @contextmanager
+    def cronometrar(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - t0, **labels)
+
+    def linhas(self) -> List[str]:
+        with self._lock:
+            itens = sorted((k, list(v)) for k, v in self._series.items())
+        out = []
+        for k, s in itens:
+            acumulado = 0.0
+            for i, lim in enumerate(self.buckets):
+                acumulado += s[i]
+                le = _labels(self.label_nomes, k, 'le="%s"' % _fmt(lim))
+                out.append(f"{self.nome}_bucket{le} {_fmt(acumulado)}")
+            le = _labels(self.label_nomes, k, 'le="+Inf"')
+            out.append(f"{self.nome}_bucket{le} {_fmt(s[-1])}")
+            out.append(f"{self.nome}_sum{_labels(self.label_nomes, k)} {_fmt(s[-2])}")
+            out.append(f"{self.nome}_count{_labels(self.label_nomes, k)} {_fmt(s[-1])}")
+        return out
+
+
+class Registro:
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+
+    def _registrar(self, m: _Metrica) -> _Metrica:
+        existente = self._metricas.get(m.nome)
+        if existente is not None:
+            return existente
+        self._metricas[m.nome] = m
+        return m
+
+    def contador(self, nome: str, ajuda: str, labels: Iterable[str] = ()) -> Contador:
+        return self._registrar(Contador(nome, ajuda, labels))  # type: ignore[return-value]
+
+    def histograma(self, nome: str, ajuda: str, labels: Iterable[str] = (), buckets=BUCKETS_SEGUNDOS) -> Histograma:
+        return self._registrar(Histograma(nome, ajuda, labels, buckets))  # type: ignore[return-value]
+
+    def exposicao(self) -> str:
+        partes: List[str] = []
+        for nome in sorted(self._metricas):
+            m = self._metricas[nome]
+            partes.append(f"# HELP {m.nome} {m.ajuda}")
+            partes.append(f"# TYPE {m.nome} {m.tipo}")
+            partes.extend(m.linhas())
+        return "\n".join(partes) + "\n"
+
+
+registro = Registro()
+
+# =========================
+# Métricas da aplicação
+# =========================
+
+respostas_total = registro.contador(
+    "swm_respostas_total", "Respostas registradas no tutor.", ("correta",)
+)
+desafios_iniciados_total = registro.contador(
+    "swm_desafios_iniciados_total", "Tentativas de desafio criadas."
+)
+desafios_finalizados_total = registro.contador(
+    "swm_desafios_finalizados_total",
+    "Tentativas finalizadas (dominou=true|false), uma vez por tentativa. "
+    "Taxa de domínio = dominou=\"true\" / (true + false).",
+    ("dominou",),
+)
+kmeans_segundos = registro.histograma(
+    "swm_kmeans_segundos", "Tempo de execução do k-means.", ("origem",)
+)
+relatorio_segundos = registro.histograma(
+    "swm_relatorio_segundos", "Tempo de geração dos relatórios CSV de clusters."
+)
+db_commit_segundos = registro.histograma(
+    "swm_db_commit_segundos", "Latência de Session.commit (inclui o flush)."
+)
+http_request_segundos = registro.histograma(
+    "swm_http_request_segundos", "Latência dos requests por endpoint.", ("endpoint", "metodo", "status")
+)
+sql_consultas_por_request = registro.histograma(
+    "swm_sql_consultas_por_request", "Consultas SQL por request.", ("endpoint",), buckets=BUCKETS_CONSULTAS
+)
+
+
+# =========================
+# Ganchos
+# =========================
+
+def _antes_commit(session):
+    session.info["_metricas_commit_t0"] = time.perf_counter()
+
+
+def _depois_commit(session):
+    t0 = session.info.pop("_metricas_commit_t0", None)
+    if t0 is not None:
+        db_commit_segundos.observar(time.perf_counter() - t0)
+
+
+def _depois_rollback(session):
+    session.info.pop("_metricas_commit_t0", None)
+
+
+def _registrar_eventos() -> None:
+    if not event.contains(Session, "before_commit", _antes_commit):
+        event.listen(Session, "before_commit", _antes_commit)
+        event.listen(Session, "after_commit", _depois_commit)
+        event.listen(Session, "after_rollback", _depois_rollback)
+
+
+def _autorizado(app) -> bool:
+    token = app.config.get("METRICS_TOKEN")
+    if token:
+        auth = request.headers.get("Authorization", "")
+        if auth.startswith("Bearer ") and hmac.compare_digest(auth[7:].strip(), str(token)):
+            return True
+    return bool(current_user.is_authenticated and getattr(current_user, "is_admin", False))
+
+
+def configurar_metricas(app) -> None:
+    _registrar_eventos()
+
+    @app.before_request
+    def _metricas_inicio():
+        g._metricas_t0 = time.perf_counter()
+
+    @app.after_request
+    def _metricas_fim(resp):
+        t0 = g.pop("_metricas_t0", None)
+        if t0 is not None and request.endpoint and request.endpoint != "static":
+            http_request_segundos.observar(
+                time.perf_counter() - t0,
+                endpoint=request.endpoint,
+                metodo=request.method,
+                status=str(resp.status_code),
+            )
+        return resp
+
+    def metrics():
+        if not _autorizado(app):
+            abort(403)
+        return Response(registro.exposicao(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+    app.add_url_rule("/metrics", endpoint="metrics", view_func=metrics)
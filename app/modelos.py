@@ -1,10 +1,22 @@
 from datetime import datetime
 from flask_login import UserMixin
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.dialects import postgresql, sqlite
 
 db = SQLAlchemy()
 
 
+def insert_dialeto(tabela):
+    """insert() com ON CONFLICT (SQLite/PostgreSQL) na conexão da sessão; None nos outros bancos."""
+    nome = db.session.get_bind().dialect.name
+    if nome == "sqlite":
+        return sqlite.insert(tabela)
+    if nome == "postgresql":
+        return postgresql.insert(tabela)
+    return None
+
+
 turmas_disciplinas = db.Table(
     "turmas_disciplinas",
     db.Column("turma_id", db.Integer, db.ForeignKey("turmas.id"), primary_key=True),
@@ -38,6 +50,9 @@ class Turma(db.Model):
     descricao = db.Column(db.Text)
     criado_em = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # incrementada a cada resposta/matrícula: invalida os snapshots de análise
+    versao_dados = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
     disciplinas = db.relationship(
         "Disciplina",
         secondary=turmas_disciplinas,
@@ -132,6 +147,8 @@ class Desafio(db.Model):
     enunciado_imagem = db.Column(db.String(255))  # só o nome do arquivo
 
     criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    # incrementada a cada mudança no conteúdo (desafio, perguntas, nome do tópico/disciplina): ETag do tutor
+    versao = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     perguntas = db.relationship(
         "Pergunta",
@@ -162,8 +179,23 @@ class Pergunta(db.Model):
     correta = db.Column(db.String(1), nullable=False)  # a|b|c|d
 
 
+# predicado do índice parcial de tentativas abertas (SQLite e PostgreSQL)
+TENTATIVA_ABERTA = db.text("NOT finalizada")
+
+
 class TentativaDesafio(db.Model):
     __tablename__ = "tentativas_desafio"
+    __table_args__ = (
+        # no máximo uma tentativa aberta por aluno/turma
+        db.Index(
+            "uq_tentativa_aberta_usuario_turma",
+            "usuario_id",
+            "turma_id",
+            unique=True,
+            sqlite_where=TENTATIVA_ABERTA,
+            postgresql_where=TENTATIVA_ABERTA,
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=False)
@@ -178,6 +210,12 @@ class TentativaDesafio(db.Model):
     taxa_acerto_final = db.Column(db.Float)
     dominou = db.Column(db.Boolean)
 
+    # contadores mantidos a cada resposta (evitam COUNT em interacoes/perguntas)
+    respondidas = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    corretas = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    total_perguntas = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    proxima_pergunta_id = db.Column(db.Integer, db.ForeignKey("perguntas.id"))
+
     usuario = db.relationship("Usuario")
     turma = db.relationship("Turma")
     desafio = db.relationship("Desafio")
@@ -193,6 +231,10 @@ class TentativaDesafio(db.Model):
 
 class Interacao(db.Model):
     __tablename__ = "interacoes"
+    __table_args__ = (
+        db.Index("uq_interacao_tentativa_pergunta", "tentativa_id", "pergunta_id", unique=True),
+        db.Index("ix_interacao_pergunta", "pergunta_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     tentativa_id = db.Column(db.Integer, db.ForeignKey("tentativas_desafio.id"), nullable=False)
@@ -205,3 +247,250 @@ class Interacao(db.Model):
 
     pergunta = db.relationship("Pergunta")
     topico = db.relationship("Topico")
+
+
+class CentroideTurma(db.Model):
+    """Estado do agrupamento de uma turma para um k (ver app/agrupamento.py)."""
+    __tablename__ = "centroides_turma"
+    __table_args__ = (
+        db.UniqueConstraint("turma_id", "k", name="uq_centroide_turma_k"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    turma_id = db.Column(db.Integer, db.ForeignKey("turmas.id", ondelete="CASCADE"), nullable=False)
+    k = db.Column(db.Integer, nullable=False)
+    k_eff = db.Column(db.Integer, nullable=False)
+
+    topico_ids = db.Column(db.JSON, nullable=False, default=list)   # colunas dos centróides
+    centroides = db.Column(db.JSON, nullable=False, default=list)   # k_eff x len(topico_ids)
+    atribuicoes = db.Column(db.JSON, nullable=False, default=dict)  # {usuario_id: [grupo, total_interacoes]}
+
+    inercia_ajuste = db.Column(db.Float, nullable=False, default=0.0)  # inércia média no último ajuste
+    alterados = db.Column(db.Integer, nullable=False, default=0)       # reatribuídos online desde então
+    versao_dados = db.Column(db.Integer, nullable=False, default=0)
+
+    ajustado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ResumoTopico(db.Model):
+    """Respostas por turma × tópico num dia ou semana (ver app/resumos.py)."""
+    __tablename__ = "resumos_topico"
+    __table_args__ = (
+        db.UniqueConstraint("turma_id", "periodo", "inicio", "topico_id", name="uq_resumo_topico"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    turma_id = db.Column(db.Integer, db.ForeignKey("turmas.id", ondelete="CASCADE"), nullable=False)
+    topico_id = db.Column(db.Integer, db.ForeignKey("topicos.id", ondelete="CASCADE"), nullable=False)
+    periodo = db.Column(db.String(6), nullable=False)  # "dia" | "semana"
+    inicio = db.Column(db.Date, nullable=False)        # o dia, ou a segunda-feira da semana
+    total = db.Column(db.Integer, nullable=False, default=0)
+    erros = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ResumoAluno(db.Model):
+    """Respostas por aluno numa turma num dia ou semana (ver app/resumos.py)."""
+    __tablename__ = "resumos_aluno"
+    __table_args__ = (
+        db.UniqueConstraint("turma_id", "usuario_id", "periodo", "inicio", name="uq_resumo_aluno"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    turma_id = db.Column(db.Integer, db.ForeignKey("turmas.id", ondelete="CASCADE"), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    periodo = db.Column(db.String(6), nullable=False)
+    inicio = db.Column(db.Date, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    erros = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DominioTopico(db.Model):
+    """P(dominou) do aluno no tópico, por BKT (ver app/dominio.py)."""
+    __tablename__ = "dominios_topico"
+    __table_args__ = (
+        db.UniqueConstraint("usuario_id", "topico_id", name="uq_dominio_usuario_topico"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    topico_id = db.Column(db.Integer, db.ForeignKey("topicos.id", ondelete="CASCADE"), nullable=False)
+    p_dominio = db.Column(db.Float, nullable=False)
+    respostas = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class EstatisticaPergunta(db.Model):
+    """Estatística clássica de item por pergunta (ver app/estatisticas_itens.py)."""
+    __tablename__ = "estatisticas_pergunta"
+
+    id = db.Column(db.Integer, primary_key=True)
+    pergunta_id = db.Column(
+        db.Integer, db.ForeignKey("perguntas.id", ondelete="CASCADE"), nullable=False, unique=True
+    )
+    respostas = db.Column(db.Integer, nullable=False, default=0)
+    acertos = db.Column(db.Integer, nullable=False, default=0)
+    escolhas_a = db.Column(db.Integer, nullable=False, default=0)
+    escolhas_b = db.Column(db.Integer, nullable=False, default=0)
+    escolhas_c = db.Column(db.Integer, nullable=False, default=0)
+    escolhas_d = db.Column(db.Integer, nullable=False, default=0)
+    taxa_acerto = db.Column(db.Float)      # índice de dificuldade clássico (p)
+    discriminacao = db.Column(db.Float)    # ponto-bisserial com o escore do aluno (sem o item)
+    ate_interacao_id = db.Column(db.Integer, nullable=False, default=0)  # última interação considerada
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class CalibracaoPergunta(db.Model):
+    """Parâmetros TRI da pergunta (ver app/irt.py)."""
+    __tablename__ = "calibracao_perguntas"
+
+    id = db.Column(db.Integer, primary_key=True)
+    pergunta_id = db.Column(
+        db.Integer, db.ForeignKey("perguntas.id", ondelete="CASCADE"), nullable=False, unique=True
+    )
+    dificuldade = db.Column(db.Float, nullable=False)                   # b
+    discriminacao = db.Column(db.Float, nullable=False, default=1.0)    # a (1 no 1PL)
+    respostas = db.Column(db.Integer, nullable=False, default=0)
+    modelo = db.Column(db.String(3), nullable=False, default="2pl")
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class HabilidadeAluno(db.Model):
+    """Habilidade TRI (theta) do aluno (ver app/irt.py)."""
+    __tablename__ = "habilidades_aluno"
+
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(
+        db.Integer, db.ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False, unique=True
+    )
+    habilidade = db.Column(db.Float, nullable=False)
+    respostas = db.Column(db.Integer, nullable=False, default=0)
+    ate_interacao_id = db.Column(db.Integer, nullable=False, default=0)  # última interação considerada
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Contador(db.Model):
+    """KPI do painel inicial com a versão em que foi calculado (ver app/contadores.py)."""
+    __tablename__ = "contadores"
+
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(40), nullable=False, unique=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+    versao = db.Column(db.Integer, nullable=False, default=0)  # na linha "_versao": a versão atual
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# =========================
+# Atualização de esquema (sem migrations)
+# =========================
+
+# próxima pergunta ainda não respondida da tentativa (ordem, id)
+SQL_PROXIMA_PERGUNTA = """
+    SELECT p.id FROM perguntas p
+    WHERE p.desafio_id = tentativas_desafio.desafio_id
+      AND NOT EXISTS (
+          SELECT 1 FROM interacoes i
+          WHERE i.tentativa_id = tentativas_desafio.id AND i.pergunta_id = p.id
+      )
+    ORDER BY p.ordem ASC, p.id ASC
+    LIMIT 1
+"""
+
+# preenchimento das colunas novas a partir dos dados já existentes
+_PREENCHER_COLUNA = {
+    ("tentativas_desafio", "respondidas"): """
+        UPDATE tentativas_desafio SET respondidas = (
+            SELECT COUNT(*) FROM interacoes i WHERE i.tentativa_id = tentativas_desafio.id
+        )
+    """,
+    ("tentativas_desafio", "corretas"): """
+        UPDATE tentativas_desafio SET corretas = (
+            SELECT COUNT(*) FROM interacoes i
+            WHERE i.tentativa_id = tentativas_desafio.id AND i.foi_correta
+        )
+    """,
+    ("tentativas_desafio", "total_perguntas"): """
+        UPDATE tentativas_desafio SET total_perguntas = (
+            SELECT COUNT(*) FROM perguntas p WHERE p.desafio_id = tentativas_desafio.desafio_id
+        )
+    """,
+    ("tentativas_desafio", "proxima_pergunta_id"): f"""
+        UPDATE tentativas_desafio SET proxima_pergunta_id = ({SQL_PROXIMA_PERGUNTA})
+        WHERE NOT finalizada
+    """,
+}
+
+
+# limpeza dos dados antes de criar um índice único numa tabela existente
+_ANTES_DO_INDICE = {
+    "uq_tentativa_aberta_usuario_turma": [
+        # fecha as abertas duplicadas, mantendo a mais recente (a que o tutor retomava)
+        """
+        UPDATE tentativas_desafio SET finalizada = TRUE
+        WHERE NOT finalizada AND id NOT IN (
+            SELECT MAX(id) FROM tentativas_desafio WHERE NOT finalizada GROUP BY usuario_id, turma_id
+        )
+        """,
+    ],
+    "uq_interacao_tentativa_pergunta": [
+        # mantém a primeira resposta de cada (tentativa, pergunta)
+        """
+        DELETE FROM interacoes WHERE id NOT IN (
+            SELECT MIN(id) FROM interacoes GROUP BY tentativa_id, pergunta_id
+        )
+        """,
+        _PREENCHER_COLUNA[("tentativas_desafio", "respondidas")],
+        _PREENCHER_COLUNA[("tentativas_desafio", "corretas")],
+    ],
+}
+
+
+def atualizar_esquema() -> None:
+    """
+    O projeto não usa migrations: db.create_all() cria tabelas novas, mas não
+    mexe em tabelas que já existem. Aqui as colunas que faltam são adicionadas
+    (ALTER TABLE ... ADD COLUMN) e preenchidas a partir dos dados atuais, e os
+    índices que faltam são criados (com limpeza prévia quando são únicos).
+    Colunas novas NOT NULL precisam de server_default.
+    """
+    engine = db.engine
+    insp = sa_inspect(engine)
+    adicionadas = []
+
+    with engine.begin() as conn:
+        for tabela in db.metadata.sorted_tables:
+            if not insp.has_table(tabela.name):
+                continue
+            existentes = {c["name"] for c in insp.get_columns(tabela.name)}
+            for col in tabela.columns:
+                if col.name in existentes:
+                    continue
+                ddl = f"ALTER TABLE {tabela.name} ADD COLUMN {col.name} {col.type.compile(dialect=engine.dialect)}"
+                if col.server_default is not None:
+                    ddl += f" DEFAULT {getattr(col.server_default.arg, 'text', col.server_default.arg)}"
+                    if not col.nullable:
+                        ddl += " NOT NULL"
+                conn.exec_driver_sql(ddl)
+                adicionadas.append((tabela.name, col.name))
+
+        for chave in adicionadas:
+            sql = _PREENCHER_COLUNA.get(chave)
+            if sql:
+                conn.exec_driver_sql(sql)
+
+        for tabela in db.metadata.sorted_tables:
+            if not insp.has_table(tabela.name):
+                continue
+            existentes = {i["name"] for i in insp.get_indexes(tabela.name)}
+            for indice in tabela.indexes:
+                if indice.name in existentes:
+                    continue
+                for sql in _ANTES_DO_INDICE.get(indice.name, ()):
+                    conn.exec_driver_sql(sql)
+                indice.create(conn, checkfirst=True)
+
+    # resumos por período e domínio (tabelas novas num banco que já tem respostas)
+    from .dominio import preencher_dominios_vazios
+    from .resumos import preencher_resumos_vazios
+    preencher_resumos_vazios()
+    preencher_dominios_vazios()
@@ -0,0 +1,140 @@
+# app/motor_analitico.py
+"""
+Motor das agregações analíticas (aluno × tópico) usadas pelo snapshot das
+turmas (app/dados_analise.py) e, por ele, pelo AnaliseView e pelo relatório
+CSV (app/analise_cluster.py).
+
+Dois backends com o mesmo resultado (int64[n, 4]: usuario_id, topico_id,
+total, erros), escolhidos por ANALITICO_MOTOR:
+
+  - "sqlite" (padrão): GROUP BY via SQLAlchemy no próprio banco do app.
+  - "duckdb": DuckDB embutido com o arquivo SQLite anexado somente leitura
+    (extensão sqlite do DuckDB). A agregação roda no executor vetorizado e
+    paralelo do DuckDB, fora da conexão que os alunos usam para gravar.
+
+DuckDB é opcional (pip install duckdb). Sem o pacote, sem a extensão ou com
+banco que não é SQLite, cai no backend "sqlite" com um aviso no log.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import case, func
+
+from .modelos import db, Interacao, TentativaDesafio
+
+try:
+    import duckdb
+except ImportError:  # opcional
+    duckdb = None
+
+
+SQL_DUCKDB = """
+    SELECT t.usuario_id, i.topico_id, COUNT(*) AS total,
+           SUM(CASE WHEN CAST(i.foi_correta AS INTEGER) = 0 THEN 1 ELSE 0 END) AS erros
+    FROM app.interacoes i
+    JOIN app.tentativas_desafio t ON t.id = i.tentativa_id
+    {where}
+    GROUP BY t.usuario_id, i.topico_id
+"""
+
+
+def agregados_aluno_topico(turma_id: Optional[int]) -> np.ndarray:
+    """int64[n, 4] com (usuario_id, topico_id, total, erros); turma_id=None = todas."""
+    if _motor() == "duckdb":
+        con = _conexao_duckdb()
+        if con is not None:
+            return _agregados_duckdb(con, turma_id)
+    return _agregados_sqlite(turma_id)
+
+
+def _motor() -> str:
+    return str(current_app.config.get("ANALITICO_MOTOR", "sqlite")).lower()
+
+
+def _agregados_sqlite(turma_id: Optional[int]) -> np.ndarray:
+    qr = (
+        db.session.query(
+            TentativaDesafio.usuario_id,
+            Interacao.topico_id,
+            func.count(Interacao.id),
+            func.coalesce(func.sum(case((Interacao.foi_correta.is_(False), 1), else_=0)), 0),
+        )
+        .join(Interacao, Interacao.tentativa_id == TentativaDesafio.id)
+    )
+    if turma_id is not None:
+        qr = qr.filter(TentativaDesafio.turma_id == int(turma_id))
+    return np.array(
+        qr.group_by(TentativaDesafio.usuario_id, Interacao.topico_id).all(), dtype=np.int64
+    ).reshape(-1, 4)
+
+
+def _agregados_duckdb(con, turma_id: Optional[int]) -> np.ndarray:
+    cur = con.cursor()  # um cursor por chamada: seguro entre threads
+    try:
+        if turma_id is None:
+            cur.execute(SQL_DUCKDB.format(where=""))
+        else:
+            cur.execute(SQL_DUCKDB.format(where="WHERE t.turma_id = ?"), [int(turma_id)])
+        cols = cur.fetchnumpy()
+    finally:
+        cur.close()
+    if not len(cols["total"]):
+        return np.zeros((0, 4), dtype=np.int64)
+    return np.column_stack(
+        [np.asarray(cols[c], dtype=np.int64) for c in ("usuario_id", "topico_id", "total", "erros")]
+    )
+
+
+# =========================
+# Conexão DuckDB (uma por processo/banco)
+# =========================
+
+_conexoes: dict = {}
+_lock = threading.Lock()
+
+
+def _conexao_duckdb():
+    url = db.engine.url
+    if duckdb is None or url.get_backend_name() != "sqlite" or not url.database:
+        _avisar_uma_vez("ANALITICO_MOTOR=duckdb indisponível (pacote duckdb ausente ou banco não-SQLite); usando sqlite")
+        return None
+
+    caminho = url.database
+    with _lock:
+        if caminho in _conexoes:
+            return _conexoes[caminho]
+        try:
+            con = duckdb.connect(":memory:")
+            con.execute("INSTALL sqlite")
+            con.execute("LOAD sqlite")
+            con.execute("ATTACH '{}' AS app (TYPE sqlite, READ_ONLY)".format(caminho.replace("'", "''")))
+            threads = current_app.config.get("ANALITICO_THREADS")
+            if threads:
+                con.execute(f"SET threads = {int(threads)}")
+        except Exception as e:  # extensão indisponível (ex.: sem rede para o INSTALL)
+            _avisar_uma_vez(f"DuckDB não conseguiu anexar o SQLite ({e}); usando sqlite")
+            _conexoes[caminho] = None
+            return None
+        _conexoes[caminho] = con
+        return con
+
+
+_avisos: set = set()
+
+
+def _avisar_uma_vez(msg: str) -> None:
+    if msg not in _avisos:
+        _avisos.add(msg)
+        current_app.logger.warning(msg)
+
+
+def fechar_conexoes() -> None:
+    with _lock:
+        for con in _conexoes.values():
+            if con is not None:
+                con.close()
+        _conexoes.clear()
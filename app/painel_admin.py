@@ -1,20 +1,14 @@
 # app/painel_admin.py
 from __future__ import annotations
 
-import random
-from collections import defaultdict
-from typing import Dict, List, Optional, Tuple
-from flask import flash, redirect, request, url_for,current_app
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from flask import flash, jsonify, redirect, request, url_for
 from flask_admin import Admin, AdminIndexView, BaseView, expose
 from flask_admin.contrib.sqla import ModelView
 from flask_login import current_user
-from sqlalchemy import case, func
 from sqlalchemy.orm import subqueryload
 from werkzeug.security import generate_password_hash
-import uuid
-from pathlib import Path
-from werkzeug.utils import secure_filename
-from flask import current_app
 from .modelos import (
     db,
     Usuario,
@@ -26,17 +20,26 @@ from .modelos import (
     Pergunta,
     TentativaDesafio,
     Interacao,
+    EstatisticaPergunta,
 )
+from .agrupamento import grupos_da_turma, tem_varredura, varredura_em_cache, varredura_k
+from .cache_http import responder_se_modificado
+from .contadores import atividade_recente, contadores, versao_cadastro
+from .dominio import dominios_do_aluno
+from .estatisticas_itens import agendar_atualizacao as agendar_atualizacao_estatisticas, distrator_principal
+from .formulas import agendar as agendar_formulas, textos_da_pergunta
+from .imagens import remover as remover_imagem, salvar_upload
+from .irt import habilidade_turma, habilidades
+from .dados_analise import snapshot_turma, versao_turma
+from .instrumentacao import estatisticas_sql
+from .resumos import descontar_tentativas, tendencia, tendencia_por_topico
+from .servicos import recalcular_tentativas_abertas
 
 
-import os
-import uuid
-from datetime import datetime
-
+from datetime import date, datetime, timedelta
 
 
 
-ALLOWED_IMG_EXT = {"png", "jpg", "jpeg", "webp", "gif"}
 
 # ============================================================
 # Acesso Admin (Mixin)
@@ -59,336 +62,21 @@ class SecureModelView(AdminAccessMixin, ModelView):
 class SecureIndexView(AdminAccessMixin, AdminIndexView):
     @expose("/")
     def index(self):
-        kpi_turmas = Turma.query.count()
-        kpi_alunos = (
-            db.session.query(Matricula.usuario_id)
-            .filter(Matricula.papel == "aluno")
-            .distinct()
-            .count()
-        )
-        kpi_desafios = Desafio.query.count()
-
+        # totais em cache (tabela contadores) e atividade pelos resumos por período
+        totais = contadores()
         return self.render(
             "admin/index.html",
-            kpi_turmas=kpi_turmas,
-            kpi_alunos=kpi_alunos,
-            kpi_desafios=kpi_desafios,
-        )
-
-
-# ============================================================
-# Helpers (parsing)
-# ============================================================
-
-
-def _parse_int(value: Optional[str]) -> Optional[int]:
-    if value is None:
-        return None
-    s = str(value).strip()
-    return int(s) if s.isdigit() else None
-
-
-# ============================================================
-# Helpers (K-means simples)
-# ============================================================
-
-
-def _kmeans_simple(X: List[List[float]], k: int, iters: int = 60, seed: int = 42) -> List[int]:
-    """
-    K-means simples (sem sklearn), retorna labels 0..k-1.
-    """
-    n = len(X)
-    if n == 0:
-        return []
-    d = len(X[0]) if X[0] else 0
-    if d == 0:
-        return [0] * n
-
-    k = max(1, min(k, n))
-    rnd = random.Random(seed)
-    centroids = [X[i][:] for i in rnd.sample(range(n), k)]
-
-    def dist2(a, b):
-        return sum((a[j] - b[j]) ** 2 for j in range(d))
-
-    labels = [0] * n
-
-    for _ in range(iters):
-        changed = False
-
-        # assign
-        for i in range(n):
-            best = 0
-            bestd = dist2(X[i], centroids[0])
-            for c in range(1, k):
-                dd = dist2(X[i], centroids[c])
-                if dd < bestd:
-                    bestd = dd
-                    best = c
-            if labels[i] != best:
-                labels[i] = best
-                changed = True
-
-        # recompute
-        sums = [[0.0] * d for _ in range(k)]
-        counts = [0] * k
-        for i in range(n):
-            c = labels[i]
-            counts[c] += 1
-            xi = X[i]
-            for j in range(d):
-                sums[c][j] += xi[j]
-
-        for c in range(k):
-            if counts[c] == 0:
-                centroids[c] = X[rnd.randrange(n)][:]  # reinit cluster vazio
-            else:
-                centroids[c] = [sums[c][j] / counts[c] for j in range(d)]
-
-        if not changed:
-            break
-
-    return labels
-
-
-# ============================================================
-# Helpers (Consultas)
-# ============================================================
-
-
-def _alunos_da_turma(turma_id: int) -> List[Usuario]:
-    return (
-        db.session.query(Usuario)
-        .join(Matricula, Matricula.usuario_id == Usuario.id)
-        .filter(Matricula.turma_id == turma_id, Matricula.papel == "aluno")
-        .order_by(Usuario.nome.asc())
-        .all()
-    )
-
-
-def _dados_por_topico(turma_id: int, aluno_id: Optional[int]) -> List[Dict]:
-    """
-    Retorna lista por tópico com total/erros/taxa_erro, filtrando por turma e opcionalmente aluno.
-    """
-    q = (
-        db.session.query(
-            Interacao.topico_id.label("topico_id"),
-            Topico.nome.label("topico_nome"),
-            func.count(Interacao.id).label("total"),
-            func.coalesce(
-                func.sum(case((Interacao.foi_correta.is_(False), 1), else_=0)),
-                0,
-            ).label("erros"),
-        )
-        .join(Topico, Topico.id == Interacao.topico_id)
-        .join(TentativaDesafio, TentativaDesafio.id == Interacao.tentativa_id)
-        .filter(TentativaDesafio.turma_id == turma_id)
-    )
-
-    if aluno_id is not None:
-        q = q.filter(TentativaDesafio.usuario_id == aluno_id)
-
-    rows = q.group_by(Interacao.topico_id, Topico.nome).all()
-
-    dados = []
-    for r in rows:
-        total = int(r.total or 0)
-        erros = int(r.erros or 0)
-        taxa = (erros / total) if total else 0.0
-        dados.append(
-            {
-                "topico_id": int(r.topico_id),
-                "topico_nome": str(r.topico_nome),
-                "total": total,
-                "erros": erros,
-                "taxa_erro": float(taxa),
-            }
+            **{f"total_{k}": totais[k] for k in ("turmas", "alunos", "disciplinas", "topicos", "desafios", "perguntas")},
+            desafios_sem_perguntas=totais["desafios_sem_perguntas"],
+            turmas_sem_disciplinas=totais["turmas_sem_disciplinas"],
+            **atividade_recente(),
         )
 
-    # ordena por nome (fica estável no gráfico/tabelas)
-    dados.sort(key=lambda x: x["topico_nome"].lower())
-    return dados
-
-
-def _donut_data(turma_id: int, aluno_id: Optional[int]) -> Dict:
-    """
-    Retorna {"acertos": x, "erros": y, "total": z} para turma e opcionalmente aluno.
-    """
-    q = (
-        db.session.query(
-            func.count(Interacao.id).label("total"),
-            func.coalesce(
-                func.sum(case((Interacao.foi_correta.is_(False), 1), else_=0)),
-                0,
-            ).label("erros"),
-        )
-        .join(TentativaDesafio, TentativaDesafio.id == Interacao.tentativa_id)
-        .filter(TentativaDesafio.turma_id == turma_id)
-    )
-
-    if aluno_id is not None:
-        q = q.filter(TentativaDesafio.usuario_id == aluno_id)
-
-    row = q.one()
-    total = int(row.total or 0)
-    erros = int(row.erros or 0)
-    acertos = max(0, total - erros)
-    return {"acertos": acertos, "erros": erros, "total": total}
-
-
-def _kmeans_por_turma(turma_id: int, k: int) -> Tuple[Dict[int, int], Dict]:
-    """
-    Retorna:
-      clusters: {aluno_id: grupo (1..k_eff)}
-      chart_data: {labels: [...tópicos...], datasets: [{label, data:[%...]}, ...]}
-    """
-    alunos = _alunos_da_turma(turma_id)
-    aluno_ids = [int(a.id) for a in alunos]
-    if not aluno_ids:
-        return {}, {"labels": [], "datasets": []}
-
-    rows = (
-        db.session.query(
-            TentativaDesafio.usuario_id.label("usuario_id"),
-            Interacao.topico_id.label("topico_id"),
-            func.count(Interacao.id).label("total"),
-            func.coalesce(func.sum(case((Interacao.foi_correta.is_(False), 1), else_=0)), 0).label("erros"),
-        )
-        .join(Interacao, Interacao.tentativa_id == TentativaDesafio.id)
-        .filter(TentativaDesafio.turma_id == turma_id, TentativaDesafio.usuario_id.in_(aluno_ids))
-        .group_by(TentativaDesafio.usuario_id, Interacao.topico_id)
-        .all()
-    )
-
-    if not rows:
-        return {}, {"labels": [], "datasets": []}
-
-    # tópicos presentes
-    topico_ids = sorted({int(r.topico_id) for r in rows if r.topico_id is not None})
-    topicos_db = Topico.query.filter(Topico.id.in_(topico_ids)).all()
-    nome_topico = {t.id: t.nome for t in topicos_db}
-
-    # ordem fixa (por nome)
-    topicos_ord = sorted(
-        [{"id": int(tid), "nome": nome_topico.get(int(tid), f"Tópico {tid}")} for tid in topico_ids],
-        key=lambda x: x["nome"].lower(),
-    )
-    feat_ids = [t["id"] for t in topicos_ord]
-
-    # taxa (aluno, topico)
-    taxa_map: Dict[Tuple[int, int], float] = {}
-    for r in rows:
-        total = int(r.total or 0)
-        erros = int(r.erros or 0)
-        taxa = (erros / total) if total else 0.0
-        taxa_map[(int(r.usuario_id), int(r.topico_id))] = float(taxa)
-
-    # médias globais por tópico (imputação)
-    mean_by_topico = {}
-    dados_turma = _dados_por_topico(turma_id, None)
-    for dct in dados_turma:
-        mean_by_topico[int(dct["topico_id"])] = float(dct["taxa_erro"])
-
-    X: List[List[float]] = []
-    for uid in aluno_ids:
-        row = []
-        for tid in feat_ids:
-            row.append(taxa_map.get((uid, tid), mean_by_topico.get(tid, 0.0)))
-        X.append(row)
-
-    k_eff = max(1, min(int(k), len(aluno_ids)))
-    labels0 = _kmeans_simple(X, k_eff, iters=80, seed=42)  # 0..k-1
-    clusters = {int(aluno_ids[i]): int(labels0[i] + 1) for i in range(len(aluno_ids))}  # 1..k_eff
-
-    # médias por grupo em cada tópico (para gráfico)
-    sums = [[0.0 for _ in feat_ids] for _ in range(k_eff)]
-    counts = [0 for _ in range(k_eff)]
-    for i, uid in enumerate(aluno_ids):
-        g = labels0[i]
-        counts[g] += 1
-        for j in range(len(feat_ids)):
-            sums[g][j] += X[i][j]
-
-    group_means: List[List[float]] = []
-    for g in range(k_eff):
-        if counts[g] == 0:
-            group_means.append([0.0] * len(feat_ids))
-        else:
-            group_means.append([sums[g][j] / counts[g] for j in range(len(feat_ids))])
-
-    chart_data = {
-        "labels": [t["nome"] for t in topicos_ord],
-        "datasets": [
-            {"label": f"Grupo {g+1}", "data": [round(v * 100, 2) for v in group_means[g]]}
-            for g in range(k_eff)
-        ],
-    }
-
-    return clusters, chart_data
-
-
-def _alunos_cards(turma_id: int, clusters: Dict[int, int]) -> List[Dict]:
-    """
-    Cards da tabela "Alunos da turma" com:
-      - grupo (se tiver no clusters)
-      - total de interações
-      - taxa de erro global
-    """
-    alunos = _alunos_da_turma(turma_id)
-    aluno_ids = [int(a.id) for a in alunos]
-    if not aluno_ids:
-        return []
-
-    rows = (
-        db.session.query(
-            TentativaDesafio.usuario_id.label("uid"),
-            func.count(Interacao.id).label("total"),
-            func.coalesce(func.sum(case((Interacao.foi_correta.is_(False), 1), else_=0)), 0).label("erros"),
-        )
-        .join(Interacao, Interacao.tentativa_id == TentativaDesafio.id)
-        .filter(TentativaDesafio.turma_id == turma_id, TentativaDesafio.usuario_id.in_(aluno_ids))
-        .group_by(TentativaDesafio.usuario_id)
-        .all()
-    )
-    stats = {int(r.uid): (int(r.total or 0), int(r.erros or 0)) for r in rows}
-
-    cards = []
-    for a in alunos:
-        uid = int(a.id)
-        total, erros = stats.get(uid, (0, 0))
-        taxa = (erros / total) if total else 0.0
-        cards.append(
-            {
-                "id": uid,
-                "nome": a.nome,
-                "email": a.email,
-                "total": total,
-                "taxa_erro": float(taxa),
-                "grupo": clusters.get(uid),  # pode ser None
-            }
-        )
-
-    # ordena por grupo depois nome
-    cards.sort(key=lambda x: (x["grupo"] or 9999, (x["nome"] or "").lower()))
-    return cards
-
 
 # =========================
 # ANÁLISE (K-means + Detalhes do aluno)
 # =========================
 
-from collections import defaultdict
-import random
-from typing import Any, Dict, List, Optional, Tuple
-
-from sqlalchemy import func, case
-from flask import request
-from flask_admin import BaseView, expose
-
-# precisa existir no seu painel_admin.py:
-# from .modelos import db, Usuario, Turma, Matricula, Topico, TentativaDesafio, Interacao
-# class AdminAccessMixin: ...
-
 
 def _parse_int(v: Any) -> Optional[int]:
     try:
@@ -402,238 +90,53 @@ def _parse_int(v: Any) -> Optional[int]:
         return None
 
 
-def _alunos_da_turma(turma_id: int):
-    return (
-        db.session.query(Usuario)
-        .join(Matricula, Matricula.usuario_id == Usuario.id)
-        .filter(Matricula.turma_id == turma_id, Matricula.papel == "aluno")
-        .order_by(Usuario.nome.asc())
-        .all()
-    )
-
-
-def _topicos_da_turma(turma_id: int) -> List[Tuple[int, str]]:
-    rows = (
-        db.session.query(Interacao.topico_id, Topico.nome)
-        .join(TentativaDesafio, TentativaDesafio.id == Interacao.tentativa_id)
-        .join(Topico, Topico.id == Interacao.topico_id)
-        .filter(TentativaDesafio.turma_id == turma_id)
-        .group_by(Interacao.topico_id, Topico.nome)
-        .all()
-    )
-    topicos = [(int(r[0]), str(r[1])) for r in rows if r[0] is not None]
-    topicos.sort(key=lambda x: x[1].lower())
-    return topicos
-
+# as funções abaixo leem do snapshot NumPy da turma (app/dados_analise.py),
+# carregado uma vez por versão dos dados e compartilhado entre as telas
 
 def _dados_por_topico(turma_id: int, aluno_id: Optional[int]) -> List[Dict[str, Any]]:
-    q = (
-        db.session.query(
-            Interacao.topico_id.label("topico_id"),
-            Topico.nome.label("topico_nome"),
-            func.count(Interacao.id).label("total"),
-            func.coalesce(func.sum(case((Interacao.foi_correta.is_(False), 1), else_=0)), 0).label("erros"),
-        )
-        .join(TentativaDesafio, TentativaDesafio.id == Interacao.tentativa_id)
-        .join(Topico, Topico.id == Interacao.topico_id)
-        .filter(TentativaDesafio.turma_id == turma_id)
-    )
-    if aluno_id is not None:
-        q = q.filter(TentativaDesafio.usuario_id == aluno_id)
-
-    rows = q.group_by(Interacao.topico_id, Topico.nome).all()
-
-    out: List[Dict[str, Any]] = []
-    for r in rows:
-        total = int(r.total or 0)
-        erros = int(r.erros or 0)
-        taxa = (erros / total) if total else 0.0
-        out.append(
-            {
-                "topico_id": int(r.topico_id),
-                "topico_nome": str(r.topico_nome),
-                "total": total,
-                "erros": erros,
-                "taxa_erro": float(taxa),
-            }
-        )
-    out.sort(key=lambda d: d["topico_nome"].lower())
-    return out
+    return snapshot_turma(turma_id).dados_por_topico(aluno_id)
 
 
 def _donut_data(turma_id: int, aluno_id: Optional[int]) -> Tuple[int, Dict[str, int]]:
-    q = (
-        db.session.query(
-            func.count(Interacao.id).label("total"),
-            func.coalesce(func.sum(case((Interacao.foi_correta.is_(False), 1), else_=0)), 0).label("erros"),
-        )
-        .join(TentativaDesafio, TentativaDesafio.id == Interacao.tentativa_id)
-        .filter(TentativaDesafio.turma_id == turma_id)
-    )
-    if aluno_id is not None:
-        q = q.filter(TentativaDesafio.usuario_id == aluno_id)
-
-    r = q.one()
-    total = int(r.total or 0)
-    erros = int(r.erros or 0)
-    acertos = max(0, total - erros)
-    return total, {"acertos": acertos, "erros": erros, "total": total}
-
-
-def _kmeans_simple(X: List[List[float]], k: int, iters: int = 50, seed: int = 42) -> List[int]:
-    n = len(X)
-    if n == 0:
-        return []
-    d = len(X[0]) if X[0] else 0
-    if d == 0:
-        return [0] * n
-
-    k = max(1, min(int(k), n))
-    rnd = random.Random(seed)
-    centroids = [X[i][:] for i in rnd.sample(range(n), k)]
-    labels = [0] * n
-
-    def dist2(a: List[float], b: List[float]) -> float:
-        return sum((a[j] - b[j]) ** 2 for j in range(d))
-
-    for _ in range(iters):
-        changed = False
-
-        for i in range(n):
-            best = 0
-            bestd = dist2(X[i], centroids[0])
-            for c in range(1, k):
-                dd = dist2(X[i], centroids[c])
-                if dd < bestd:
-                    bestd = dd
-                    best = c
-            if labels[i] != best:
-                labels[i] = best
-                changed = True
-
-        sums = [[0.0] * d for _ in range(k)]
-        counts = [0] * k
-        for i in range(n):
-            c = labels[i]
-            counts[c] += 1
-            for j in range(d):
-                sums[c][j] += X[i][j]
-
-        for c in range(k):
-            if counts[c] == 0:
-                centroids[c] = X[rnd.randrange(n)][:]  # reinit
-            else:
-                centroids[c] = [sums[c][j] / counts[c] for j in range(d)]
-
-        if not changed:
-            break
-
-    return labels
+    return snapshot_turma(turma_id).donut(aluno_id)
 
 
 def _kmeans_por_turma(turma_id: int, k: int) -> Tuple[Dict[int, int], Dict[str, Any]]:
-    alunos = _alunos_da_turma(turma_id)
-    aluno_ids = [int(a.id) for a in alunos]
-    if not aluno_ids:
+    # centróides persistidos + atribuição online (app/agrupamento.py)
+    res = grupos_da_turma(turma_id, k)
+    if not res["k_eff"]:
         return {}, {"labels": [], "datasets": []}
 
-    topicos = _topicos_da_turma(turma_id)
-    if not topicos:
-        return {}, {"labels": [], "datasets": []}
-
-    feat_ids = [tid for tid, _ in topicos]
-    feat_names = [nome for _, nome in topicos]
-
-    rows = (
-        db.session.query(
-            TentativaDesafio.usuario_id.label("uid"),
-            Interacao.topico_id.label("tid"),
-            func.count(Interacao.id).label("total"),
-            func.coalesce(func.sum(case((Interacao.foi_correta.is_(False), 1), else_=0)), 0).label("erros"),
-        )
-        .join(Interacao, Interacao.tentativa_id == TentativaDesafio.id)
-        .filter(TentativaDesafio.turma_id == turma_id, TentativaDesafio.usuario_id.in_(aluno_ids))
-        .group_by(TentativaDesafio.usuario_id, Interacao.topico_id)
-        .all()
-    )
-
-    taxa_map: Dict[Tuple[int, int], float] = {}
-    for r in rows:
-        total = int(r.total or 0)
-        erros = int(r.erros or 0)
-        taxa_map[(int(r.uid), int(r.tid))] = (erros / total) if total else 0.0
-
-    mean_by_topic: Dict[int, float] = {}
-    for tid in feat_ids:
-        vals = [v for (uid, t), v in taxa_map.items() if t == tid]
-        mean_by_topic[tid] = (sum(vals) / len(vals)) if vals else 0.0
-
-    used_ids: List[int] = []
-    X: List[List[float]] = []
-    for uid in aluno_ids:
-        has_any = any((uid, tid) in taxa_map for tid in feat_ids)
-        if not has_any:
-            continue
-        used_ids.append(uid)
-        X.append([float(taxa_map.get((uid, tid), mean_by_topic.get(tid, 0.0))) for tid in feat_ids])
-
-    if not used_ids:
-        return {}, {"labels": [], "datasets": []}
-
-    k_eff = max(1, min(int(k), len(used_ids)))
-    labels0 = _kmeans_simple(X, k_eff, iters=60, seed=42)
-
-    clusters: Dict[int, int] = {used_ids[i]: int(labels0[i] + 1) for i in range(len(used_ids))}
-
-    sums = [[0.0 for _ in feat_ids] for _ in range(k_eff)]
-    counts = [0 for _ in range(k_eff)]
-    for i, _uid in enumerate(used_ids):
-        g = labels0[i]
-        counts[g] += 1
-        for j in range(len(feat_ids)):
-            sums[g][j] += X[i][j]
+    snap, X, labels0, k_eff = res["snapshot"], res["X"], res["labels"], res["k_eff"]
+    clusters: Dict[int, int] = res["clusters"]
 
-    datasets = []
-    for g in range(k_eff):
-        denom = counts[g] if counts[g] else 1
-        data_pct = [round((sums[g][j] / denom) * 100, 2) for j in range(len(feat_ids))]
-        datasets.append({"label": f"Grupo {g+1} (n={counts[g]})", "data": data_pct})
+    counts = np.bincount(labels0, minlength=k_eff)
+    sums = np.zeros((k_eff, X.shape[1]))
+    np.add.at(sums, labels0, X)
+    medias = sums / np.maximum(counts, 1)[:, None]
 
-    chart_data = {"labels": feat_names, "datasets": datasets}
+    datasets = [
+        {"label": f"Grupo {g+1} (n={int(counts[g])})", "data": [round(v * 100, 2) for v in medias[g].tolist()]}
+        for g in range(k_eff)
+    ]
+    chart_data = {"labels": list(snap.topico_nomes), "datasets": datasets}
     return clusters, chart_data
 
 
 def _alunos_cards(turma_id: int, clusters: Dict[int, int]) -> List[Dict[str, Any]]:
-    alunos = _alunos_da_turma(turma_id)
-    aluno_ids = [int(a.id) for a in alunos]
-    if not aluno_ids:
-        return []
-
-    rows = (
-        db.session.query(
-            TentativaDesafio.usuario_id.label("uid"),
-            func.count(Interacao.id).label("total"),
-            func.coalesce(func.sum(case((Interacao.foi_correta.is_(False), 1), else_=0)), 0).label("erros"),
-        )
-        .join(Interacao, Interacao.tentativa_id == TentativaDesafio.id)
-        .filter(TentativaDesafio.turma_id == turma_id, TentativaDesafio.usuario_id.in_(aluno_ids))
-        .group_by(TentativaDesafio.usuario_id)
-        .all()
-    )
-    stats = {int(r.uid): (int(r.total or 0), int(r.erros or 0)) for r in rows}
+    snap = snapshot_turma(turma_id)
+    totais, erros = snap.totais_por_aluno()
 
     cards: List[Dict[str, Any]] = []
-    for a in alunos:
-        uid = int(a.id)
-        total, erros = stats.get(uid, (0, 0))
-        taxa = (erros / total) if total else 0.0
+    for i, uid in enumerate(snap.aluno_ids.tolist()):
+        total, err = int(totais[i]), int(erros[i])
         cards.append(
             {
                 "id": uid,
-                "nome": a.nome,
-                "email": a.email,
+                "nome": snap.aluno_nomes[i],
+                "email": snap.aluno_emails[i],
                 "total": total,
-                "taxa_erro": float(taxa),
+                "taxa_erro": float(err / total) if total else 0.0,
                 "grupo": clusters.get(uid),
             }
         )
@@ -642,80 +145,201 @@ def _alunos_cards(turma_id: int, clusters: Dict[int, int]) -> List[Dict[str, Any
 
 def _aluno_matriz(turma_id: int, aluno_id: int) -> List[Dict[str, Any]]:
     # tabela horizontal: uma coluna por tópico (ordem fixa da turma)
-    topicos = _topicos_da_turma(turma_id)
-    base = {
-        tid: {"topico_id": tid, "topico_nome": nome, "total": 0, "erros": 0, "taxa_erro": 0.0}
-        for tid, nome in topicos
+    linhas = snapshot_turma(turma_id).dados_por_topico(aluno_id, incluir_vazios=True)
+    dominios = dominios_do_aluno(aluno_id, [r["topico_id"] for r in linhas])
+    for r in linhas:
+        r["p_dominio"] = dominios.get(r["topico_id"], (None, 0))[0]
+    return linhas
+
+
+# painéis da tela de análise: cada um é um endpoint JSON com ETag próprio
+# (só as versões de que depende); a página é só a moldura e busca os painéis
+
+def _painel_topicos(turma_id: int) -> Dict[str, Any]:
+    return {"topicos": _dados_por_topico(turma_id, None)}
+
+
+def _painel_donut(turma_id: int) -> Dict[str, Any]:
+    total, donut = _donut_data(turma_id, None)
+    return {"total": total, "donut": donut, "habilidade": habilidade_turma(turma_id)}
+
+
+def _painel_grupos(turma_id: int, k: int, k_auto: bool) -> Dict[str, Any]:
+    # k automático: varredura 2..10 (cacheada por versão dos dados); depois
+    # de calculada, a tabela de scores continua visível ao trocar de k
+    varredura = varredura_k(turma_id) if k_auto else varredura_em_cache(turma_id)
+    if k_auto:
+        k = varredura["recomendado"]
+    clusters, chart = _kmeans_por_turma(turma_id, k)
+    return {"k": k, "k_auto": k_auto, "varredura": varredura, "chart_data": chart,
+            "alunos": _alunos_cards(turma_id, clusters)}
+
+
+def _painel_aluno(turma_id: int, aluno_id: int) -> Optional[Dict[str, Any]]:
+    """None se o aluno não é da turma. O grupo vem do painel de grupos (depende de k)."""
+    snap = snapshot_turma(turma_id)
+    i = snap.posicao(aluno_id)
+    if i is None:
+        return None
+    total, donut = _donut_data(turma_id, aluno_id)
+    return {
+        "aluno": {"id": int(aluno_id), "nome": snap.aluno_nomes[i], "email": snap.aluno_emails[i]},
+        "topicos": _aluno_matriz(turma_id, aluno_id),
+        "total": total,
+        "donut": donut,
+        "habilidade": habilidades([aluno_id]).get(int(aluno_id)),
+        "habilidade_turma": habilidade_turma(turma_id),
     }
 
-    rows = _dados_por_topico(turma_id, aluno_id)
-    for r in rows:
-        base[int(r["topico_id"])] = r
 
-    out = list(base.values())
-    out.sort(key=lambda d: d["topico_nome"].lower())
-    return out
+def _parametros_analise() -> Tuple[Optional[int], Optional[int], int, bool]:
+    turma_id = _parse_int(request.args.get("turma_id"))
+    aluno_id = _parse_int(request.args.get("aluno_id"))
+    k_auto = request.args.get("k") == "auto"
+    k = _parse_int(request.args.get("k")) or 3
+    return turma_id, aluno_id, max(1, min(int(k), 10)), k_auto
+
+
+def _versao_da_turma(turma_id: Optional[int]) -> Optional[Tuple[int, ...]]:
+    """Versão dos dados (respostas, matrículas, nomes, domínio/TRI reajustados); None se a turma não existe."""
+    if not turma_id:
+        return None
+    v = db.session.query(Turma.versao_dados).filter(Turma.id == int(turma_id)).scalar()
+    return None if v is None else (int(v),)
+
+
+def _turma_invalida():
+    return jsonify({"erro": "turma_id inválido"}), 400
 
 
 class AnaliseView(AdminAccessMixin, BaseView):
     @expose("/", methods=("GET",))
     def index(self):
-        turmas = Turma.query.order_by(Turma.nome.asc()).all()
+        # moldura: filtros e contêineres; os painéis chegam por JSON
+        turma_id, aluno_id, k, k_auto = _parametros_analise()
+
+        def gerar():
+            turmas = Turma.query.order_by(Turma.nome.asc()).all()
+            return self.render("admin/analise.html", turmas=turmas, turma_id=turma_id,
+                               aluno_id=aluno_id, k=k, k_auto=k_auto)
+
+        return responder_se_modificado((current_user.get_id(), request.full_path, versao_cadastro()), gerar)
+
+    @expose("/painel/topicos", methods=("GET",))
+    def painel_topicos(self):
+        turma_id, _aluno, _k, _auto = _parametros_analise()
+        versao = _versao_da_turma(turma_id)
+        if versao is None:
+            return _turma_invalida()
+        return responder_se_modificado(("topicos", turma_id, versao), lambda: jsonify(_painel_topicos(turma_id)))
+
+    @expose("/painel/donut", methods=("GET",))
+    def painel_donut(self):
+        turma_id, _aluno, _k, _auto = _parametros_analise()
+        versao = _versao_da_turma(turma_id)
+        if versao is None:
+            return _turma_invalida()
+        return responder_se_modificado(("donut", turma_id, versao), lambda: jsonify(_painel_donut(turma_id)))
+
+    @expose("/painel/grupos", methods=("GET",))
+    def painel_grupos(self):
+        turma_id, _aluno, k, k_auto = _parametros_analise()
+        versao = _versao_da_turma(turma_id)
+        if versao is None:
+            return _turma_invalida()
+        # com k fixo, a tabela da varredura aparece quando ela entra no cache
+        varredura = not k_auto and tem_varredura(turma_id, versao)
+        return responder_se_modificado(
+            ("grupos", turma_id, versao, "auto" if k_auto else k, varredura),
+            lambda: jsonify(_painel_grupos(turma_id, k, k_auto)),
+        )
 
+    @expose("/painel/aluno", methods=("GET",))
+    def painel_aluno(self):
+        turma_id, aluno_id, _k, _auto = _parametros_analise()
+        versao = _versao_da_turma(turma_id)
+        if versao is None:
+            return _turma_invalida()
+        if aluno_id is None:
+            return jsonify({"erro": "aluno_id inválido"}), 400
+
+        def gerar():
+            painel = _painel_aluno(turma_id, aluno_id)
+            if painel is None:
+                return jsonify({"erro": "aluno não pertence à turma"}), 404
+            return jsonify(painel)
+
+        return responder_se_modificado(("aluno", turma_id, versao, aluno_id), gerar)
+
+    @expose("/dados", methods=("GET",))
+    def dados(self):
+        """Todos os painéis num JSON só (exportação / integração), com ETag."""
+        turma_id, aluno_id, k, k_auto = _parametros_analise()
+        versao = _versao_da_turma(turma_id)
+        if versao is None:
+            return _turma_invalida()
+        varredura = not k_auto and tem_varredura(turma_id, versao)
+
+        def gerar():
+            return jsonify({
+                "turma_id": turma_id,
+                "topicos": _painel_topicos(turma_id)["topicos"],
+                "donut": _painel_donut(turma_id),
+                "grupos": _painel_grupos(turma_id, k, k_auto),
+                "aluno": _painel_aluno(turma_id, aluno_id) if aluno_id is not None else None,
+            })
+
+        return responder_se_modificado(("dados", turma_id, versao, aluno_id, "auto" if k_auto else k, varredura), gerar)
+
+    @expose("/k-auto", methods=("GET",))
+    def k_auto(self):
+        turma_id = _parse_int(request.args.get("turma_id"))
+        if not turma_id or db.session.get(Turma, turma_id) is None:
+            return jsonify({"erro": "turma_id inválido"}), 400
+        return responder_se_modificado(
+            ("k-auto", turma_id, versao_turma(turma_id)),
+            lambda: jsonify({"turma_id": turma_id, **varredura_k(turma_id)}),
+        )
+
+    @expose("/tendencia", methods=("GET",))
+    def evolucao(self):
+        """
+        Evolução da taxa de erro (só resumos por dia/semana):
+        ?turma_id=&de=AAAA-MM-DD&ate=AAAA-MM-DD&periodo=dia|semana[&aluno_id=]
+        Padrão: últimos 120 dias, por semana.
+        """
         turma_id = _parse_int(request.args.get("turma_id"))
+        if not turma_id or db.session.get(Turma, turma_id) is None:
+            return jsonify({"erro": "turma_id inválido"}), 400
+        try:
+            ate = date.fromisoformat(request.args["ate"]) if request.args.get("ate") else datetime.utcnow().date()
+            de = date.fromisoformat(request.args["de"]) if request.args.get("de") else ate - timedelta(days=120)
+        except ValueError:
+            return jsonify({"erro": "datas no formato AAAA-MM-DD"}), 400
+        periodo = request.args.get("periodo") or "semana"
         aluno_id = _parse_int(request.args.get("aluno_id"))
-        k = _parse_int(request.args.get("k")) or 3
-        k = max(1, min(int(k), 10))
-
-        ctx: Dict[str, Any] = {
-            "turmas": turmas,
-            "turma_id": turma_id,
-            "aluno_id": aluno_id,
-            "k": k,
-            "chart_data": {"labels": [], "datasets": []},
-            "dados_turma": [],
-            "total_interacoes_turma": 0,
-            "donut_turma": {"acertos": 0, "erros": 0, "total": 0},
-            "alunos_cards": [],
-            # detalhes aluno
-            "aluno_grupo": None,
-            "aluno_selecionado": None,
-            "aluno_topicos": [],
-            "total_interacoes_aluno": 0,
-            "donut_aluno": {"acertos": 0, "erros": 0, "total": 0},
-        }
-
-        if not turma_id:
-            return self.render("admin/analise.html", **ctx)
-
-        # valida aluno_id pertence à turma
-        if aluno_id is not None:
-            ids_turma = {int(a.id) for a in _alunos_da_turma(turma_id)}
-            if int(aluno_id) not in ids_turma:
-                aluno_id = None
-                ctx["aluno_id"] = None
-
-        clusters, chart = _kmeans_por_turma(turma_id, k)
-        ctx["chart_data"] = chart
-        ctx["alunos_cards"] = _alunos_cards(turma_id, clusters)
-
-        ctx["dados_turma"] = _dados_por_topico(turma_id, None)
-        tot_t, donut_t = _donut_data(turma_id, None)
-        ctx["total_interacoes_turma"] = tot_t
-        ctx["donut_turma"] = donut_t
-
-        if aluno_id is not None:
-            ctx["aluno_grupo"] = clusters.get(int(aluno_id))
-            aobj = db.session.get(Usuario, int(aluno_id))
-            if aobj:
-                ctx["aluno_selecionado"] = {"id": int(aobj.id), "nome": aobj.nome, "email": aobj.email}
-
-            ctx["aluno_topicos"] = _aluno_matriz(turma_id, int(aluno_id))
-            tot_a, donut_a = _donut_data(turma_id, int(aluno_id))
-            ctx["total_interacoes_aluno"] = tot_a
-            ctx["donut_aluno"] = donut_a
-
-        return self.render("admin/analise.html", **ctx)
+        # resumos mudam junto com versao_dados; sem "ate" explícito o ETag também muda de dia
+        return responder_se_modificado(
+            (request.full_path, de, ate, versao_turma(turma_id)),
+            lambda: _tendencia_json(turma_id, de, ate, periodo, aluno_id),
+        )
+
+
+def _tendencia_json(turma_id: int, de: date, ate: date, periodo: str, aluno_id: Optional[int]):
+    por_topico = tendencia_por_topico(turma_id, de, ate, periodo)
+    nomes = dict(db.session.query(Topico.id, Topico.nome).filter(Topico.id.in_(list(por_topico))).all())
+    return jsonify({
+        "turma_id": turma_id,
+        "periodo": periodo if periodo in ("dia", "semana") else "dia",
+        "de": de.isoformat(),
+        "ate": ate.isoformat(),
+        "turma": tendencia(turma_id, de, ate, periodo),
+        "topicos": [
+            {"id": tid, "nome": nomes.get(tid, f"Tópico {tid}"), "serie": serie}
+            for tid, serie in sorted(por_topico.items(), key=lambda x: str(nomes.get(x[0], "")).lower())
+        ],
+        "aluno": tendencia(turma_id, de, ate, periodo, usuario_id=aluno_id) if aluno_id else None,
+    })
 
 
 # ============================================================
@@ -724,25 +348,10 @@ class AnaliseView(AdminAccessMixin, BaseView):
 
 def _salvar_imagem_enunciado(file_storage):
     """
-    Salva arquivo em: /static/uploads/enunciados/
+    Valida e guarda o upload (variantes em segundo plano, app/imagens.py).
     Retorna string relativa para salvar no banco: "uploads/enunciados/<nome>"
     """
-    if not file_storage or not getattr(file_storage, "filename", ""):
-        return None
-
-    filename = secure_filename(file_storage.filename)
-    ext = Path(filename).suffix.lower()
-    if ext not in {".png", ".jpg", ".jpeg", ".webp", ".gif"}:
-        raise ValueError("Formato de imagem inválido. Use PNG/JPG/WebP/GIF.")
-
-    upload_dir = Path(current_app.static_folder) / "uploads" / "enunciados"
-    upload_dir.mkdir(parents=True, exist_ok=True)
-
-    new_name = f"en_{uuid.uuid4().hex}{ext}"
-    dest = upload_dir / new_name
-    file_storage.save(dest)
-
-    return f"uploads/enunciados/{new_name}"
+    return salvar_upload(file_storage)
 
 
 class TurmasHubView(AdminAccessMixin, BaseView):
@@ -1089,44 +698,19 @@ class ConteudosHubView(AdminAccessMixin, BaseView):
 
 def _save_enunciado_image(file_storage):
     """
-    Salva em: app/static/uploads/enunciados/
-    Retorna caminho RELATIVO ao static: 'uploads/enunciados/en_xxx.jpg'
+    Valida e guarda o upload; nome pelo hash do conteúdo (app/imagens.py).
+    Retorna caminho RELATIVO ao static: 'uploads/enunciados/en_<hash>.jpg'
     """
-    if not file_storage or not getattr(file_storage, "filename", ""):
-        return None
-
-    filename = secure_filename(file_storage.filename)
-    if "." not in filename:
-        raise ValueError("Arquivo de imagem sem extensão.")
-
-    ext = filename.rsplit(".", 1)[1].lower().strip()
-    if ext not in ALLOWED_IMG_EXT:
-        raise ValueError("Extensão de imagem não permitida.")
-
-    newname = f"en_{uuid.uuid4().hex}.{ext}"
-    relpath = f"uploads/enunciados/{newname}"
-    abspath = os.path.join(current_app.static_folder, relpath)
-
-    os.makedirs(os.path.dirname(abspath), exist_ok=True)
-    file_storage.save(abspath)
-    return relpath
+    return salvar_upload(file_storage)
 
 
-def _try_delete_static_file(relpath: str | None):
+def _try_delete_static_file(relpath: str | None, desafio_id: int | None = None):
     """
-    Remove arquivo se estiver dentro do static/uploads/enunciados.
+    Remove a imagem (e variantes) se estiver em static/uploads/enunciados
+    e nenhum outro desafio além de `desafio_id` usar o mesmo arquivo.
     """
-    if not relpath:
-        return
-    rel = str(relpath).replace("\\", "/").lstrip("/")
-    if rel.lower() in {"none", "null", ""}:
-        return
-    if not rel.startswith("uploads/enunciados/"):
-        return
-    abspath = os.path.join(current_app.static_folder, rel)
     try:
-        if os.path.exists(abspath):
-            os.remove(abspath)
+        remover_imagem(relpath, exceto_desafio_id=desafio_id)
     except Exception:
         pass
 
@@ -1186,6 +770,7 @@ class AtividadesHubView(BaseView):
                 )
                 db.session.add(d)
                 db.session.commit()
+                agendar_formulas(enunciado_texto)  # SVG das fórmulas em segundo plano
                 flash("Questão criada com sucesso.", "success")
                 return redirect(url_for("atividades.index"))
 
@@ -1216,7 +801,7 @@ class AtividadesHubView(BaseView):
                 # remover imagem atual
                 remover = (request.form.get("remover_imagem") or "").strip() == "1"
                 if remover:
-                    _try_delete_static_file(d.enunciado_imagem)
+                    _try_delete_static_file(d.enunciado_imagem, d.id)
                     d.enunciado_imagem = None
 
                 # trocar imagem (se enviou)
@@ -1228,7 +813,8 @@ class AtividadesHubView(BaseView):
                         flash(str(e), "danger")
                         return redirect(url_for("atividades.index"))
 
-                    _try_delete_static_file(d.enunciado_imagem)
+                    if new_rel != d.enunciado_imagem:  # mesmo conteúdo = mesmo arquivo
+                        _try_delete_static_file(d.enunciado_imagem, d.id)
                     d.enunciado_imagem = new_rel
 
                 # evita gravar "None" string
@@ -1236,6 +822,7 @@ class AtividadesHubView(BaseView):
                     d.enunciado_imagem = None
 
                 db.session.commit()
+                agendar_formulas(enunciado_texto)
                 flash("Questão atualizada com sucesso.", "success")
                 return redirect(url_for("atividades.index"))
 
@@ -1248,7 +835,7 @@ class AtividadesHubView(BaseView):
                     return redirect(url_for("atividades.index"))
 
                 # apaga imagem do disco
-                _try_delete_static_file(getattr(d, "enunciado_imagem", None))
+                _try_delete_static_file(getattr(d, "enunciado_imagem", None), d.id)
 
                 # apaga perguntas vinculadas
                 Pergunta.query.filter_by(desafio_id=d.id).delete()
@@ -1285,7 +872,10 @@ class AtividadesHubView(BaseView):
                     correta=correta,
                 )
                 db.session.add(p)
+                db.session.flush()
+                recalcular_tentativas_abertas(desafio_id)  # quem está no desafio também responde a nova
                 db.session.commit()
+                agendar_formulas(enunciado, alt_a, alt_b, alt_c, alt_d)
                 flash("Pergunta criada.", "success")
                 return redirect(url_for("atividades.index"))
 
@@ -1298,6 +888,7 @@ class AtividadesHubView(BaseView):
                     flash("Pergunta não encontrada.", "warning")
                     return redirect(url_for("atividades.index"))
 
+                desafio_antes = p.desafio_id
                 p.desafio_id = desafio_id or p.desafio_id
                 p.enunciado = (request.form.get("enunciado") or "").strip()
                 p.alt_a = (request.form.get("alt_a") or "").strip()
@@ -1308,7 +899,12 @@ class AtividadesHubView(BaseView):
                 correta = (request.form.get("correta") or "a").strip().lower()
                 p.correta = correta if correta in {"a", "b", "c", "d"} else "a"
 
+                textos = textos_da_pergunta(p)  # antes do commit (que expira o objeto)
+                if p.desafio_id != desafio_antes:
+                    db.session.flush()
+                    recalcular_tentativas_abertas(desafio_antes, p.desafio_id)
                 db.session.commit()
+                agendar_formulas(*textos)
                 flash("Pergunta atualizada.", "success")
                 return redirect(url_for("atividades.index"))
 
@@ -1319,7 +915,10 @@ class AtividadesHubView(BaseView):
                 if not p:
                     flash("Pergunta não encontrada.", "warning")
                     return redirect(url_for("atividades.index"))
+                desafio_id = p.desafio_id
                 db.session.delete(p)
+                db.session.flush()
+                recalcular_tentativas_abertas(desafio_id)
                 db.session.commit()
                 flash("Pergunta removida.", "success")
                 return redirect(url_for("atividades.index"))
@@ -1360,6 +959,10 @@ class AtividadesHubView(BaseView):
             .all()
         )
 
+        # estatísticas por pergunta: só leitura; o passo incremental roda em segundo plano
+        agendar_atualizacao_estatisticas()
+        estatisticas = {e.pergunta_id: e for e in EstatisticaPergunta.query.all()}
+
         topicos_cards = []
         for t in topicos:
             desafios = (
@@ -1387,6 +990,10 @@ class AtividadesHubView(BaseView):
                     "preview": _preview_text(d),
                     "n_perguntas": len(perguntas),
                     "perguntas": perguntas,
+                    "distratores": {
+                        p.id: distrator_principal(estatisticas[p.id], p.correta)
+                        for p in perguntas if p.id in estatisticas
+                    },
                 })
 
             topicos_cards.append({
@@ -1406,6 +1013,7 @@ class AtividadesHubView(BaseView):
             topicos_cards=topicos_cards,
             topicos_all=topicos_all,
             desafios_all=desafios_all,
+            estatisticas=estatisticas,
             disciplina_id=disciplina_id,
             topico_id=topico_id
         )
@@ -1469,6 +1077,7 @@ class UsuariosHubView(AdminAccessMixin, BaseView):
                     .all()
                 ]
                 if tentativas_ids:
+                    descontar_tentativas(tentativas_ids)
                     Interacao.query.filter(Interacao.tentativa_id.in_(tentativas_ids)).delete(synchronize_session=False)
                     TentativaDesafio.query.filter(TentativaDesafio.id.in_(tentativas_ids)).delete(synchronize_session=False)
 
@@ -1517,6 +1126,22 @@ class UsuariosHubView(AdminAccessMixin, BaseView):
         )
 
 
+class MetricasSQLView(AdminAccessMixin, BaseView):
+    """
+    /admin/metricas-sql: agregados de SQL por endpoint (JSON).
+    ?limpar=1 zera os contadores.
+    """
+
+    def is_visible(self):
+        return False
+
+    @expose("/", methods=("GET",))
+    def index(self):
+        if request.args.get("limpar") == "1":
+            estatisticas_sql.limpar()
+        return jsonify(estatisticas_sql.resumo())
+
+
 # ============================================================
 # Admin factory
 # ============================================================
@@ -1537,6 +1162,7 @@ def configurar_admin(app):
     admin.add_view(AtividadesHubView(name="Atividades", endpoint="atividades", url="/admin/atividades"))
     admin.add_view(AnaliseView(name="Análise", endpoint="analise", url="/admin/analise"))
     admin.add_view(UsuariosHubView(name="Usuários", endpoint="usuarios", url="/admin/usuarios"))
+    admin.add_view(MetricasSQLView(name="Métricas SQL", endpoint="metricas_sql", url="/admin/metricas-sql"))
 
     # CRUDs antigos (fallback)
     admin.add_view(SecureModelView(Turma, db.session, name="Turmas (CRUD)", endpoint="turma"))
@@ -0,0 +1,229 @@
+# app/perfilador.py
+"""
+Profiling sob demanda para páginas lentas do admin.
+
+Só liga quando um admin pede explicitamente, por query string ou header:
+
+    /admin/analise/?turma_id=1&_perfil=1          (salva em instance/perfis/)
+    /admin/analise/?turma_id=1&_perfil=texto      (responde com o .folded)
+    /admin/analise/?turma_id=1&_perfil=json       (responde com folded + SQL)
+    X-Perfil: 1 | texto | json                    (mesmo efeito, via header)
+
+Tipos (_perfil_tipo ou X-Perfil-Tipo):
+  - amostragem (padrão): thread amostra a pilha do request a cada
+    PERFIL_INTERVALO_MS e gera "stacks colapsadas" (formato do flamegraph.pl /
+    speedscope / inferno: "mod:func;mod:func N").
+  - cprofile: determinístico; salva também o .pstats (snakeviz, flameprof).
+
+Junto vai a linha do tempo de SQL do request (vinda de app/instrumentacao.py):
+início relativo, duração e statement de cada consulta.
+
+Sem o parâmetro/header o custo é só a checagem no before_request.
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from flask import Response, g, jsonify, request
+from flask_login import current_user
+
+MODOS = {"1", "salvar", "texto", "json"}
+
+
+class AmostradorPilha:
+    """Amostra a pilha de uma thread em intervalos fixos (sys._current_frames)."""
+
+    def __init__(self, thread_id: int, intervalo_s: float = 0.002):
+        self.thread_id = thread_id
+        self.intervalo_s = max(0.0005, float(intervalo_s))
+        self.pilhas: Counter = Counter()
+        self.amostras = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="perfilador", daemon=True)
+
+    @staticmethod
+    def _nome_frame(frame) -> str:
+        code = frame.f_code
+        mod = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+        return f"{mod}:{code.co_name}"
+
+    def _loop(self) -> None:
+        while not self._parar.wait(self.intervalo_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            nomes = []
+            while frame is not None:
+                nomes.append(self._nome_frame(frame))
+                frame = frame.f_back
+            self.pilhas[";".join(reversed(nomes))] += 1
+            self.amostras += 1
+
+    def iniciar(self) -> None:
+        self._thread.start()
+
+    def parar(self) -> None:
+        self._parar.set()
+        self._thread.join(timeout=1.0)
+
+    def folded(self) -> str:
+        return "\n".join(f"{pilha} {n}" for pilha, n in self.pilhas.most_common()) + "\n"
+
+
+def _folded_de_pstats(prof: cProfile.Profile) -> str:
+    """
+    Converte o cProfile em stacks colapsadas de 2 níveis (chamador;função),
+    ponderadas pelo tempo próprio em microssegundos. Aproximação: o cProfile
+    não guarda a pilha inteira.
+    """
+    st = pstats.Stats(prof)
+    linhas = []
+    for (arq, linha, func), (_cc, _nc, tt, _ct, callers) in st.stats.items():  # type: ignore[attr-defined]
+        nome = f"{os.path.basename(arq)}:{func}:{linha}"
+        if not callers:
+            linhas.append((nome, tt))
+            continue
+        tot_chamadas = sum(c[1] for c in callers.values()) or 1
+        for (carq, clinha, cfunc), cinfo in callers.items():
+            peso = tt * (cinfo[1] / tot_chamadas)
+            linhas.append((f"{os.path.basename(carq)}:{cfunc}:{clinha};{nome}", peso))
+    return "\n".join(f"{p} {int(round(t * 1e6))}" for p, t in linhas if t > 0) + "\n"
+
+
+def _linha_do_tempo_sql(t_inicio: float) -> List[Dict[str, Any]]:
+    est = g.get("_sql_instr")
+    if not est:
+        return []
+    return [
+        {"inicio_ms": round((t0 - t_inicio) * 1000.0, 3), "duracao_ms": round(ms, 3), "sql": sql}
+        for ms, sql, t0 in est["consultas"]
+    ]
+
+
+def _parar(estado: Dict[str, Any]) -> None:
+    """Desliga o cProfile / a thread de amostragem. Idempotente."""
+    if estado.get("parado"):
+        return
+    estado["parado"] = True
+    estado["duracao_ms"] = (time.perf_counter() - estado["t0"]) * 1000.0
+    if estado["tipo"] == "cprofile":
+        estado["prof"].disable()
+    else:
+        estado["amostrador"].parar()
+
+
+def _modo_pedido() -> Optional[str]:
+    modo = request.args.get("_perfil") or request.headers.get("X-Perfil")
+    if not modo:
+        return None
+    modo = modo.strip().lower()
+    return modo if modo in MODOS else None
+
+
+def configurar_perfilador(app) -> None:
+    """Registrar DEPOIS de configurar_instrumentacao (para ler a linha do tempo de SQL)."""
+    if not app.config.get("PERFIL_HABILITADO", True):
+        return
+
+    @app.before_request
+    def _perfil_inicio():
+        modo = _modo_pedido()
+        if modo is None:
+            return
+        t0 = time.perf_counter()
+        if not (current_user.is_authenticated and getattr(current_user, "is_admin", False)):
+            return
+
+        tipo = (request.args.get("_perfil_tipo") or request.headers.get("X-Perfil-Tipo") or "amostragem").lower()
+        estado: Dict[str, Any] = {"modo": modo, "tipo": tipo, "t0": t0}
+        if tipo == "cprofile":
+            prof = cProfile.Profile()
+            estado["prof"] = prof
+            prof.enable()
+        else:
+            estado["tipo"] = "amostragem"
+            amostrador = AmostradorPilha(
+                threading.get_ident(),
+                float(app.config.get("PERFIL_INTERVALO_MS", 2)) / 1000.0,
+            )
+            estado["amostrador"] = amostrador
+            amostrador.iniciar()
+        g._perfil = estado
+
+    @app.after_request
+    def _perfil_fim(resp):
+        # só monta a resposta; quem encerra o perfil é o teardown (roda mesmo com exceção)
+        estado = g.get("_perfil")
+        if estado is None:
+            return resp
+
+        _parar(estado)  # fecha a coleta antes de ler (o teardown não repete)
+        duracao_ms = estado["duracao_ms"]
+        pstats_txt = None
+        if estado["tipo"] == "cprofile":
+            prof = estado["prof"]
+            folded = _folded_de_pstats(prof)
+            buf = io.StringIO()
+            pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(40)
+            pstats_txt = buf.getvalue()
+            amostras = None
+        else:
+            amostrador = estado["amostrador"]
+            folded = amostrador.folded()
+            amostras = amostrador.amostras
+
+        sql = _linha_do_tempo_sql(estado["t0"])
+        endpoint = request.endpoint or "sem_endpoint"
+        info = {
+            "endpoint": endpoint,
+            "url": request.full_path,
+            "tipo": estado["tipo"],
+            "duracao_ms": round(duracao_ms, 3),
+            "amostras": amostras,
+            "sql_consultas": len(sql),
+            "sql_ms": round(sum(c["duracao_ms"] for c in sql), 3),
+            "sql": sql,
+        }
+
+        modo = estado["modo"]
+        if modo == "texto":
+            return Response(folded, content_type="text/plain; charset=utf-8")
+        if modo == "json":
+            info["folded"] = folded
+            if pstats_txt:
+                info["pstats"] = pstats_txt
+            return jsonify(info)
+
+        pasta = os.path.join(app.instance_path, app.config.get("PERFIL_PASTA", "perfis"))
+        os.makedirs(pasta, exist_ok=True)
+        base = f"{datetime.utcnow():%Y%m%d-%H%M%S-%f}_{re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)}"
+        with open(os.path.join(pasta, base + ".folded"), "w", encoding="utf-8") as f:
+            f.write(folded)
+        with open(os.path.join(pasta, base + ".sql.json"), "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=1)
+        if estado["tipo"] == "cprofile":
+            estado["prof"].dump_stats(os.path.join(pasta, base + ".pstats"))
+
+        resp.headers["X-Perfil-Arquivo"] = base
+        resp.headers["X-Perfil-Duracao-ms"] = f"{duracao_ms:.2f}"
+        return resp
+
+    @app.teardown_request
+    def _perfil_encerrar(_exc):
+        # view ou after_request com exceção: sem isso a thread de amostragem
+        # (ou o cProfile) ficava ligada depois do request
+        estado = g.pop("_perfil", None)
+        if estado is not None:
+            _parar(estado)
+            estado.clear()
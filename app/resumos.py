@@ -0,0 +1,220 @@
+# app/resumos.py
+"""
+Resumos por período das respostas (para gráficos de evolução).
+
+Cada resposta soma em duas tabelas, para o dia e para a semana (segunda-feira)
+de Interacao.criado_em:
+
+    resumos_topico  (turma_id, periodo, inicio, topico_id) -> total, erros
+    resumos_aluno   (turma_id, usuario_id, periodo, inicio) -> total, erros
+
+A soma é um upsert (INSERT ... ON CONFLICT DO UPDATE total = total + x) na
+mesma transação da resposta, chamado por servicos.contabilizar_resposta. Troca
+de acerto numa resposta já gravada entra como delta (erros ±1, total 0) no
+período da resposta original.
+
+Os gráficos (tendencia) leem só os resumos: um semestre por turma são algumas
+centenas de linhas, sem varrer interacoes. reconstruir_resumos() refaz tudo a
+partir das interações (tabelas novas num banco existente, ou após correções).
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func, select, update
+
+from .modelos import db, insert_dialeto, Interacao, ResumoAluno, ResumoTopico, TentativaDesafio
+
+PERIODOS = ("dia", "semana")
+
+
+def inicio_do_periodo(dia: date, periodo: str) -> date:
+    if periodo == "semana":
+        return dia - timedelta(days=dia.weekday())
+    return dia
+
+
+def _dia(quando) -> date:
+    if quando is None:
+        return datetime.utcnow().date()
+    if isinstance(quando, datetime):
+        return quando.date()
+    if isinstance(quando, str):  # func.date() no SQLite devolve texto
+        return date.fromisoformat(quando[:10])
+    return quando
+
+
+# =========================
+# Escrita (por resposta)
+# =========================
+
+def acumular(turma_id: int, topico_id: int, usuario_id: int, quando=None,
+             delta_total: int = 1, delta_erros: int = 0) -> None:
+    """Soma uma resposta (ou um delta) nos resumos do dia e da semana. Não faz commit."""
+    if not delta_total and not delta_erros:
+        return
+    dia = _dia(quando)
+    _somar(
+        [{"turma_id": int(turma_id), "topico_id": int(topico_id), "periodo": p,
+          "inicio": inicio_do_periodo(dia, p), "total": int(delta_total), "erros": int(delta_erros)}
+         for p in PERIODOS],
+        [{"turma_id": int(turma_id), "usuario_id": int(usuario_id), "periodo": p,
+          "inicio": inicio_do_periodo(dia, p), "total": int(delta_total), "erros": int(delta_erros)}
+         for p in PERIODOS],
+    )
+
+
+_CHAVES = {
+    ResumoTopico: ("turma_id", "periodo", "inicio", "topico_id"),
+    ResumoAluno: ("turma_id", "usuario_id", "periodo", "inicio"),
+}
+
+
+def _somar(linhas_topico: List[Dict[str, Any]], linhas_aluno: List[Dict[str, Any]]) -> None:
+    for modelo, linhas in ((ResumoTopico, linhas_topico), (ResumoAluno, linhas_aluno)):
+        if not linhas:
+            continue
+        t = modelo.__table__
+        chave = _CHAVES[modelo]
+        stmt = insert_dialeto(t)
+        if stmt is not None:
+            stmt = stmt.values(linhas)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=list(chave),
+                set_={"total": t.c.total + stmt.excluded.total, "erros": t.c.erros + stmt.excluded.erros},
+            ))
+            continue
+
+        # outros bancos: UPDATE e, se não havia linha, INSERT
+        for linha in linhas:
+            cond = [t.c[c] == linha[c] for c in chave]
+            n = db.session.execute(
+                update(t).where(*cond).values(total=t.c.total + linha["total"], erros=t.c.erros + linha["erros"])
+            ).rowcount
+            if not n:
+                db.session.execute(t.insert().values(**linha))
+
+
+def descontar_tentativas(tentativa_ids: Iterable[int]) -> None:
+    """Tira dos resumos as interações dessas tentativas (antes de apagá-las). Não faz commit."""
+    ids = [int(i) for i in tentativa_ids]
+    if not ids:
+        return
+    linhas_topico, linhas_aluno = _agregar(
+        _consulta_diaria().where(TentativaDesafio.id.in_(ids)), sinal=-1
+    )
+    _somar(linhas_topico, linhas_aluno)
+
+
+# =========================
+# Reconstrução a partir das interações
+# =========================
+
+def _consulta_diaria():
+    erros = func.sum(case((Interacao.foi_correta.is_(False), 1), else_=0))
+    dia = func.date(Interacao.criado_em)
+    return (
+        select(TentativaDesafio.turma_id, Interacao.topico_id, TentativaDesafio.usuario_id,
+               dia, func.count(Interacao.id), erros)
+        .join(Interacao, Interacao.tentativa_id == TentativaDesafio.id)
+        .where(Interacao.criado_em.is_not(None))
+        .group_by(TentativaDesafio.turma_id, Interacao.topico_id, TentativaDesafio.usuario_id, dia)
+    )
+
+
+def _agregar(consulta, sinal: int = 1) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    por_topico: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0])
+    por_aluno: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0])
+    for turma_id, topico_id, usuario_id, dia, total, erros in db.session.execute(consulta):
+        dia = _dia(dia)
+        for p in PERIODOS:
+            ini = inicio_do_periodo(dia, p)
+            for acc in (por_topico[(turma_id, p, ini, topico_id)], por_aluno[(turma_id, usuario_id, p, ini)]):
+                acc[0] += sinal * int(total)
+                acc[1] += sinal * int(erros or 0)
+
+    return (
+        [{"turma_id": k[0], "periodo": k[1], "inicio": k[2], "topico_id": k[3], "total": v[0], "erros": v[1]}
+         for k, v in por_topico.items()],
+        [{"turma_id": k[0], "usuario_id": k[1], "periodo": k[2], "inicio": k[3], "total": v[0], "erros": v[1]}
+         for k, v in por_aluno.items()],
+    )
+
+
+def reconstruir_resumos(turma_id: Optional[int] = None) -> int:
+    """Apaga e recalcula os resumos (de uma turma ou de todas). Faz commit; retorna nº de linhas."""
+    consulta = _consulta_diaria()
+    for modelo in (ResumoTopico, ResumoAluno):
+        q = db.session.query(modelo)
+        if turma_id is not None:
+            q = q.filter(modelo.turma_id == int(turma_id))
+        q.delete(synchronize_session=False)
+    if turma_id is not None:
+        consulta = consulta.where(TentativaDesafio.turma_id == int(turma_id))
+
+    linhas_topico, linhas_aluno = _agregar(consulta)
+    if linhas_topico:
+        db.session.execute(ResumoTopico.__table__.insert(), linhas_topico)
+    if linhas_aluno:
+        db.session.execute(ResumoAluno.__table__.insert(), linhas_aluno)
+    db.session.commit()
+    return len(linhas_topico) + len(linhas_aluno)
+
+
+def preencher_resumos_vazios() -> None:
+    """Banco existente sem resumos (tabelas recém-criadas): preenche a partir das interações."""
+    if db.session.query(ResumoTopico.id).first() is None and db.session.query(Interacao.id).first() is not None:
+        reconstruir_resumos()
+
+
+# =========================
+# Leitura (gráficos de evolução)
+# =========================
+
+def tendencia(turma_id: int, de: date, ate: date, periodo: str = "dia",
+              topico_id: Optional[int] = None, usuario_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Série [{inicio, total, erros, taxa_erro}] da turma no intervalo [de, ate],
+    só dos resumos. Com topico_id: um tópico; com usuario_id: um aluno (todos os tópicos).
+    """
+    periodo = periodo if periodo in PERIODOS else "dia"
+    de = inicio_do_periodo(de, periodo)
+    modelo = ResumoAluno if usuario_id is not None else ResumoTopico
+    q = (
+        db.session.query(modelo.inicio, func.sum(modelo.total), func.sum(modelo.erros))
+        .filter(modelo.turma_id == int(turma_id), modelo.periodo == periodo,
+                modelo.inicio >= de, modelo.inicio <= ate)
+    )
+    if usuario_id is not None:
+        q = q.filter(ResumoAluno.usuario_id == int(usuario_id))
+    elif topico_id is not None:
+        q = q.filter(ResumoTopico.topico_id == int(topico_id))
+
+    serie = []
+    for inicio, total, erros in q.group_by(modelo.inicio).order_by(modelo.inicio.asc()):
+        total, erros = int(total or 0), int(erros or 0)
+        if total <= 0:
+            continue
+        serie.append({"inicio": _dia(inicio).isoformat(), "total": total, "erros": erros,
+                      "taxa_erro": round(erros / total, 4)})
+    return serie
+
+
+def tendencia_por_topico(turma_id: int, de: date, ate: date, periodo: str = "dia") -> Dict[int, List[Dict[str, Any]]]:
+    """{topico_id: série} para a turma, numa consulta só."""
+    periodo = periodo if periodo in PERIODOS else "dia"
+    de = inicio_do_periodo(de, periodo)
+    rows = (
+        db.session.query(ResumoTopico.topico_id, ResumoTopico.inicio, ResumoTopico.total, ResumoTopico.erros)
+        .filter(ResumoTopico.turma_id == int(turma_id), ResumoTopico.periodo == periodo,
+                ResumoTopico.inicio >= de, ResumoTopico.inicio <= ate, ResumoTopico.total > 0)
+        .order_by(ResumoTopico.topico_id.asc(), ResumoTopico.inicio.asc())
+        .all()
+    )
+    out: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    for topico_id, inicio, total, erros in rows:
+        out[int(topico_id)].append({"inicio": _dia(inicio).isoformat(), "total": int(total), "erros": int(erros),
+                                    "taxa_erro": round(int(erros) / int(total), 4)})
+    return dict(out)
@@ -3,6 +3,7 @@ from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from .modelos import db, Usuario, Turma, Pergunta, TentativaDesafio, Interacao, Desafio, Topico, Disciplina, turmas_disciplinas
 from .formularios import FormEntrar, FormCadastro
+from .metricas import respostas_total
 from .servicos import (
     buscar_turma_por_codigo,
     matricular,
@@ -11,8 +12,16 @@ from .servicos import (
     selecionar_proximo_desafio,
     iniciar_tentativa,
     registrar_resposta,
-    finalizar_tentativa
+    finalizar_tentativa,
+    abrir_tentativa,
+    contabilizar_resposta,
+    gravar_interacao,
+    recalcular_proxima_pergunta,
 )
+from .cache_http import responder_se_modificado
+from .formulas import VERSAO_RENDER, formulas_prontas, textos_da_pergunta, textos_do_desafio
+from .imagens import imagem_pendente, imagem_responsiva, url_imagem
+from .selecao_adaptativa import modo_adaptativo, proximo_desafio_adaptativo
 from sqlalchemy import exists, select
 site_bp = Blueprint("site", __name__)
 
@@ -20,13 +29,9 @@ def _desafio_to_dict(desafio: Desafio):
     disciplina = desafio.topico.disciplina.nome if desafio.topico and desafio.topico.disciplina else ""
     topico = desafio.topico.nome if desafio.topico else ""
 
-    img_url = None
-    if desafio.enunciado_imagem:
-        nome = desafio.enunciado_imagem.strip()
-        prefix = "uploads/enunciados/"
-        if nome.startswith(prefix):
-            nome = nome[len(prefix):]
-        img_url = url_for("static", filename=f"uploads/enunciados/{nome}", _external=False)
+    # variantes WebP/JPEG por largura; sem elas ainda, o arquivo principal (ou nada, se processando)
+    imagem = imagem_responsiva(desafio.enunciado_imagem)
+    img_url = imagem["url"] if imagem else url_imagem(desafio.enunciado_imagem)
 
     return {
         "id": desafio.id,
@@ -36,6 +41,9 @@ def _desafio_to_dict(desafio: Desafio):
         "enunciado_texto": desafio.enunciado_texto or "",
         "enunciado_latex": desafio.enunciado_latex or "",
         "enunciado_imagem_url": img_url,
+        "enunciado_imagem": imagem,
+        "versao": desafio.versao,
+        "formulas": formulas_prontas(*textos_do_desafio(desafio))[0],
     }
 
 
@@ -51,6 +59,7 @@ def _pergunta_to_dict(p: Pergunta):
         "enunciado": p.enunciado,
         "alternativas": alts,
         "ordem": p.ordem,
+        "formulas": formulas_prontas(*textos_da_pergunta(p))[0],
     }
 
 def _payload_tentativa(t: TentativaDesafio):
@@ -213,7 +222,14 @@ def api_proximo():
     )
 
     # 2) se não tem tentativa, escolhe próximo desafio não concluído que TENHA perguntas
-    if not tentativa:
+    if not tentativa and modo_adaptativo():
+        # fila por aluno em memória: tópico menos dominado primeiro
+        desafio = proximo_desafio_adaptativo(aluno_id, turma_id)
+        if not desafio:
+            return jsonify({"done": True, "message": "Você concluiu todos os desafios desta turma."}), 200
+        tentativa, _criada = abrir_tentativa(aluno_id, turma_id, desafio)
+
+    elif not tentativa:
         # subquery desafios concluídos
         concluidos_q = (
             db.session.query(TentativaDesafio.desafio_id)
@@ -236,15 +252,8 @@ def api_proximo():
         if not desafio:
             return jsonify({"done": True, "message": "Você concluiu todos os desafios desta turma."}), 200
 
-        tentativa = TentativaDesafio(
-            usuario_id=aluno_id,
-            turma_id=turma_id,
-            desafio_id=desafio.id,
-            topico_id=desafio.topico_id,
-            finalizada=False,
-        )
-        db.session.add(tentativa)
-        db.session.commit()
+        # upsert: se outra aba/retry abriu uma tentativa no meio tempo, volta ela
+        tentativa, _criada = abrir_tentativa(aluno_id, turma_id, desafio)
 
     return jsonify(_montar_payload(tentativa)), 200
 
@@ -253,49 +262,82 @@ def _montar_payload(tentativa: TentativaDesafio):
     desafio = tentativa.desafio
 
     # garante: se por algum motivo não tiver perguntas, finaliza e pede novo
-    total = Pergunta.query.filter_by(desafio_id=desafio.id).count()
+    total = int(tentativa.total_perguntas or 0)
     if total == 0:
-        tentativa.finalizada = True
-        db.session.commit()
+        finalizar_tentativa(tentativa.id)
         return {
             "fim_do_desafio": True,
             "message": "Este desafio não possui perguntas cadastradas e foi ignorado.",
         }
 
-    # respondidas
-    respondidas = {i.pergunta_id for i in tentativa.interacoes}
-
-    # próxima pergunta
-    prox = (
-        Pergunta.query
-        .filter_by(desafio_id=desafio.id)
-        .order_by(Pergunta.ordem.asc(), Pergunta.id.asc())
-        .all()
-    )
-    restantes = [p for p in prox if p.id not in respondidas]
-
-    if not restantes:
-        tentativa.finalizada = True
+    # próxima pergunta (mantida em tentativa.proxima_pergunta_id a cada resposta)
+    pergunta = None
+    if tentativa.proxima_pergunta_id:
+        pergunta = db.session.get(Pergunta, tentativa.proxima_pergunta_id)
+    if pergunta is None and tentativa.proxima_pergunta_id:
+        # pergunta removida no meio da tentativa: recalcula
+        pid = recalcular_proxima_pergunta(tentativa)
         db.session.commit()
+        pergunta = db.session.get(Pergunta, pid) if pid else None
+        total = int(tentativa.total_perguntas or 0)
+
+    if pergunta is None:
+        # dominou, taxa e métrica saem como num /finalizar (idempotente: a rota pode vir depois)
+        finalizar_tentativa(tentativa.id)
         return {
             "fim_do_desafio": True,
             "message": "Você terminou este desafio. Clique em “Próximo desafio” para continuar.",
             "tentativa_id": tentativa.id,
-            "desafio": _desafio_to_dict(desafio),
+            "desafio": _desafio_ref(desafio),
         }
 
-    pergunta = restantes[0]
-    indice = len(respondidas) + 1
+    indice = int(tentativa.respondidas or 0) + 1
 
+    # só o estado: o conteúdo vem de GET /api/tutor/desafio/<id> (ETag, cache do navegador)
     return {
         "fim_do_desafio": False,
         "tentativa_id": tentativa.id,
-        "desafio": _desafio_to_dict(desafio),
-        "pergunta": _pergunta_to_dict(pergunta),
+        "desafio": _desafio_ref(desafio),
+        "pergunta_id": pergunta.id,
         "total_perguntas": total,
         "indice_pergunta": indice,
     }
 
+
+def _desafio_ref(desafio: Desafio):
+    """Id + versão: o tutor reaproveita o conteúdo já baixado enquanto a versão não muda."""
+    return {"id": desafio.id, "versao": desafio.versao}
+
+@site_bp.route("/api/tutor/desafio/<int:desafio_id>", methods=["GET"])
+@login_required
+def api_desafio(desafio_id: int):
+    """Conteúdo do desafio (enunciado + perguntas, sem gabarito), com ETag pela versão do conteúdo."""
+    # só desafios que o aluno já recebeu do tutor
+    versao = (
+        db.session.query(Desafio.versao, Desafio.criado_em)
+        .join(TentativaDesafio, TentativaDesafio.desafio_id == Desafio.id)
+        .filter(Desafio.id == desafio_id, TentativaDesafio.usuario_id == current_user.id)
+        .first()
+    )
+    if versao is None:
+        return jsonify({"error": "Desafio não encontrado."}), 404
+
+    def gerar():
+        desafio = db.session.get(Desafio, desafio_id)
+        perguntas = sorted(desafio.perguntas, key=lambda p: (p.ordem or 0, p.id))
+        resp = jsonify({
+            "desafio": _desafio_to_dict(desafio),
+            "perguntas": [_pergunta_to_dict(p) for p in perguntas],
+        })
+        # fórmula ou imagem ainda processando: o mesmo ETag mudaria de conteúdo, então sem cache
+        textos = textos_do_desafio(desafio) + [t for p in perguntas for t in textos_da_pergunta(p)]
+        if not formulas_prontas(*textos)[1] or imagem_pendente(desafio.enunciado_imagem):
+            resp.cache_control.no_store = True
+        return resp
+
+    return responder_se_modificado(("desafio", desafio_id, *versao, VERSAO_RENDER), gerar)
+
+
 @site_bp.route("/api/tutor/responder", methods=["POST"])
 @login_required
 def api_responder():
@@ -315,34 +357,26 @@ def api_responder():
     if not pergunta or pergunta.desafio_id != tentativa.desafio_id:
         return jsonify({"error": "Pergunta inválida para este desafio."}), 400
 
-    # já respondeu?
-    ja = Interacao.query.filter_by(tentativa_id=tentativa.id, pergunta_id=pergunta.id).first()
-    if ja:
+    resposta_correta = (pergunta.correta or "").lower()
+    foi_correta = (alternativa == resposta_correta.strip())
+
+    # insert-or-ignore: a unique (tentativa_id, pergunta_id) decide se já respondeu
+    if not gravar_interacao(tentativa, pergunta.id, alternativa, foi_correta):
+        db.session.rollback()
         return jsonify({"error": "Pergunta já respondida."}), 400
 
-    foi_correta = (alternativa == (pergunta.correta or "").lower().strip())
-    inter = Interacao(
-        tentativa_id=tentativa.id,
-        pergunta_id=pergunta.id,
-        topico_id=tentativa.topico_id,
-        alternativa=alternativa,
-        foi_correta=bool(foi_correta),
-    )
-    db.session.add(inter)
+    # contadores + finalizada no mesmo commit da interação
+    progresso = contabilizar_resposta(tentativa, 1, int(bool(foi_correta)))
     db.session.commit()
+    respostas_total.inc(correta=str(bool(foi_correta)).lower())
 
-    total = Pergunta.query.filter_by(desafio_id=tentativa.desafio_id).count()
-    respondidas = Interacao.query.filter_by(tentativa_id=tentativa.id).count()
-    tentativa_concluida = (respondidas >= total)
-
-    if tentativa_concluida:
-        tentativa.finalizada = True
-        db.session.commit()
+    tentativa_concluida = progresso["respondidas"] >= progresso["total_perguntas"]
 
     return jsonify({
         "foi_correta": bool(foi_correta),
-        "resposta_correta": (pergunta.correta or "").lower(),
+        "resposta_correta": resposta_correta,
         "tentativa_concluida": bool(tentativa_concluida),
+        "dominio_topico": progresso["dominio"],
     }), 200
 
 
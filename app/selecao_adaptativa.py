@@ -0,0 +1,232 @@
+# app/selecao_adaptativa.py
+"""
+Seleção adaptativa do próximo desafio (TUTOR_SELECAO = "adaptativa").
+
+No modo padrão ("ordem") o tutor serve os desafios da turma por tópico e id.
+No adaptativo, cada aluno × turma tem uma fila de prioridade em memória:
+
+    heap de tópicos   (-(1 - P(dominou)), topico_id, versao)
+    por tópico        deque dos desafios ainda não entregues, do mais próximo
+                      da habilidade TRI do aluno ao mais distante (app/irt.py;
+                      sem calibração: criado_em, id)
+
+O próximo desafio é o primeiro da deque do tópico no topo do heap (o tópico
+que o aluno menos domina; empate pela ordem original). A fila é montada uma
+vez por aluno × turma (desafios disponíveis, já tentados, domínios e
+calibração TRI: cinco consultas) e depois só muda em memória:
+
+  - resposta nova: contabilizar_resposta passa o P novo do tópico
+    (app/dominio.py) e o tópico volta ao heap com a prioridade nova; a
+    entrada antiga fica obsoleta pela versão e é descartada ao chegar ao topo;
+  - tentativa aberta: o desafio sai da deque do seu tópico.
+
+Mudança no catálogo (desafios, perguntas, tópicos, disciplinas da turma) ou
+tentativas apagadas descartam as filas deste processo; as de outros
+processos expiram em TUTOR_FILA_TTL segundos.
+"""
+from __future__ import annotations
+
+import heapq
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import event, exists
+from sqlalchemy.orm import Session
+
+from .irt import dificuldade_por_desafio, habilidades
+from .modelos import (
+    db, Desafio, Disciplina, DominioTopico, Pergunta, TentativaDesafio, Topico, Turma, turmas_disciplinas,
+)
+
+MAX_FILAS = 4096
+
+
+def modo_adaptativo() -> bool:
+    return str(current_app.config.get("TUTOR_SELECAO", "ordem")).lower() == "adaptativa"
+
+
+class FilaAluno:
+    __slots__ = ("heap", "desafios", "versao", "criada_em")
+
+    def __init__(self, desafios: Dict[int, Deque[int]], prioridades: Dict[int, float]):
+        self.desafios = desafios
+        self.versao: Dict[int, int] = {t: 0 for t in desafios}
+        self.heap: List[Tuple[float, int, int]] = [(-prioridades[t], t, 0) for t in desafios if desafios[t]]
+        heapq.heapify(self.heap)
+        self.criada_em = time.monotonic()
+
+    def topo(self) -> Optional[int]:
+        """Desafio do tópico mais prioritário (sem tirar da fila)."""
+        while self.heap:
+            _p, topico_id, versao = self.heap[0]
+            if versao == self.versao.get(topico_id) and self.desafios[topico_id]:
+                return self.desafios[topico_id][0]
+            heapq.heappop(self.heap)  # entrada obsoleta ou tópico esgotado
+        return None
+
+    def repriorizar(self, topico_id: int, prioridade: float) -> None:
+        if topico_id not in self.desafios:
+            return
+        v = self.versao[topico_id] + 1
+        self.versao[topico_id] = v
+        if self.desafios[topico_id]:
+            heapq.heappush(self.heap, (-prioridade, topico_id, v))
+
+    def remover(self, topico_id: int, desafio_id: int) -> None:
+        fila = self.desafios.get(topico_id)
+        if not fila:
+            return
+        if fila[0] == desafio_id:
+            fila.popleft()
+        else:
+            try:
+                fila.remove(desafio_id)
+            except ValueError:
+                pass
+
+
+_filas: "OrderedDict[Tuple[int, int], FilaAluno]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _prioridade(p_dominio: float) -> float:
+    return 1.0 - float(p_dominio)
+
+
+def _desafios_da_turma(turma_id: int) -> List[Tuple[int, int]]:
+    """
+    (desafio_id, topico_id) com perguntas, das disciplinas ligadas à turma, na
+    ordem do modo "ordem": mesmo join por turmas_disciplinas de rotas.api_proximo
+    (turma sem disciplinas = nenhum desafio).
+    """
+    return (
+        db.session.query(Desafio.id, Desafio.topico_id)
+        .join(Topico, Desafio.topico_id == Topico.id)
+        .join(turmas_disciplinas, turmas_disciplinas.c.disciplina_id == Topico.disciplina_id)
+        .filter(turmas_disciplinas.c.turma_id == turma_id)
+        .filter(exists().where(Pergunta.desafio_id == Desafio.id))
+        .order_by(Topico.id.asc(), Desafio.criado_em.asc(), Desafio.id.asc())
+        .all()
+    )
+
+
+def _montar(usuario_id: int, turma_id: int) -> FilaAluno:
+    # tentativas abertas também contam: o tutor retoma a aberta antes de escolher outro
+    tentados = {
+        r[0] for r in db.session.query(TentativaDesafio.desafio_id).filter(
+            TentativaDesafio.usuario_id == usuario_id,
+            TentativaDesafio.turma_id == turma_id,
+        )
+    }
+    rows = _desafios_da_turma(turma_id)
+
+    # dentro do tópico: dificuldade média (b) mais próxima da habilidade primeiro;
+    # desafio ainda sem calibração conta como no nível do aluno (ganha respostas)
+    theta = habilidades([usuario_id]).get(usuario_id)
+    dificuldade = dificuldade_por_desafio([d for d, _t in rows]) if theta is not None else {}
+    distancia = {d: abs(dificuldade.get(d, theta) - theta) if theta is not None else 0.0 for d, _t in rows}
+
+    desafios: Dict[int, Deque[int]] = OrderedDict()
+    for desafio_id, topico_id in rows:
+        desafios.setdefault(int(topico_id), [])
+        if desafio_id not in tentados:
+            desafios[int(topico_id)].append(int(desafio_id))
+    for topico_id, ids in desafios.items():
+        desafios[topico_id] = deque(sorted(ids, key=distancia.__getitem__))  # sort estável: empate mantém a ordem
+
+    p0 = float(current_app.config.get("DOMINIO_P_INICIAL", 0.3))
+    prioridades = {t: _prioridade(p0) for t in desafios}
+    if desafios:
+        for topico_id, p in db.session.query(DominioTopico.topico_id, DominioTopico.p_dominio).filter(
+            DominioTopico.usuario_id == usuario_id, DominioTopico.topico_id.in_(list(desafios))
+        ):
+            prioridades[int(topico_id)] = _prioridade(p)
+    return FilaAluno(desafios, prioridades)
+
+
+def _fila(usuario_id: int, turma_id: int) -> FilaAluno:
+    chave = (int(usuario_id), int(turma_id))
+    ttl = float(current_app.config.get("TUTOR_FILA_TTL", 300))
+    with _lock:
+        fila = _filas.get(chave)
+        if fila is not None and time.monotonic() - fila.criada_em < ttl:
+            _filas.move_to_end(chave)
+            return fila
+
+    fila = _montar(*chave)
+    with _lock:
+        _filas[chave] = fila
+        _filas.move_to_end(chave)
+        while len(_filas) > MAX_FILAS:
+            _filas.popitem(last=False)
+    return fila
+
+
+# =========================
+# API usada pelo tutor
+# =========================
+
+def proximo_desafio_adaptativo(usuario_id: int, turma_id: int) -> Optional[Desafio]:
+    """Desafio no topo da fila do aluno (não tira da fila; ver desafio_entregue)."""
+    fila = _fila(usuario_id, turma_id)
+    with _lock:
+        desafio_id = fila.topo()
+    return db.session.get(Desafio, desafio_id) if desafio_id is not None else None
+
+
+def desafio_entregue(usuario_id: int, turma_id: int, tentativa: TentativaDesafio) -> None:
+    """Tentativa aberta: o desafio dela sai da fila do aluno."""
+    with _lock:
+        fila = _filas.get((int(usuario_id), int(turma_id)))
+        if fila is not None:
+            fila.remover(int(tentativa.topico_id), int(tentativa.desafio_id))
+
+
+def registrar_dominio(usuario_id: int, turma_id: int, topico_id: int, p_dominio: Optional[float]) -> None:
+    """Novo P(dominou) do tópico: reposiciona o tópico no heap (se a fila está em memória)."""
+    if p_dominio is None:
+        return
+    with _lock:
+        fila = _filas.get((int(usuario_id), int(turma_id)))
+        if fila is not None:
+            fila.repriorizar(int(topico_id), _prioridade(p_dominio))
+
+
+def limpar_filas() -> None:
+    with _lock:
+        _filas.clear()
+
+
+# =========================
+# Invalidação (catálogo mudou)
+# =========================
+
+_MODELOS_CATALOGO = (Desafio, Pergunta, Topico, Disciplina)
+
+
+def _depois_flush(session, _ctx) -> None:
+    for obj in list(session.new) + list(session.deleted) + list(session.dirty):
+        if isinstance(obj, _MODELOS_CATALOGO) or (isinstance(obj, Turma) and obj in session.dirty) \
+                or (isinstance(obj, TentativaDesafio) and obj in session.deleted):
+            limpar_filas()
+            return
+
+
+def _orm_execute(estado) -> None:
+    # DELETE/UPDATE em massa não passam pelo flush
+    mapper = estado.bind_mapper
+    if mapper is None:
+        return
+    if (estado.is_delete or estado.is_update) and mapper.class_ in _MODELOS_CATALOGO:
+        limpar_filas()
+    elif estado.is_delete and mapper.class_ is TentativaDesafio:
+        limpar_filas()
+
+
+def configurar_selecao_adaptativa(app) -> None:
+    if not event.contains(Session, "after_flush", _depois_flush):
+        event.listen(Session, "after_flush", _depois_flush)
+        event.listen(Session, "do_orm_execute", _orm_execute)
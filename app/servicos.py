@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from sqlalchemy import func, case
+from sqlalchemy import func, case, exists, select, update
+from sqlalchemy.orm.attributes import set_committed_value
 from typing import Optional, Any
 
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -17,6 +18,18 @@ from .modelos import (
     Pergunta,
     TentativaDesafio,
     Interacao,
+    TENTATIVA_ABERTA,
+    insert_dialeto,
+)
+from .dados_analise import snapshot_turma, tocar_turmas
+from .dominio import atualizar_dominio
+from .resumos import acumular
+from .selecao_adaptativa import desafio_entregue, modo_adaptativo, proximo_desafio_adaptativo, registrar_dominio
+from .metricas import (
+    desafios_finalizados_total,
+    desafios_iniciados_total,
+    kmeans_segundos,
+    respostas_total,
 )
 
 # =========================
@@ -192,7 +205,11 @@ def selecionar_proximo_desafio(usuario_id: int, turma_id: int) -> Optional[Desaf
     Próximo desafio disponível:
       - não repetir desafios já finalizados (TentativaDesafio.finalizada=True)
       - ignora desafios sem perguntas
+      - TUTOR_SELECAO="adaptativa": tópico menos dominado primeiro (app/selecao_adaptativa.py)
     """
+    if modo_adaptativo():
+        return proximo_desafio_adaptativo(usuario_id, turma_id)
+
     # desafios já concluídos
     concluidos = [
         row[0]
@@ -216,32 +233,236 @@ def selecionar_proximo_desafio(usuario_id: int, turma_id: int) -> Optional[Desaf
     return q.order_by(Desafio.id.asc()).first()
 
 
-def iniciar_tentativa(usuario_id: int, turma_id: int, desafio: Desafio) -> TentativaDesafio:
+def _nao_respondidas(t):
+    """Filtro de perguntas do desafio da tentativa `t` (do UPDATE) ainda sem resposta nela."""
+    return (
+        Pergunta.desafio_id == t.c.desafio_id,
+        # correlacionado a perguntas e à tentativa do UPDATE: sem isso o EXISTS traz
+        # tentativas_desafio no próprio FROM e vale resposta de qualquer tentativa
+        ~exists()
+        .where(Interacao.tentativa_id == t.c.id, Interacao.pergunta_id == Pergunta.id)
+        .correlate_except(Interacao),
+    )
+
+
+def _sq_proxima_pergunta(t):
+    """Subquery correlacionada: próxima pergunta não respondida da tentativa."""
+    return (
+        select(Pergunta.id)
+        .where(*_nao_respondidas(t))
+        .order_by(Pergunta.ordem.asc(), Pergunta.id.asc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def _sq_total_perguntas(t):
     """
-    Evita criar várias tentativas “abertas” do mesmo desafio (ex.: refresh).
+    respondidas + perguntas que faltam: resposta a pergunta já removida continua
+    contando, então respondidas >= total_perguntas só quando não falta nenhuma.
     """
-    existente = TentativaDesafio.query.filter_by(
-        usuario_id=usuario_id,
-        turma_id=turma_id,
-        desafio_id=desafio.id,
-        finalizada=False,
-    ).first()
-    if existente:
-        return existente
+    return t.c.respondidas + select(func.count(Pergunta.id)).where(*_nao_respondidas(t)).scalar_subquery()
+
+
+_CAMPOS_PROGRESSO = ("respondidas", "corretas", "total_perguntas", "proxima_pergunta_id", "finalizada")
 
-    t = TentativaDesafio(
-        usuario_id=usuario_id,
-        turma_id=turma_id,
-        desafio_id=desafio.id,
-        topico_id=desafio.topico_id,
-        finalizada=False,
+
+def contabilizar_resposta(
+    tentativa: TentativaDesafio,
+    delta_respondidas: int,
+    delta_corretas: int,
+    quando=None,
+) -> dict[str, Any]:
+    """
+    Atualiza num único UPDATE os contadores da tentativa (respondidas, corretas),
+    a próxima pergunta e finalizada (quando respondidas chega a total_perguntas),
+    e soma a resposta nos resumos por dia/semana (app/resumos.py) do momento
+    `quando` (padrão: agora; numa troca de acerto, o criado_em da resposta).
+    Resposta nova também atualiza o domínio BKT do aluno no tópico (app/dominio.py);
+    o novo P vem em "dominio".
+
+    Deve rodar depois do flush da Interacao e antes do commit, para ficar na
+    mesma transação da resposta. Retorna os valores novos (e já os aplica no
+    objeto sem marcá-lo como sujo).
+    """
+    t = TentativaDesafio.__table__
+    novas_respondidas = t.c.respondidas + int(delta_respondidas)
+    stmt = (
+        update(t)
+        .where(t.c.id == tentativa.id)
+        .values(
+            respondidas=novas_respondidas,
+            corretas=t.c.corretas + int(delta_corretas),
+            proxima_pergunta_id=_sq_proxima_pergunta(t),
+            finalizada=case((novas_respondidas >= t.c.total_perguntas, True), else_=t.c.finalizada),
+        )
+    )
+    colunas = [t.c[c] for c in _CAMPOS_PROGRESSO]
+
+    if db.session.get_bind().dialect.update_returning:
+        row = db.session.execute(stmt.returning(*colunas)).one()
+    else:
+        db.session.execute(stmt)
+        row = db.session.execute(select(*colunas).where(t.c.id == tentativa.id)).one()
+
+    # nova resposta/acerto muda as análises da turma (snapshot em dados_analise)
+    tocar_turmas(db.session, [tentativa.turma_id])
+    acumular(
+        tentativa.turma_id, tentativa.topico_id, tentativa.usuario_id, quando,
+        delta_total=int(delta_respondidas), delta_erros=int(delta_respondidas) - int(delta_corretas),
     )
-    db.session.add(t)
+    # domínio (BKT) só avança com resposta nova; troca de acerto fica para o reajuste em lote
+    dominio = None
+    if delta_respondidas == 1:
+        dominio = atualizar_dominio(tentativa.usuario_id, tentativa.topico_id, delta_corretas == 1)
+        registrar_dominio(tentativa.usuario_id, tentativa.turma_id, tentativa.topico_id, dominio)
+
+    valores = dict(zip(_CAMPOS_PROGRESSO, row))
+    valores["finalizada"] = bool(valores["finalizada"])
+    for campo, valor in valores.items():
+        set_committed_value(tentativa, campo, valor)
+    valores["dominio"] = dominio
+    return valores
+
+
+def recalcular_proxima_pergunta(tentativa: TentativaDesafio) -> Optional[int]:
+    """
+    Recalcula proxima_pergunta_id e total_perguntas (ex.: pergunta removida
+    pelo admin no meio da tentativa). Não faz commit.
+    """
+    t = TentativaDesafio.__table__
+    db.session.execute(
+        update(t)
+        .where(t.c.id == tentativa.id)
+        .values(proxima_pergunta_id=_sq_proxima_pergunta(t), total_perguntas=_sq_total_perguntas(t))
+    )
+    pid, total = db.session.execute(
+        select(t.c.proxima_pergunta_id, t.c.total_perguntas).where(t.c.id == tentativa.id)
+    ).one()
+    set_committed_value(tentativa, "proxima_pergunta_id", pid)
+    set_committed_value(tentativa, "total_perguntas", total)
+    return pid
+
+
+def recalcular_tentativas_abertas(*desafio_ids: int) -> int:
+    """
+    Pergunta criada, removida ou movida: refaz total_perguntas e
+    proxima_pergunta_id das tentativas abertas desses desafios num UPDATE.
+    Rodar depois do flush da mudança. Não faz commit; retorna quantas mudaram.
+    """
+    ids = sorted({int(d) for d in desafio_ids if d})
+    if not ids:
+        return 0
+    t = TentativaDesafio.__table__
+    return db.session.execute(
+        update(t)
+        .where(t.c.desafio_id.in_(ids), t.c.finalizada.is_(False))
+        .values(proxima_pergunta_id=_sq_proxima_pergunta(t), total_perguntas=_sq_total_perguntas(t))
+    ).rowcount
+
+
+def gravar_interacao(tentativa: TentativaDesafio, pergunta_id: int, alternativa: str, foi_correta: bool) -> bool:
+    """
+    Insere a resposta num único statement (INSERT ... ON CONFLICT DO NOTHING
+    sobre uq_interacao_tentativa_pergunta). Retorna False se a pergunta já
+    tinha resposta nesta tentativa. Não faz commit.
+    """
+    valores = {
+        "tentativa_id": tentativa.id,
+        "pergunta_id": int(pergunta_id),
+        "topico_id": tentativa.topico_id,
+        "alternativa": alternativa,
+        "foi_correta": bool(foi_correta),
+    }
+    stmt = insert_dialeto(Interacao.__table__)
+    if stmt is not None:
+        res = db.session.execute(
+            stmt.values(**valores).on_conflict_do_nothing(index_elements=["tentativa_id", "pergunta_id"])
+        )
+        return res.rowcount == 1
+
+    # outros bancos: savepoint + IntegrityError
+    try:
+        with db.session.begin_nested():
+            db.session.add(Interacao(**valores))
+    except IntegrityError:
+        return False
+    return True
+
+
+def abrir_tentativa(usuario_id: int, turma_id: int, desafio: Desafio) -> tuple[TentativaDesafio, bool]:
+    """
+    Cria a tentativa aberta do aluno na turma num único INSERT ... ON CONFLICT
+    DO NOTHING sobre uq_tentativa_aberta_usuario_turma (total_perguntas e a
+    primeira pergunta saem de subqueries no próprio INSERT). Se já existe uma
+    tentativa aberta (outra aba, retry), devolve ela.
+
+    Retorna (tentativa, criada). Faz commit.
+    """
+    valores = {
+        "usuario_id": usuario_id,
+        "turma_id": turma_id,
+        "desafio_id": desafio.id,
+        "topico_id": desafio.topico_id,
+        "finalizada": False,
+        "respondidas": 0,
+        "corretas": 0,
+        "total_perguntas": (
+            select(func.count(Pergunta.id)).where(Pergunta.desafio_id == desafio.id).scalar_subquery()
+        ),
+        "proxima_pergunta_id": (
+            select(Pergunta.id)
+            .where(Pergunta.desafio_id == desafio.id)
+            .order_by(Pergunta.ordem.asc(), Pergunta.id.asc())
+            .limit(1)
+            .scalar_subquery()
+        ),
+    }
+
+    t = None
+    stmt = insert_dialeto(TentativaDesafio)
+    if stmt is not None and db.session.get_bind().dialect.insert_returning:
+        stmt = (
+            stmt.values(**valores)
+            .on_conflict_do_nothing(
+                index_elements=["usuario_id", "turma_id"],
+                index_where=TENTATIVA_ABERTA,
+            )
+            .returning(TentativaDesafio)
+        )
+        t = db.session.execute(stmt).scalars().first()
+    else:
+        try:
+            with db.session.begin_nested():
+                t = TentativaDesafio(**valores)
+                db.session.add(t)
+        except IntegrityError:
+            t = None
     db.session.commit()
-    return t
 
+    if t is not None:
+        desafios_iniciados_total.inc()
+        desafio_entregue(usuario_id, turma_id, t)
+        return t, True
+
+    aberta = TentativaDesafio.query.filter_by(usuario_id=usuario_id, turma_id=turma_id, finalizada=False).one()
+    desafio_entregue(usuario_id, turma_id, aberta)
+    return aberta, False
+
+
+def iniciar_tentativa(usuario_id: int, turma_id: int, desafio: Desafio) -> TentativaDesafio:
+    """
+    Evita criar várias tentativas “abertas” (ex.: refresh): só existe uma
+    tentativa aberta por aluno/turma, e é ela que volta.
+    """
+    return abrir_tentativa(usuario_id, turma_id, desafio)[0]
 
-def registrar_interacao(tentativa_id: int, pergunta_id: int, alternativa: str) -> Interacao:
+
+def registrar_interacao(tentativa_id: int, pergunta_id: int, alternativa: str) -> dict[str, Any]:
+    """
+    Grava (ou sobrescreve) a resposta e faz commit. Retorna os valores gravados
+    (tentativa_id, pergunta_id, alternativa, foi_correta), sem reler a linha.
+    """
     tentativa = db.session.get(TentativaDesafio, int(tentativa_id))
     if not tentativa:
         raise ValueError("Tentativa não encontrada")
@@ -257,23 +478,30 @@ def registrar_interacao(tentativa_id: int, pergunta_id: int, alternativa: str) -
     correta = (p.correta or "").strip().lower()
     foi_correta = alternativa == correta
 
-    existente = Interacao.query.filter_by(tentativa_id=tentativa.id, pergunta_id=p.id).first()
-    if existente:
-        existente.alternativa = alternativa
-        existente.foi_correta = foi_correta
-        db.session.commit()
-        return existente
-
-    inter = Interacao(
-        tentativa_id=tentativa.id,
-        pergunta_id=p.id,
-        topico_id=tentativa.topico_id,
-        alternativa=alternativa,
-        foi_correta=foi_correta,
-    )
-    db.session.add(inter)
+    if gravar_interacao(tentativa, p.id, alternativa, foi_correta):
+        contabilizar_resposta(tentativa, 1, int(bool(foi_correta)))
+    else:
+        # já respondida: sobrescreve; só mexe em "corretas" se o acerto mudou
+        t = Interacao.__table__
+        chave = (t.c.tentativa_id == tentativa.id) & (t.c.pergunta_id == p.id)
+        virou = db.session.execute(
+            update(t)
+            .where(chave, t.c.foi_correta != bool(foi_correta))
+            .values(alternativa=alternativa, foi_correta=bool(foi_correta))
+        ).rowcount
+        if virou:
+            criado_em = db.session.execute(select(t.c.criado_em).where(chave)).scalar()
+            contabilizar_resposta(tentativa, 0, 1 if foi_correta else -1, quando=criado_em)
+        else:
+            db.session.execute(update(t).where(chave).values(alternativa=alternativa))
     db.session.commit()
-    return inter
+    respostas_total.inc(correta=str(bool(foi_correta)).lower())
+    return {
+        "tentativa_id": tentativa.id,
+        "pergunta_id": p.id,
+        "alternativa": alternativa,
+        "foi_correta": bool(foi_correta),
+    }
 
 
 def registrar_resposta(
@@ -298,7 +526,7 @@ def registrar_resposta(
     )
 
     return {
-        "foi_correta": bool(inter.foi_correta),
+        "foi_correta": inter["foi_correta"],
         "resposta_correta": (p.correta or "a").strip().lower(),
     }
 
@@ -308,15 +536,24 @@ def finalizar_tentativa(tentativa_id: int, limiar_domino: float = 0.8) -> Tentat
     if not tentativa:
         raise ValueError("Tentativa não encontrada")
 
-    total = Interacao.query.filter_by(tentativa_id=tentativa.id).count()
-    corretas = Interacao.query.filter_by(tentativa_id=tentativa.id, foi_correta=True).count()
+    # contadores mantidos por contabilizar_resposta (sem COUNT em interacoes)
+    total = int(tentativa.respondidas or 0)
+    corretas = int(tentativa.corretas or 0)
 
     taxa = (corretas / total) if total else 0.0
-    tentativa.taxa_acerto_final = float(taxa)
-    tentativa.dominou = bool(taxa >= limiar_domino)
-    tentativa.finalizada = True
-
+    dominou = bool(taxa >= limiar_domino)
+
+    # a última resposta já marca finalizada (contabilizar_resposta); a nota sai
+    # uma vez só: /finalizar repetido (retry, outra aba) não conta de novo
+    t = TentativaDesafio.__table__
+    primeira = db.session.execute(
+        update(t)
+        .where(t.c.id == tentativa.id, t.c.dominou.is_(None))
+        .values(taxa_acerto_final=float(taxa), dominou=dominou, finalizada=True)
+    ).rowcount == 1
     db.session.commit()
+    if primeira:
+        desafios_finalizados_total.inc(dominou=str(dominou).lower())
     return tentativa
 
 
@@ -363,15 +600,12 @@ def kmeans_grupos_por_turma(
     from sklearn.cluster import KMeans
     import numpy as np
 
+    snap = snapshot_turma(turma_id)
+
     # tópicos que aparecem nessa turma via interações (mais consistente)
-    topicos = (
-        db.session.query(Topico)
-        .join(Interacao, Interacao.topico_id == Topico.id)
-        .join(TentativaDesafio, TentativaDesafio.id == Interacao.tentativa_id)
-        .filter(TentativaDesafio.turma_id == turma_id)
-        .order_by(Topico.nome.asc())
-        .all()
-    )
+    topico_ids = snap.topico_ids.tolist()
+    por_id = {t.id: t for t in Topico.query.filter(Topico.id.in_(topico_ids)).all()} if topico_ids else {}
+    topicos = [por_id[tid] for tid in topico_ids if tid in por_id]
     if not topicos:
         return {
             "grupos_por_aluno": {},
@@ -381,47 +615,8 @@ def kmeans_grupos_por_turma(
             "alunos_ids_usados": [],
         }
 
-    topico_ids = [t.id for t in topicos]
-    idx_topico = {tid: i for i, tid in enumerate(topico_ids)}
-
-    alunos_ids = [
-        r[0]
-        for r in (
-            db.session.query(Matricula.usuario_id)
-            .filter(Matricula.turma_id == turma_id, Matricula.papel == "aluno")
-            .distinct()
-            .all()
-        )
-    ]
-    if not alunos_ids:
-        return {
-            "grupos_por_aluno": {},
-            "medias_por_grupo_topico": {},
-            "contagem_por_grupo": {},
-            "topicos": topicos,
-            "alunos_ids_usados": [],
-        }
-
-    erros_expr = func.sum(case((Interacao.foi_correta.is_(False), 1), else_=0))
-
-    rows = (
-        db.session.query(
-            TentativaDesafio.usuario_id.label("usuario_id"),
-            Interacao.topico_id.label("topico_id"),
-            func.count(Interacao.id).label("total"),
-            erros_expr.label("erros"),
-        )
-        .join(TentativaDesafio, TentativaDesafio.id == Interacao.tentativa_id)
-        .filter(TentativaDesafio.turma_id == turma_id)
-        .group_by(TentativaDesafio.usuario_id, Interacao.topico_id)
-        .all()
-    )
-
-    tot_por_aluno = {}
-    for r in rows:
-        tot_por_aluno[r.usuario_id] = tot_por_aluno.get(r.usuario_id, 0) + int(r.total or 0)
-
-    alunos_usados = [uid for uid in alunos_ids if tot_por_aluno.get(uid, 0) >= min_interacoes_por_aluno]
+    usados, X = snap.matriz_taxas(min_interacoes=min_interacoes_por_aluno)
+    alunos_usados = snap.aluno_ids[usados].tolist()
     if len(alunos_usados) < 2:
         return {
             "grupos_por_aluno": {uid: 0 for uid in alunos_usados},
@@ -430,27 +625,12 @@ def kmeans_grupos_por_turma(
             "topicos": topicos,
             "alunos_ids_usados": alunos_usados,
         }
-
-    X = np.full((len(alunos_usados), len(topico_ids)), np.nan, dtype=float)
     pos_aluno = {uid: i for i, uid in enumerate(alunos_usados)}
 
-    for r in rows:
-        uid = int(r.usuario_id)
-        tid = int(r.topico_id)
-        if uid not in pos_aluno or tid not in idx_topico:
-            continue
-        total = int(r.total or 0)
-        erros = int(r.erros or 0)
-        X[pos_aluno[uid], idx_topico[tid]] = (erros / total) if total else np.nan
-
-    col_means = np.nanmean(X, axis=0)
-    col_means = np.where(np.isnan(col_means), 0.0, col_means)
-    inds = np.where(np.isnan(X))
-    X[inds] = np.take(col_means, inds[1])
-
     k_eff = max(2, min(int(k), len(alunos_usados)))
     km = KMeans(n_clusters=k_eff, n_init="auto", random_state=42)
-    labels = km.fit_predict(X)
+    with kmeans_segundos.cronometrar(origem="servicos"):
+        labels = km.fit_predict(X)
 
     grupos_por_aluno = {uid: int(labels[pos_aluno[uid]]) for uid in alunos_usados}
 
@@ -20,6 +20,7 @@
     desafioTexto: document.getElementById("desafioTexto"),
     desafioImagemWrap: document.getElementById("desafioImagemWrap"),
     desafioImagem: document.getElementById("desafioImagem"),
+    desafioImagemWebp: document.getElementById("desafioImagemWebp"),
 
     quizBox: document.getElementById("quizBox"),
     quizProgress: document.getElementById("quizProgress"),
@@ -52,24 +53,107 @@
     return data;
   }
 
+  // conteúdo do desafio (enunciado + perguntas) por id: GET com ETag, o navegador
+  // revalida com If-None-Match (304); entre perguntas do mesmo desafio nem revalida
+  const desafios = new Map();
+
+  async function carregarDesafio(ref) {
+    const guardado = desafios.get(ref.id);
+    if (guardado && guardado.versao === ref.versao) return guardado.dados;
+    const res = await fetch(`/api/tutor/desafio/${ref.id}`, { credentials: "same-origin" });
+    const data = await res.json().catch(() => ({}));
+    if (!res.ok) throw new Error(data?.error || `Erro HTTP ${res.status}`);
+    // no-store: fórmula/imagem ainda processando, a próxima pergunta busca de novo
+    if (!/no-store/.test(res.headers.get("Cache-Control") || "")) {
+      desafios.set(ref.id, { versao: ref.versao, dados: data });
+    }
+    return data;
+  }
+
+  async function completarPayload(payload) {
+    if (payload.done || payload.fim_do_desafio || !payload.desafio) return payload;
+    let conteudo = await carregarDesafio(payload.desafio);
+    let pergunta = (conteudo.perguntas || []).find((p) => p.id === payload.pergunta_id);
+    if (!pergunta) {
+      // pergunta criada depois do que foi guardado: busca de novo
+      desafios.delete(payload.desafio.id);
+      conteudo = await carregarDesafio(payload.desafio);
+      pergunta = (conteudo.perguntas || []).find((p) => p.id === payload.pergunta_id);
+    }
+    return { ...payload, desafio: conteudo.desafio, pergunta };
+  }
+
   function setText(el, str) {
     if (!el) return;
     el.textContent = (str ?? "").toString();
   }
 
-  function setImagem(url) {
+  // texto com fórmulas: trechos já renderizados no servidor viram <img> (SVG);
+  // o que sobrar com $...$ fica para o MathJax
+  function setRico(el, str, formulas) {
+    if (!el) return;
+    const texto = (str ?? "").toString();
+    const chaves = Object.keys(formulas || {});
+    el.textContent = "";
+    let i = 0;
+    while (i < texto.length) {
+      let pos = -1, chave = null;
+      for (const c of chaves) {
+        const j = texto.indexOf(c, i);
+        if (j !== -1 && (pos === -1 || j < pos)) { pos = j; chave = c; }
+      }
+      if (pos === -1) break;
+      if (pos > i) el.appendChild(document.createTextNode(texto.slice(i, pos)));
+      const img = document.createElement("img");
+      img.className = chave.startsWith("$$") ? "formula formula-bloco" : "formula";
+      img.src = formulas[chave];
+      img.alt = chave;
+      img.decoding = "async";
+      el.appendChild(img);
+      i = pos + chave.length;
+    }
+    if (i < texto.length) el.appendChild(document.createTextNode(texto.slice(i)));
+  }
+
+  // variantes por largura (WebP + JPEG/PNG): o navegador escolhe pela tela
+  function setImagem(url, variantes) {
+    const img = els.desafioImagem;
+    const webp = els.desafioImagemWebp;
+    if (webp) webp.removeAttribute("srcset");
+    img?.removeAttribute("srcset");
+    img?.removeAttribute("width");
+    img?.removeAttribute("height");
     if (!url) {
       hide(els.desafioImagemWrap);
-      if (els.desafioImagem) els.desafioImagem.removeAttribute("src");
+      if (img) img.removeAttribute("src");
       return;
     }
-    els.desafioImagem.src = url;
+    if (variantes) {
+      if (webp) webp.srcset = variantes.srcset_webp;
+      img.srcset = variantes.srcset;
+      img.width = variantes.largura;  // reserva o espaço antes de baixar
+      img.height = variantes.altura;
+    }
+    img.src = url;
     show(els.desafioImagemWrap);
   }
 
+  // MathJax (~1 MB) só é baixado se sobrou LaTeX que o servidor não renderizou
+  const MATHJAX_URL = "https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-svg.js";
+  let mathJaxCarregando = false;
+
   function typeset() {
+    const pendente = [els.desafioTexto, els.perguntaEnunciado, els.alternativas]
+      .some((el) => el && /\$|\\\(/.test(el.textContent || ""));
+    if (!pendente) return;
     if (window.MathJax?.typesetPromise) {
       window.MathJax.typesetPromise();
+    } else if (!mathJaxCarregando) {
+      mathJaxCarregando = true;  // ao carregar, o MathJax tipografa a página sozinho
+      const s = document.createElement("script");
+      s.src = MATHJAX_URL;
+      s.async = true;
+      document.head.appendChild(s);
     }
   }
 
@@ -128,18 +212,18 @@
     );
 
     setText(els.desafioTitulo, state.desafio.titulo || "");
-    setImagem(state.desafio.enunciado_imagem_url || null);
+    setImagem(state.desafio.enunciado_imagem_url || null, state.desafio.enunciado_imagem);
 
     const texto = (state.desafio.enunciado_texto || "").trim();
     const latex = (state.desafio.enunciado_latex || "").trim();
-    setText(els.desafioTexto, texto || latex || "");
+    setRico(els.desafioTexto, texto || latex || "", state.desafio.formulas);
 
     // quiz
     show(els.quizBox);
     hide(els.fimBox);
 
     setText(els.quizProgress, `Pergunta ${state.indice} de ${state.total}`);
-    setText(els.perguntaEnunciado, state.pergunta.enunciado || "");
+    setRico(els.perguntaEnunciado, state.pergunta.enunciado || "", state.pergunta.formulas);
 
     // alternativas (dict a/b/c/d)
     const alts = state.pergunta.alternativas || {};
@@ -152,12 +236,12 @@
       `;
     }).join("");
 
-    // preencher texto das alternativas via textContent (seguro + MathJax pega delimitadores)
+    // preencher texto das alternativas via nós de texto (seguro + MathJax pega delimitadores)
     const btns = els.alternativas.querySelectorAll("button[data-alt]");
     [...btns].forEach((btn) => {
       const k = (btn.dataset.alt || "").toLowerCase();
       const span = btn.querySelector(".alt-text");
-      if (span) span.textContent = (alts[k] ?? "").toString();
+      if (span) setRico(span, alts[k], state.pergunta.formulas);
     });
 
     hide(els.feedback);
@@ -172,9 +256,9 @@
       state.busy = true;
       setStatus("Carregando...");
 
-      const data = await postJson("/api/tutor/proximo", {
+      const data = await completarPayload(await postJson("/api/tutor/proximo", {
         turma_id: state.turmaId
-      });
+      }));
 
       setStatus("");
       render(data);
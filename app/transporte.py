@@ -0,0 +1,138 @@
+# app/transporte.py
+"""
+Serialização JSON e compressão das respostas.
+
+JSON: com JSON_MOTOR = "orjson" (padrão) e o pacote instalado, jsonify e
+app.json usam orjson (C, ~5-10x mais rápido que o json da stdlib, saída
+UTF-8 sem \\uXXXX, arrays/escalares NumPy direto). Mantém o comportamento do
+provedor padrão do Flask: chaves ordenadas (JSON_SORT_KEYS), datas no formato
+HTTP e o mesmo `default` para Decimal/UUID/dataclass. Sem orjson (pip install
+orjson), ou com algum tipo que ele não serializa, cai no json da stdlib.
+
+Compressão: respostas de texto (JSON, HTML, CSS, JS, SVG) a partir de
+COMPRESSAO_MINIMO bytes são comprimidas conforme o Accept-Encoding do
+cliente: brotli se o pacote estiver instalado (pip install brotli) e o
+cliente aceitar, senão gzip. Arquivos estáticos em streaming
+(direct_passthrough), respostas já codificadas e 304/erros passam direto.
+O enunciado em LaTeX repete muito comando (\\frac, \\left, ...) e comprime bem.
+
+    python -m benchmarks.bench_transporte
+"""
+from __future__ import annotations
+
+import gzip
+from typing import Any, Optional
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # opcional
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # opcional
+    brotli = None
+
+TIPOS_COMPRIMIVEIS = (
+    "application/json", "text/html", "text/css", "text/plain", "text/csv",
+    "application/javascript", "text/javascript", "image/svg+xml",
+)
+
+
+# =========================
+# JSON
+# =========================
+
+class ProvedorOrjson(DefaultJSONProvider):
+    """DefaultJSONProvider com orjson no caminho comum (sem kwargs extras)."""
+
+    def _opcoes(self) -> int:
+        # datetime vai para `default` (formato HTTP, como no Flask); chaves int viram str
+        op = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            op |= orjson.OPT_SORT_KEYS
+        return op
+
+    def _bytes(self, obj: Any) -> Optional[bytes]:
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._opcoes())
+        except TypeError:
+            return None  # tipo não suportado / chaves mistas: json da stdlib decide
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if not kwargs:
+            dados = self._bytes(obj)
+            if dados is not None:
+                return dados.decode()
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indentado = self.compact is False or (self.compact is None and self._app.debug)
+        dados = None if indentado else self._bytes(obj)  # indentado: json do Flask
+        if dados is None:
+            return super().response(obj)
+        return self._app.response_class(dados, mimetype=self.mimetype)
+
+
+# =========================
+# Compressão
+# =========================
+
+def _codificacao(aceitas) -> Optional[str]:
+    """'br', 'gzip' ou None, conforme o Accept-Encoding (q=0 recusa)."""
+    if brotli is not None and aceitas.quality("br") > 0:
+        return "br"
+    if aceitas.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def comprimir(dados: bytes, codificacao: str, config) -> bytes:
+    if codificacao == "br":
+        return brotli.compress(dados, quality=int(config.get("COMPRESSAO_BROTLI_QUALIDADE", 5)))
+    return gzip.compress(dados, compresslevel=int(config.get("COMPRESSAO_GZIP_NIVEL", 4)), mtime=0)
+
+
+def configurar_transporte(app) -> None:
+    if orjson is not None and str(app.config.get("JSON_MOTOR", "orjson")).lower() == "orjson":
+        app.json_provider_class = ProvedorOrjson
+        app.json = ProvedorOrjson(app)
+
+    if not app.config.get("COMPRESSAO_HABILITADA", True):
+        return
+
+    # registrado antes dos outros after_request: roda por último (ordem reversa)
+    @app.after_request
+    def _comprimir(resp):
+        if (
+            resp.status_code != 200
+            or resp.direct_passthrough
+            or resp.is_streamed
+            or "Content-Encoding" in resp.headers
+            or resp.mimetype not in TIPOS_COMPRIMIVEIS
+        ):
+            return resp
+        resp.vary.add("Accept-Encoding")
+        codificacao = _codificacao(request.accept_encodings)
+        if codificacao is None:
+            return resp
+        dados = resp.get_data()
+        if len(dados) < int(app.config.get("COMPRESSAO_MINIMO", 1024)):
+            return resp
+
+        resp.set_data(comprimir(dados, codificacao, app.config))
+        resp.headers["Content-Encoding"] = codificacao
+        # o corpo mudou: ETag forte deixaria de valer byte a byte
+        tag, fraca = resp.get_etag()
+        if tag and not fraca:
+            resp.set_etag(tag, weak=True)
+        return resp
@@ -0,0 +1,136 @@
+# benchmarks/bench_analitico.py
+"""
+Benchmark das agregações analíticas (app/motor_analitico.py): backend
+"sqlite" (GROUP BY via SQLAlchemy) contra "duckdb" (SQLite anexado no DuckDB).
+
+Monta (ou reaproveita) um banco SQLite sintético via gerar_dados.gerar e
+mede, por backend:
+
+  - agregação de todas as turmas (turma_id=None, a do relatório CSV geral)
+  - agregação de uma turma (a do AnaliseView)
+
+e confere que os dois backends devolvem exatamente as mesmas linhas.
+Sem o pacote duckdb, mede só o sqlite e avisa.
+
+Interações geradas ~ turmas x alunos x historico x perguntas. Para dezenas de
+milhões, gere uma vez e reaproveite:
+    python -m benchmarks.bench_analitico --turmas 50 --alunos 2000 --historico 25 \
+        --perguntas 8 --db /tmp/analitico.db
+    python -m benchmarks.bench_analitico --db /tmp/analitico.db --reusar
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+MOTORES = ("sqlite", "duckdb")
+
+
+# =========================
+# Banco sintético
+# =========================
+
+def montar_banco(app, n_turmas: int, n_alunos: int, n_historico: int, n_perguntas: int, seed: int = 42) -> None:
+    from gerar_dados import gerar
+    from app.modelos import db
+
+    with app.app_context():
+        gerar(
+            db,
+            turmas=n_turmas,
+            alunos_por_turma=n_alunos,
+            topicos_por_disciplina=5,
+            desafios_por_topico=2,
+            perguntas_por_desafio=n_perguntas,
+            tentativas_por_aluno=n_historico,
+            seed=seed,
+        )
+
+
+# =========================
+# Execução
+# =========================
+
+def medir(app, motor: str, turma_id, repeticoes: int):
+    from app.motor_analitico import agregados_aluno_topico
+
+    app.config["ANALITICO_MOTOR"] = motor
+    tempos: List[float] = []
+    with app.app_context():
+        agregados_aluno_topico(turma_id)  # aquece conexão/cache de páginas
+        for _ in range(repeticoes):
+            t = time.perf_counter()
+            linhas = agregados_aluno_topico(turma_id)
+            tempos.append(time.perf_counter() - t)
+    return min(tempos), linhas
+
+
+def ordenadas(linhas):
+    import numpy as np
+
+    return linhas[np.lexsort((linhas[:, 1], linhas[:, 0]))]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark das agregações analíticas (sqlite x duckdb).")
+    ap.add_argument("--turmas", type=int, default=10)
+    ap.add_argument("--alunos", type=int, default=1000, help="alunos por turma")
+    ap.add_argument("--historico", type=int, default=10, help="tentativas finalizadas por aluno")
+    ap.add_argument("--perguntas", type=int, default=4, help="perguntas por desafio")
+    ap.add_argument("--repeticoes", type=int, default=3)
+    ap.add_argument("--db", default=None, help="arquivo SQLite (padrão: temporário)")
+    ap.add_argument("--reusar", action="store_true", help="não regera o banco se --db já existir")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args(argv)
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="bench_analitico_"), "bench.db")
+    reusar = args.reusar and os.path.exists(db_path)
+
+    # precisa vir antes de importar config/app
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(db_path)}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from app import create_app
+    from app.modelos import db, Interacao, Turma
+    from app.motor_analitico import duckdb
+
+    app = create_app()
+    print(f"Banco: {db_path}")
+    if not reusar:
+        t = time.perf_counter()
+        montar_banco(app, args.turmas, args.alunos, args.historico, args.perguntas, seed=args.seed)
+        print(f"Banco sintético pronto em {time.perf_counter() - t:.2f}s")
+
+    with app.app_context():
+        n_inter = db.session.query(db.func.count(Interacao.id)).scalar()
+        turma = db.session.query(db.func.min(Turma.id)).scalar()
+    print(f"{n_inter} interações")
+
+    motores = [m for m in MOTORES if m != "duckdb" or duckdb is not None]
+    if len(motores) < len(MOTORES):
+        print("duckdb não instalado (pip install duckdb): medindo só sqlite")
+
+    print()
+    print(f"{'motor':<10}{'escopo':<14}{'linhas':>10}{'tempo (s)':>12}{'speedup':>10}")
+    for escopo, turma_id in (("todas", None), (f"turma {turma}", turma)):
+        base: Dict[str, float] = {}
+        ref = None
+        for motor in motores:
+            seg, linhas = medir(app, motor, turma_id, args.repeticoes)
+            base.setdefault("sqlite", seg)
+            linhas = ordenadas(linhas)
+            if ref is None:
+                ref = linhas
+            elif not (linhas.shape == ref.shape and (linhas == ref).all()):
+                print(f"\n{motor}: resultado diferente do sqlite em '{escopo}'!")
+                return 1
+            print(f"{motor:<10}{escopo:<14}{len(linhas):>10}{seg:>12.3f}{base['sqlite'] / seg:>9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
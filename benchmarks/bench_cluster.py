@@ -0,0 +1,159 @@
+# benchmarks/bench_cluster.py
+"""
+Benchmark do relatório de grupos (app/analise_cluster.rodar_analise):
+modo "lote" (matriz inteira + KMeans) contra modo "minibatch" (vetores lidos
+do banco em lotes + MiniBatchKMeans.partial_fit).
+
+Monta um banco SQLite sintético com gerar_dados.gerar (padrão: 20 turmas x
+5000 alunos = 100k alunos), roda os dois modos sobre todos os alunos
+(turma_id=None) e relata:
+
+  - tempo de parede de cada modo
+  - pico de memória Python (tracemalloc, numa segunda execução; numpy entra)
+  - qualidade: inércia (soma dos quadrados intra-grupo, dados padronizados)
+    de cada modo e concordância dos grupos (adjusted Rand index entre os CSVs)
+
+Uso:
+    python -m benchmarks.bench_cluster --turmas 20 --alunos 5000 --historico 2
+    python -m benchmarks.bench_cluster --db /tmp/cluster.db --reusar
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict
+
+MODOS = ("lote", "minibatch")
+
+
+# =========================
+# Banco sintético
+# =========================
+
+def montar_banco(app, n_turmas: int, n_alunos: int, n_historico: int, seed: int = 42) -> int:
+    """Popula o banco via gerar_dados.gerar; retorna o nº de alunos."""
+    from gerar_dados import gerar
+    from app.modelos import db
+
+    with app.app_context():
+        resumo = gerar(
+            db,
+            turmas=n_turmas,
+            alunos_por_turma=n_alunos,
+            topicos_por_disciplina=5,
+            desafios_por_topico=2,
+            perguntas_por_desafio=4,
+            tentativas_por_aluno=n_historico,
+            seed=seed,
+        )
+    return sum(len(v) for v in resumo["turmas"].values())
+
+
+# =========================
+# Execução
+# =========================
+
+def rodar_modo(app, instance_path: str, modo: str, lote: int, memoria: bool) -> Dict[str, float]:
+    from app.analise_cluster import rodar_analise
+    from app.dados_analise import limpar_cache
+
+    def uma_vez():
+        with app.app_context():
+            limpar_cache()  # o modo lote não pode aproveitar snapshot de uma execução anterior
+            gc.collect()
+            t = time.perf_counter()
+            rodar_analise(instance_path, None, modo=modo, lote_alunos=lote)
+            return time.perf_counter() - t
+
+    out = {"segundos": uma_vez()}
+    if memoria:
+        tracemalloc.start()
+        uma_vez()
+        _atual, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        out["pico_mb"] = pico / 1e6
+    return out
+
+
+def ler_grupos(reports_dir: str):
+    import pandas as pd
+
+    df = pd.read_csv(os.path.join(reports_dir, "relatorio_alunos.csv"))
+    return df.sort_values("usuario_id").reset_index(drop=True)
+
+
+def inercia(df) -> float:
+    """Soma dos quadrados dentro dos grupos, no espaço padronizado (como o KMeans vê)."""
+    import numpy as np
+
+    X = df.drop(columns=["usuario_id", "aluno", "cluster"]).to_numpy(dtype=float)
+    X = (X - X.mean(axis=0)) / np.where(X.std(axis=0) > 0, X.std(axis=0), 1.0)
+    total = 0.0
+    for _, idx in df.groupby("cluster").indices.items():
+        total += float(((X[idx] - X[idx].mean(axis=0)) ** 2).sum())
+    return total
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark do relatório de grupos (lote x minibatch).")
+    ap.add_argument("--turmas", type=int, default=20)
+    ap.add_argument("--alunos", type=int, default=5000, help="alunos por turma")
+    ap.add_argument("--historico", type=int, default=2, help="tentativas finalizadas por aluno")
+    ap.add_argument("--lote", type=int, default=5000, help="alunos por lote no modo minibatch")
+    ap.add_argument("--db", default=None, help="arquivo SQLite (padrão: temporário)")
+    ap.add_argument("--reusar", action="store_true", help="não regera o banco se --db já existir")
+    ap.add_argument("--sem-memoria", action="store_true", help="não mede pico com tracemalloc")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_cluster_")
+    db_path = args.db or os.path.join(tmpdir, "bench.db")
+    reusar = args.reusar and os.path.exists(db_path)
+
+    # precisa vir antes de importar config/app
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(db_path)}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from app import create_app
+
+    app = create_app()
+    print(f"Banco: {db_path}")
+    if not reusar:
+        t = time.perf_counter()
+        n = montar_banco(app, args.turmas, args.alunos, args.historico, seed=args.seed)
+        print(f"Banco sintético pronto em {time.perf_counter() - t:.2f}s ({n} alunos)")
+
+    # relatórios vão para <tmpdir>/reports (nunca para o reports/ do projeto)
+    instance_path = os.path.join(tmpdir, "instance")
+    reports_dir = os.path.join(tmpdir, "reports")
+
+    resultados, grupos = {}, {}
+    for modo in MODOS:
+        resultados[modo] = rodar_modo(app, instance_path, modo, args.lote, not args.sem_memoria)
+        grupos[modo] = ler_grupos(reports_dir)
+
+    print()
+    print(f"{'modo':<12}{'alunos':>10}{'tempo (s)':>12}{'pico (MB)':>12}{'inércia':>14}")
+    for modo in MODOS:
+        r = resultados[modo]
+        pico = f"{r['pico_mb']:.1f}" if "pico_mb" in r else "-"
+        print(f"{modo:<12}{len(grupos[modo]):>10}{r['segundos']:>12.2f}{pico:>12}{inercia(grupos[modo]):>14.1f}")
+
+    from sklearn.metrics import adjusted_rand_score
+
+    a, b = grupos["lote"], grupos["minibatch"]
+    if a["usuario_id"].equals(b["usuario_id"]):
+        print(f"\nConcordância dos grupos (ARI): {adjusted_rand_score(a['cluster'], b['cluster']):.3f}")
+    else:
+        print("\nOs dois modos não cobriram os mesmos alunos!")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,97 @@
+# benchmarks/bench_irt.py
+"""
+Benchmark da calibração TRI (app/irt.py) em dados simulados, sem banco.
+
+Sorteia habilidades, dificuldades e discriminações, gera as respostas pelo
+próprio modelo (cada aluno responde um subconjunto aleatório das perguntas)
+e mede:
+
+  - ajuste conjunto a frio (1PL ou 2PL), com 1 e com N threads
+  - ajuste a quente após +5% de respostas (warm start a partir do anterior)
+  - reestimação só das habilidades (perguntas fixas)
+
+e a recuperação dos parâmetros (correlação com os verdadeiros).
+
+    python -m benchmarks.bench_irt --respostas 1000000 --alunos 100000 --perguntas 2000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+
+def simular(n_respostas: int, n_alunos: int, n_perguntas: int, dois_pl: bool, rng):
+    theta = rng.normal(0, 1, n_alunos)
+    b = rng.normal(0, 1, n_perguntas)
+    a = np.exp(rng.normal(0, 0.3, n_perguntas)) if dois_pl else np.ones(n_perguntas)
+    u = rng.integers(0, n_alunos, n_respostas)
+    i = rng.integers(0, n_perguntas, n_respostas)
+    p = 1 / (1 + np.exp(-a[i] * (theta[u] - b[i])))
+    y = (rng.random(n_respostas) < p).astype(np.int64)
+    return (theta, b, a), (u, i, y)
+
+
+def _corr(x, y) -> float:
+    return float(np.corrcoef(x, y)[0, 1])
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark da calibração TRI.")
+    ap.add_argument("--respostas", type=int, default=1_000_000)
+    ap.add_argument("--alunos", type=int, default=100_000)
+    ap.add_argument("--perguntas", type=int, default=2_000)
+    ap.add_argument("--modelo", choices=("1pl", "2pl"), default="2pl")
+    ap.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app.irt import Respostas, ajustar, ajustar_habilidades
+
+    rng = np.random.default_rng(args.seed)
+    (theta, b, a), (u, i, y) = simular(args.respostas, args.alunos, args.perguntas, args.modelo == "2pl", rng)
+    corte = int(len(y) / 1.05)
+    resp = Respostas(u[:corte], i[:corte], y[:corte])
+    print(f"{len(resp)} respostas, {len(resp.usuario_ids)} alunos, {len(resp.pergunta_ids)} perguntas ({args.modelo})")
+    print()
+    print(f"{'etapa':<34}{'tempo (s)':>10}{'iter':>7}{'corr theta':>12}{'corr b':>9}{'corr a':>9}")
+
+    def linha(nome, seg, fit, r):
+        ca = _corr(fit["a"], a[r.pergunta_ids]) if args.modelo == "2pl" else float("nan")
+        print(f"{nome:<34}{seg:>10.2f}{fit.get('iteracoes', 0):>7}{_corr(fit['theta'], theta[r.usuario_ids]):>12.3f}"
+              f"{_corr(fit['b'], b[r.pergunta_ids]):>9.3f}{ca:>9.3f}")
+
+    fit = None
+    for threads in sorted({1, args.threads}):
+        t = time.perf_counter()
+        fit = ajustar(resp, args.modelo, threads=threads)
+        linha(f"a frio, {threads} thread(s)", time.perf_counter() - t, fit, resp)
+
+    # +5% de respostas: warm start com os parâmetros do ajuste anterior
+    novo = Respostas(u, i, y)
+    theta0 = np.zeros(len(novo.usuario_ids))
+    pos = np.searchsorted(novo.usuario_ids, resp.usuario_ids)
+    theta0[pos] = fit["theta"]
+    b0 = np.zeros(len(novo.pergunta_ids))
+    alfa0 = np.zeros(len(novo.pergunta_ids))
+    pos_i = np.searchsorted(novo.pergunta_ids, resp.pergunta_ids)
+    b0[pos_i], alfa0[pos_i] = fit["b"], np.log(fit["a"])
+    t = time.perf_counter()
+    quente = ajustar(novo, args.modelo, theta0=theta0, b0=b0, alfa0=alfa0, threads=args.threads)
+    linha("a quente, +5% respostas", time.perf_counter() - t, quente, novo)
+
+    # só habilidades (perguntas fixas)
+    b_fix = np.zeros(len(novo.pergunta_ids)); a_fix = np.ones(len(novo.pergunta_ids))
+    b_fix[pos_i], a_fix[pos_i] = fit["b"], fit["a"]
+    t = time.perf_counter()
+    th = ajustar_habilidades(novo, b_fix, a_fix, theta0=theta0)
+    linha("só habilidades, +5% respostas", time.perf_counter() - t, {"theta": th, "b": b_fix, "a": a_fix}, novo)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,160 @@
+# benchmarks/bench_transporte.py
+"""
+Benchmark da serialização JSON e da compressão das respostas (app/transporte.py).
+
+Monta payloads no formato do tutor e da análise (sem banco):
+
+  - "pergunta":  /api/tutor/proximo com enunciado e alternativas em LaTeX
+  - "desafio":   /api/tutor/desafio/<id> com N perguntas em LaTeX
+  - "grupos":    /admin/analise/painel/grupos de uma turma com M alunos
+
+e mede, por payload:
+
+  - CPU por serialização: json da stdlib (provedor padrão do Flask) × orjson
+  - bytes no fio e CPU da compressão: sem, gzip 1, gzip 6, brotli (se instalado)
+  - CPU por resposta completa num app Flask mínimo (jsonify + after_request),
+    pelo test client, com e sem Accept-Encoding
+
+    python -m benchmarks.bench_transporte --repeticoes 2000 --perguntas 8 --alunos 300
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+
+
+LATEX = [
+    r"\frac{d}{dx}\left( x^{2} \sin x \right) = 2x \sin x + x^{2} \cos x",
+    r"\int_{0}^{\pi} \sin^{2}(x)\, dx = \frac{\pi}{2}",
+    r"\lim_{n \to \infty} \left( 1 + \frac{1}{n} \right)^{n} = e",
+    r"\sum_{k=1}^{n} k^{2} = \frac{n(n+1)(2n+1)}{6}",
+    r"\begin{pmatrix} a & b \\ c & d \end{pmatrix}^{-1} = \frac{1}{ad - bc} \begin{pmatrix} d & -b \\ -c & a \end{pmatrix}",
+    r"\sqrt{\frac{x^{2} + 1}{x - 1}} \geq \left| \frac{x}{2} \right|",
+]
+
+
+def _latex(rng: random.Random, n: int) -> str:
+    return " ".join(f"$${rng.choice(LATEX)}$$" for _ in range(n))
+
+
+def _pergunta(rng: random.Random, pid: int) -> dict:
+    return {
+        "id": pid,
+        "enunciado": f"Calcule o valor de ${rng.choice(LATEX)}$ considerando o domínio dado.",
+        "alternativas": {a: f"${rng.choice(LATEX)}$" for a in "abcd"},
+        "ordem": pid,
+    }
+
+
+def payloads(n_perguntas: int, n_alunos: int, seed: int = 42) -> dict:
+    rng = random.Random(seed)
+    desafio = {
+        "id": 17, "titulo": "Derivadas e integrais", "disciplina": "Cálculo I", "topico": "Regra do produto",
+        "enunciado_texto": "Leia com atenção as expressões abaixo.", "enunciado_latex": _latex(rng, 6),
+        "enunciado_imagem_url": None, "versao": 3,
+    }
+    topicos = [f"Tópico {i}" for i in range(12)]
+    return {
+        "pergunta": {
+            "fim_do_desafio": False, "tentativa_id": 4211, "desafio": desafio,
+            "pergunta": _pergunta(rng, 1), "total_perguntas": n_perguntas, "indice_pergunta": 1,
+        },
+        "desafio": {"desafio": desafio, "perguntas": [_pergunta(rng, i) for i in range(1, n_perguntas + 1)]},
+        "grupos": {
+            "k": 3, "k_auto": False, "varredura": None,
+            "chart_data": {"labels": topicos, "datasets": [
+                {"label": f"Grupo {g + 1} (n={n_alunos // 3})", "data": [round(rng.random() * 100, 2) for _ in topicos]}
+                for g in range(3)
+            ]},
+            "alunos": [
+                {"id": i, "nome": f"Aluno {i:05d}", "email": f"aluno{i}@exemplo.edu.br",
+                 "total": rng.randint(0, 400), "taxa_erro": rng.random(), "grupo": rng.randint(1, 3)}
+                for i in range(n_alunos)
+            ],
+        },
+    }
+
+
+def _cpu_us(fn, repeticoes: int) -> float:
+    fn()
+    t = time.process_time()
+    for _ in range(repeticoes):
+        fn()
+    return (time.process_time() - t) / repeticoes * 1e6
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark de JSON e compressão das respostas.")
+    ap.add_argument("--repeticoes", type=int, default=2000)
+    ap.add_argument("--perguntas", type=int, default=8, help="perguntas no payload do desafio")
+    ap.add_argument("--alunos", type=int, default=300, help="alunos no payload de grupos")
+    args = ap.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from flask import Flask, jsonify
+    from flask.json.provider import DefaultJSONProvider
+    from app import transporte
+
+    base = Flask("bench")
+    padrao = DefaultJSONProvider(base)
+    provedores = {"json (stdlib)": padrao}
+    if transporte.orjson is not None:
+        provedores["orjson"] = transporte.ProvedorOrjson(base)
+    codificacoes = [("sem", None, {}), ("gzip 1", "gzip", {"COMPRESSAO_GZIP_NIVEL": 1}),
+                    ("gzip 6", "gzip", {"COMPRESSAO_GZIP_NIVEL": 6})]
+    if transporte.brotli is not None:
+        codificacoes.append(("brotli 5", "br", {"COMPRESSAO_BROTLI_QUALIDADE": 5}))
+    else:
+        print("(brotli não instalado: pip install brotli)")
+    if transporte.orjson is None:
+        print("(orjson não instalado: pip install orjson)")
+
+    dados = payloads(args.perguntas, args.alunos)
+    n = args.repeticoes
+
+    print()
+    print(f"{'payload':<10}{'serializador':<16}{'bytes':>9}{'µs/resp':>10}")
+    for nome, obj in dados.items():
+        for pnome, prov in provedores.items():
+            corpo = prov.response(obj).get_data()
+            print(f"{nome:<10}{pnome:<16}{len(corpo):>9}{_cpu_us(lambda: prov.response(obj).get_data(), n):>10.1f}")
+
+    print()
+    print(f"{'payload':<10}{'compressão':<16}{'bytes':>9}{'razão':>8}{'µs/resp':>10}")
+    for nome, obj in dados.items():
+        corpo = padrao.response(obj).get_data()
+        for cnome, cod, cfg in codificacoes:
+            if cod is None:
+                print(f"{nome:<10}{cnome:<16}{len(corpo):>9}{1.0:>8.2f}{0.0:>10.1f}")
+                continue
+            z = transporte.comprimir(corpo, cod, cfg)
+            us = _cpu_us(lambda: transporte.comprimir(corpo, cod, cfg), max(1, n // 4))
+            print(f"{nome:<10}{cnome:<16}{len(z):>9}{len(corpo) / len(z):>8.2f}{us:>10.1f}")
+
+    # resposta completa (view + jsonify + after_request) num app mínimo
+    print()
+    print(f"{'payload':<10}{'configuração':<28}{'bytes':>9}{'µs/resp':>10}")
+    cenarios = [("stdlib, sem compressão", "padrao", False, {}),
+                ("orjson, sem compressão", "orjson", False, {}),
+                ("orjson, gzip", "orjson", True, {"Accept-Encoding": "gzip"})]
+    if transporte.brotli is not None:
+        cenarios.append(("orjson, brotli", "orjson", True, {"Accept-Encoding": "br, gzip"}))
+    for cnome, motor, comprimir, headers in cenarios:
+        app = Flask("bench_" + cnome)
+        app.config.update(JSON_MOTOR=motor, COMPRESSAO_HABILITADA=comprimir, COMPRESSAO_MINIMO=1024)
+        transporte.configurar_transporte(app)
+        for nome, obj in dados.items():
+            app.add_url_rule(f"/{nome}", nome, (lambda o: lambda: jsonify(o))(obj))
+        cliente = app.test_client()
+        for nome in dados:
+            tamanho = len(cliente.get(f"/{nome}", headers=headers).data)
+            us = _cpu_us(lambda: cliente.get(f"/{nome}", headers=headers).data, max(1, n // 4))
+            print(f"{nome:<10}{cnome:<28}{tamanho:>9}{us:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
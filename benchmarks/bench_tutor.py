@@ -0,0 +1,375 @@
+# benchmarks/bench_tutor.py
+"""
+Benchmark do fluxo do tutor (/api/tutor/proximo, /responder, /finalizar).
+
+Monta um banco SQLite sintético num arquivo temporário, loga os alunos via
+cookie de sessão assinado e dirige o fluxo completo de cada aluno:
+
+  - modo "cliente": Flask test client, sequencial (mede custo puro do servidor)
+  - modo "http": servidor werkzeug com threads + N threads clientes (urllib)
+
+Relata throughput, p50/p95/p99 de latência e consultas SQL por request (headers da instrumentação),
+separado por endpoint.
+
+Uso:
+    python -m benchmarks.bench_tutor --turmas 2 --alunos 50 --desafios 20 \
+        --perguntas 4 --historico 5 --requests 2000 --modo ambos --threads 8
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+ENDPOINTS = ("/api/tutor/proximo", "/api/tutor/responder", "/api/tutor/finalizar")
+
+
+# =========================
+# Banco sintético
+# =========================
+
+def montar_banco(app, n_turmas: int, n_alunos: int, n_desafios: int, n_perguntas: int,
+                 n_historico: int, seed: int = 42) -> Dict[int, List[int]]:
+    """
+    Popula o banco via gerar_dados.gerar com:
+      - n_turmas turmas, cada uma com uma disciplina e 5 tópicos
+      - n_alunos alunos por turma
+      - ~n_desafios desafios por turma (n_perguntas perguntas cada)
+      - n_historico tentativas já finalizadas por aluno (com interações)
+
+    Retorna {turma_id: [usuario_id, ...]}.
+    """
+    from gerar_dados import gerar
+    from app.modelos import db
+
+    n_topicos = 5
+    with app.app_context():
+        resumo = gerar(
+            db,
+            turmas=n_turmas,
+            alunos_por_turma=n_alunos,
+            topicos_por_disciplina=n_topicos,
+            desafios_por_topico=max(1, -(-n_desafios // n_topicos)),
+            perguntas_por_desafio=n_perguntas,
+            tentativas_por_aluno=n_historico,
+            seed=seed,
+        )
+    return resumo["turmas"]
+
+
+def copiar_banco(origem: str, destino: str) -> None:
+    """Cópia consistente de um arquivo SQLite (backup API: leva junto o que estiver no WAL)."""
+    src, dst = sqlite3.connect(origem), sqlite3.connect(destino)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def restaurar_banco(app, db_path: str, copia: str) -> None:
+    """Volta o banco ao estado de `copia` e esquece os caches em memória do app."""
+    from app.dados_analise import limpar_cache
+    from app.modelos import db
+    from app.selecao_adaptativa import limpar_filas
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()  # nenhuma conexão do pool segura o arquivo antigo
+    copiar_banco(copia, db_path)
+    limpar_filas()
+    limpar_cache()
+
+
+# =========================
+# Contagem de consultas por request
+# =========================
+
+def instrumentar_consultas(app) -> None:
+    """
+    Liga os headers X-DB-Queries/X-DB-Time-ms da instrumentação do app
+    (app/instrumentacao.py), que o driver usa para contar consultas por request.
+    """
+    app.config["SQL_HEADERS"] = True
+
+
+# =========================
+# Sessão de aluno (máquina de estados do tutor.js)
+# =========================
+
+class Aluno:
+    def __init__(self, usuario_id: int, turma_id: int, rnd: random.Random):
+        self.usuario_id = usuario_id
+        self.turma_id = turma_id
+        self.rnd = rnd
+        self.tentativa_id: Optional[int] = None
+        self.pergunta_id: Optional[int] = None
+        self.finalizar = False
+        self.terminou = False
+
+    def proximo_request(self):
+        if self.finalizar:
+            return "/api/tutor/finalizar", {"tentativa_id": self.tentativa_id}
+        if self.pergunta_id:
+            return "/api/tutor/responder", {
+                "tentativa_id": self.tentativa_id,
+                "pergunta_id": self.pergunta_id,
+                "alternativa": self.rnd.choice("abcd"),
+            }
+        return "/api/tutor/proximo", {"turma_id": self.turma_id}
+
+    def aplicar(self, url: str, status: int, data: dict) -> None:
+        if status != 200:
+            # reinicia o ciclo (ex.: pergunta já respondida em corrida)
+            self.pergunta_id = None
+            self.finalizar = False
+            return
+
+        if url.endswith("/proximo"):
+            if data.get("done"):
+                self.terminou = True
+                return
+            self.tentativa_id = data.get("tentativa_id") or self.tentativa_id
+            if data.get("fim_do_desafio"):
+                self.pergunta_id = None
+                self.finalizar = bool(self.tentativa_id)
+            else:
+                self.pergunta_id = data.get("pergunta_id")
+        elif url.endswith("/responder"):
+            self.pergunta_id = None
+            self.finalizar = bool(data.get("tentativa_concluida"))
+        else:
+            self.finalizar = False
+
+
+def cookie_sessao(app, usuario_id: int) -> str:
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({"_user_id": str(usuario_id), "_fresh": True})
+
+
+# =========================
+# Drivers
+# =========================
+
+class Resultados:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.consultas: Dict[str, List[int]] = defaultdict(list)
+        self.erros: Dict[str, int] = defaultdict(int)
+        self.duracao = 0.0
+
+    def registrar(self, url: str, dt: float, status: int, n_queries: Optional[int]) -> None:
+        with self.lock:
+            self.latencias[url].append(dt)
+            if n_queries is not None:
+                self.consultas[url].append(n_queries)
+            if status != 200:
+                self.erros[url] += 1
+
+
+def rodar_cliente(app, alunos: List[Aluno], n_requests: int) -> Resultados:
+    res = Resultados()
+    nome_cookie = app.config.get("SESSION_COOKIE_NAME", "session")
+    clientes = {}
+    for a in alunos:
+        c = app.test_client()
+        c.set_cookie(nome_cookie, cookie_sessao(app, a.usuario_id))
+        clientes[a.usuario_id] = c
+
+    ativos = list(alunos)
+    feitos = 0
+    t0 = time.perf_counter()
+    while feitos < n_requests and ativos:
+        a = ativos[feitos % len(ativos)]
+        url, body = a.proximo_request()
+        t = time.perf_counter()
+        r = clientes[a.usuario_id].post(url, json=body)
+        dt = time.perf_counter() - t
+        nq = r.headers.get("X-DB-Queries")
+        res.registrar(url, dt, r.status_code, int(nq) if nq is not None else None)
+        a.aplicar(url, r.status_code, r.get_json(silent=True) or {})
+        if a.terminou:
+            ativos.remove(a)
+        feitos += 1
+    res.duracao = time.perf_counter() - t0
+    return res
+
+
+def rodar_http(app, alunos: List[Aluno], n_requests: int, n_threads: int) -> Resultados:
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    servidor = make_server("127.0.0.1", 0, app, threaded=True)
+    porta = servidor.server_port
+    th_srv = threading.Thread(target=servidor.serve_forever, daemon=True)
+    th_srv.start()
+
+    nome_cookie = app.config.get("SESSION_COOKIE_NAME", "session")
+    cookies = {a.usuario_id: f"{nome_cookie}={cookie_sessao(app, a.usuario_id)}" for a in alunos}
+
+    res = Resultados()
+    contador = {"n": 0}
+    lock = threading.Lock()
+
+    def worker(meus: List[Aluno]):
+        ativos = list(meus)
+        i = 0
+        while ativos:
+            with lock:
+                if contador["n"] >= n_requests:
+                    return
+                contador["n"] += 1
+            a = ativos[i % len(ativos)]
+            i += 1
+            url, body = a.proximo_request()
+            req = urllib.request.Request(
+                f"http://127.0.0.1:{porta}{url}",
+                data=json.dumps(body).encode("utf-8"),
+                headers={"Content-Type": "application/json", "Cookie": cookies[a.usuario_id]},
+                method="POST",
+            )
+            t = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=30) as r:
+                    raw = r.read()
+                    status = r.status
+                    nq = r.headers.get("X-DB-Queries")
+            except urllib.error.HTTPError as e:
+                raw = e.read()
+                status = e.code
+                nq = e.headers.get("X-DB-Queries")
+            dt = time.perf_counter() - t
+            res.registrar(url, dt, status, int(nq) if nq is not None else None)
+            try:
+                data = json.loads(raw or b"{}")
+            except ValueError:
+                data = {}
+            a.aplicar(url, status, data)
+            if a.terminou:
+                ativos.remove(a)
+
+    grupos = [alunos[i::n_threads] for i in range(n_threads)]
+    threads = [threading.Thread(target=worker, args=(g,)) for g in grupos if g]
+    t0 = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    res.duracao = time.perf_counter() - t0
+
+    servidor.shutdown()
+    return res
+
+
+# =========================
+# Relatório
+# =========================
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    s = sorted(valores)
+    idx = min(len(s) - 1, max(0, int(round(p / 100.0 * (len(s) - 1)))))
+    return s[idx]
+
+
+def imprimir(titulo: str, res: Resultados) -> None:
+    total = sum(len(v) for v in res.latencias.values())
+    rps = total / res.duracao if res.duracao else 0.0
+    print(f"\n== {titulo}: {total} requests em {res.duracao:.2f}s ({rps:.1f} req/s)")
+    print(f"{'endpoint':<24}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'q/req':>8}{'erros':>7}")
+    for url in ENDPOINTS:
+        lat = res.latencias.get(url, [])
+        if not lat:
+            continue
+        qs = res.consultas.get(url, [])
+        qmed = (sum(qs) / len(qs)) if qs else float("nan")
+        print(
+            f"{url.rsplit('/', 1)[-1]:<24}{len(lat):>7}"
+            f"{_percentil(lat, 50) * 1000:>10.2f}{_percentil(lat, 95) * 1000:>10.2f}"
+            f"{_percentil(lat, 99) * 1000:>10.2f}{qmed:>8.1f}{res.erros.get(url, 0):>7}"
+        )
+
+
+# =========================
+# CLI
+# =========================
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark do fluxo do tutor.")
+    ap.add_argument("--turmas", type=int, default=2)
+    ap.add_argument("--alunos", type=int, default=30, help="alunos por turma")
+    ap.add_argument("--desafios", type=int, default=20, help="desafios por turma")
+    ap.add_argument("--perguntas", type=int, default=4, help="perguntas por desafio")
+    ap.add_argument("--historico", type=int, default=5, help="tentativas finalizadas por aluno")
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--modo", choices=("cliente", "http", "ambos"), default="ambos")
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--db", default=None, help="arquivo SQLite (padrão: temporário)")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args(argv)
+
+    tmpdir = None
+    db_path = args.db
+    if not db_path:
+        tmpdir = tempfile.mkdtemp(prefix="bench_tutor_")
+        db_path = os.path.join(tmpdir, "bench.db")
+
+    # precisa vir antes de importar config/app
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(db_path)}"
+    os.environ["SQL_INSTRUMENTACAO"] = "1"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from app import create_app
+
+    def nova_app():
+        app = create_app()
+        app.config["WTF_CSRF_ENABLED"] = False
+        instrumentar_consultas(app)
+        return app
+
+    print(f"Banco: {db_path}")
+    t = time.perf_counter()
+    app = nova_app()
+    alunos_por_turma = montar_banco(
+        app, args.turmas, args.alunos, args.desafios, args.perguntas, args.historico, seed=args.seed
+    )
+    print(f"Banco sintético pronto em {time.perf_counter() - t:.2f}s "
+          f"({sum(len(v) for v in alunos_por_turma.values())} alunos)")
+
+    # cada modo parte do mesmo banco: a passada anterior finaliza tentativas e
+    # deixaria o fluxo seguinte com menos desafios (e mais "done")
+    copia = os.path.join(tmpdir or os.path.dirname(os.path.abspath(db_path)), "bench_inicial.db")
+    copiar_banco(db_path, copia)
+
+    def novos_alunos():
+        rnd = random.Random(args.seed)
+        return [Aluno(uid, tid, rnd) for tid, uids in alunos_por_turma.items() for uid in uids]
+
+    try:
+        if args.modo in ("cliente", "ambos"):
+            restaurar_banco(app, db_path, copia)
+            imprimir("test client", rodar_cliente(app, novos_alunos(), args.requests))
+
+        if args.modo in ("http", "ambos"):
+            restaurar_banco(app, db_path, copia)
+            imprimir(f"http ({args.threads} threads)", rodar_http(app, novos_alunos(), args.requests, args.threads))
+    finally:
+        os.remove(copia)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -18,3 +18,83 @@ class Config:
     # uploads ficam em /static/uploads (servidos pelo Flask)
     UPLOAD_FOLDER = os.path.join(BASE_DIR, "app", "static", "uploads")
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024
+
+    # Instrumentação de SQL por request (app/instrumentacao.py)
+    SQL_INSTRUMENTACAO = os.environ.get("SQL_INSTRUMENTACAO", "1") != "0"
+    SQL_HEADERS = None  # None = só em debug
+    SQL_N_MAIS_1_LIMIAR = 5
+
+    # GET /metrics (app/metricas.py): admin logado ou "Authorization: Bearer <token>"
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+    # Profiling sob demanda (?_perfil=1|texto|json, só admin) — app/perfilador.py
+    PERFIL_HABILITADO = os.environ.get("PERFIL_HABILITADO", "1") != "0"
+    PERFIL_INTERVALO_MS = 2
+    PERFIL_PASTA = "perfis"  # dentro de instance/
+
+    # Grupos por turma (app/agrupamento.py): centróides persistidos + atribuição online.
+    # Reajuste completo quando a inércia média sobe mais que LIMIAR_INERCIA (fração)
+    # ou quando a fração de alunos reatribuídos desde o último ajuste passa LIMIAR_ALTERADOS.
+    AGRUPAMENTO_LIMIAR_INERCIA = 0.25
+    AGRUPAMENTO_LIMIAR_ALTERADOS = 0.3
+    # "k automático": varre k=2..K_MAX em paralelo; silhueta numa amostra de até SILHUETA_AMOSTRA alunos
+    AGRUPAMENTO_K_MAX = 10
+    AGRUPAMENTO_SILHUETA_AMOSTRA = 2000
+    AGRUPAMENTO_THREADS = int(os.environ.get("AGRUPAMENTO_THREADS", "4"))
+
+    # Agregações das análises (app/motor_analitico.py): "sqlite" ou "duckdb" (opcional,
+    # pip install duckdb; anexa o arquivo SQLite somente leitura). THREADS vazio = padrão do DuckDB.
+    ANALITICO_MOTOR = os.environ.get("ANALITICO_MOTOR", "sqlite")
+    ANALITICO_THREADS = os.environ.get("ANALITICO_THREADS")
+
+    # Domínio por aluno × tópico (app/dominio.py, BKT): P inicial, aprender, chute, deslize.
+    # `flask dominio-reajustar --ajustar` sugere valores a partir do histórico.
+    DOMINIO_P_INICIAL = 0.3
+    DOMINIO_P_APRENDER = 0.15
+    DOMINIO_P_CHUTE = 0.25
+    DOMINIO_P_DESLIZE = 0.1
+    DOMINIO_LIMIAR = 0.95  # a partir daqui o tópico conta como dominado
+
+    # Próximo desafio do tutor: "ordem" (tópico/id) ou "adaptativa" (tópico menos
+    # dominado primeiro, fila por aluno em memória; app/selecao_adaptativa.py).
+    TUTOR_SELECAO = os.environ.get("TUTOR_SELECAO", "ordem")
+    TUTOR_FILA_TTL = 300  # segundos até remontar a fila (mudanças feitas por outros processos)
+
+    # Calibração TRI (app/irt.py; `flask irt-calibrar`, ex.: de hora em hora no cron)
+    IRT_MODELO = os.environ.get("IRT_MODELO", "2pl")  # "1pl" | "2pl"
+    IRT_MAX_ITER = 500
+    IRT_THREADS = os.environ.get("IRT_THREADS")  # padrão: nº de CPUs
+    IRT_FRACAO_INCREMENTAL = 0.05  # até 5% de respostas novas: só reestima habilidades
+
+    # Estatísticas por pergunta (app/estatisticas_itens.py): o AtividadesHubView dispara a
+    # atualização em segundo plano (incremental; completa se a tabela está vazia ou
+    # desatualizada), no máximo uma a cada INTERVALO segundos.
+    ESTATISTICAS_INTERVALO = 60
+
+    # Respostas (app/transporte.py): JSON via orjson se instalado ("orjson" | "padrao");
+    # compressão gzip (ou brotli, se instalado) de texto/JSON a partir de COMPRESSAO_MINIMO bytes.
+    JSON_MOTOR = os.environ.get("JSON_MOTOR", "orjson")
+    COMPRESSAO_HABILITADA = os.environ.get("COMPRESSAO_HABILITADA", "1") != "0"
+    COMPRESSAO_MINIMO = 1024
+    COMPRESSAO_GZIP_NIVEL = 4  # 6 comprime ~2% a mais o tutor e custa ~30% mais CPU nos painéis grandes
+    COMPRESSAO_BROTLI_QUALIDADE = 5
+
+    # Fórmulas LaTeX pré-renderizadas em SVG (app/formulas.py; `flask formulas-renderizar`);
+    # o que o mathtext não entende continua com o MathJax no navegador. Tamanho em pt.
+    FORMULAS_HABILITADAS = os.environ.get("FORMULAS_HABILITADAS", "1") != "0"
+    FORMULAS_TAMANHO = 14
+
+    # Imagens de enunciado (app/imagens.py; `flask imagens-processar` para uploads antigos):
+    # variantes WebP + JPEG/PNG nessas larguras, sem metadados; original fica em instance/uploads.
+    IMAGENS_LARGURAS = (480, 960, 1440)
+    IMAGENS_QUALIDADE_WEBP = 75
+    IMAGENS_QUALIDADE_JPEG = 82
+    IMAGENS_MAX_PIXELS = 40_000_000
+
+    # Estáticos (app/estaticos.py): ?v=<hash> + cache imutável de 1 ano; JS/CSS minificados
+    # de static/dist/ (`flask estaticos-build`); entrega pelo servidor web:
+    # "" (Flask) | "x-sendfile" (Apache/lighttpd) | "x-accel" (nginx, location internal no prefixo)
+    ESTATICOS_FINGERPRINT = os.environ.get("ESTATICOS_FINGERPRINT", "1") != "0"
+    ESTATICOS_MINIFICADOS = os.environ.get("ESTATICOS_MINIFICADOS", "0") == "1"
+    ESTATICOS_SERVIDOR = os.environ.get("ESTATICOS_SERVIDOR", "")
+    ESTATICOS_X_ACCEL_PREFIXO = os.environ.get("ESTATICOS_X_ACCEL_PREFIXO", "/_estaticos/")
@@ -0,0 +1,345 @@
+# gerar_dados.py
+"""
+Gerador de dados sintéticos em escala (complementa o seed_db.py).
+
+Diferente do seed_db.py (um exemplo pequeno, commit por objeto), aqui tudo é
+inserido em lote via Core (executemany) com ids atribuídos no próprio script,
+o que permite gerar milhões de Interacao em poucos segundos/minutos.
+
+Cada aluno pertence a um "perfil" (grupo simulado) com taxa de acerto média
+própria; cada perfil sorteia um desvio por tópico e cada aluno um desvio
+pessoal, então a análise de clusters tem estrutura real para encontrar.
+
+O resultado é reprodutível para o mesmo --seed e os mesmos parâmetros.
+
+Uso:
+    python gerar_dados.py --limpar --turmas 10 --alunos 500 --topicos 8 \
+        --desafios 5 --perguntas 4 --tentativas 40 --perfis 0.85,0.6,0.35
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+from sqlalchemy import func, insert
+from werkzeug.security import generate_password_hash
+
+LOTE = 50_000
+
+
+def _inserir_em_lotes(conn, tabela, linhas: List[Dict[str, Any]], lote: int = LOTE) -> None:
+    for i in range(0, len(linhas), lote):
+        conn.execute(insert(tabela), linhas[i:i + lote])
+
+
+def _proximo_id(conn, tabela) -> int:
+    return int(conn.execute(func.coalesce(func.max(tabela.c.id), 0).select()).scalar() or 0) + 1
+
+
+def limpar_banco(db) -> None:
+    """Apaga todas as linhas de todas as tabelas (ordem reversa de FK)."""
+    with db.engine.begin() as conn:
+        for tabela in reversed(db.metadata.sorted_tables):
+            conn.execute(tabela.delete())
+
+
+def gerar(
+    db,
+    turmas: int = 2,
+    alunos_por_turma: int = 30,
+    topicos_por_disciplina: int = 5,
+    desafios_por_topico: int = 4,
+    perguntas_por_desafio: int = 4,
+    tentativas_por_aluno: int = 10,
+    perfis: Sequence[float] = (0.85, 0.6, 0.35),
+    dias: int = 120,
+    fim: datetime | None = None,
+    seed: int = 42,
+    abertas: bool = False,
+) -> Dict[str, Any]:
+    """
+    Gera o dataset e retorna um resumo:
+      {"turmas": {turma_id: [usuario_id, ...]}, "contagens": {...}, "perfil_por_aluno": {...}}
+
+    - Cada turma ganha uma disciplina própria com seus tópicos/desafios/perguntas.
+    - tentativas_por_aluno é limitado ao nº de desafios da turma (sem repetir desafio).
+    - abertas=True deixa a última tentativa de cada aluno em andamento (sem interações).
+    - As datas ficam em [fim - dias, fim]; fim padrão = meia-noite UTC de hoje.
+    """
+    from app.modelos import (
+        Usuario, Turma, Matricula, Disciplina, Topico, Desafio, Pergunta,
+        TentativaDesafio, Interacao, turmas_disciplinas,
+    )
+
+    rng = np.random.default_rng(seed)
+    perfis = np.asarray(list(perfis) or [0.7], dtype=float)
+    senha_hash = generate_password_hash("123")
+    fim = fim or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    inicio = fim - timedelta(days=max(1, int(dias)))
+    janela_s = max(1, int((fim - inicio).total_seconds()))
+
+    t_usuarios = Usuario.__table__
+    t_turmas = Turma.__table__
+    t_matriculas = Matricula.__table__
+    t_disciplinas = Disciplina.__table__
+    t_topicos = Topico.__table__
+    t_desafios = Desafio.__table__
+    t_perguntas = Pergunta.__table__
+    t_tentativas = TentativaDesafio.__table__
+    t_interacoes = Interacao.__table__
+
+    resumo: Dict[str, Any] = {"turmas": {}, "perfil_por_aluno": {}}
+    cont = {k: 0 for k in ("turmas", "alunos", "topicos", "desafios", "perguntas", "tentativas", "interacoes")}
+
+    with db.engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+
+        ids = {
+            "usuario": _proximo_id(conn, t_usuarios),
+            "turma": _proximo_id(conn, t_turmas),
+            "disciplina": _proximo_id(conn, t_disciplinas),
+            "topico": _proximo_id(conn, t_topicos),
+            "desafio": _proximo_id(conn, t_desafios),
+            "pergunta": _proximo_id(conn, t_perguntas),
+            "tentativa": _proximo_id(conn, t_tentativas),
+            "interacao": _proximo_id(conn, t_interacoes),
+        }
+        sufixo = f"{seed}-{ids['turma']}"
+
+        for t in range(turmas):
+            turma_id = ids["turma"]
+            ids["turma"] += 1
+            disc_id = ids["disciplina"]
+            ids["disciplina"] += 1
+
+            conn.execute(insert(t_disciplinas), [{
+                "id": disc_id, "nome": f"Disciplina sintética {sufixo}.{t + 1}", "criado_em": inicio,
+            }])
+            conn.execute(insert(t_turmas), [{
+                "id": turma_id, "nome": f"Turma sintética {t + 1}", "codigo": f"S{sufixo}.{t + 1}",
+                "descricao": "Gerada por gerar_dados.py", "criado_em": inicio,
+            }])
+            conn.execute(insert(turmas_disciplinas), [{"turma_id": turma_id, "disciplina_id": disc_id}])
+
+            # ---- conteúdo ----
+            topico_ids = list(range(ids["topico"], ids["topico"] + topicos_por_disciplina))
+            ids["topico"] += topicos_por_disciplina
+            conn.execute(insert(t_topicos), [
+                {"id": tid, "disciplina_id": disc_id, "nome": f"Tópico {j + 1}", "criado_em": inicio}
+                for j, tid in enumerate(topico_ids)
+            ])
+
+            desafios_rows = []
+            for tid in topico_ids:
+                for j in range(desafios_por_topico):
+                    desafios_rows.append({
+                        "id": ids["desafio"], "topico_id": tid, "titulo": f"Desafio {tid}.{j + 1}",
+                        "tipo_enunciado": "latex", "enunciado_latex": r"\lim_{x\to 1}\frac{x^2-1}{x-1}",
+                        "criado_em": inicio,
+                    })
+                    ids["desafio"] += 1
+            _inserir_em_lotes(conn, t_desafios, desafios_rows)
+
+            perguntas_rows = []
+            for d in desafios_rows:
+                for j in range(perguntas_por_desafio):
+                    perguntas_rows.append({
+                        "id": ids["pergunta"], "desafio_id": d["id"], "ordem": j + 1,
+                        "enunciado": rf"Passo {j + 1} do desafio {d['id']}",
+                        "alt_a": "x+1", "alt_b": "x-1", "alt_c": r"\frac{1}{x-1}", "alt_d": "x^2",
+                        "correta": "abcd"[int(rng.integers(0, 4))],
+                    })
+                    ids["pergunta"] += 1
+            _inserir_em_lotes(conn, t_perguntas, perguntas_rows)
+
+            # ---- alunos ----
+            uids = list(range(ids["usuario"], ids["usuario"] + alunos_por_turma))
+            ids["usuario"] += alunos_por_turma
+            _inserir_em_lotes(conn, t_usuarios, [
+                {"id": uid, "nome": f"Aluno {uid}", "email": f"aluno{uid}.{sufixo}@sintetico.local",
+                 "senha_hash": senha_hash, "is_admin": False, "criado_em": inicio}
+                for uid in uids
+            ])
+            _inserir_em_lotes(conn, t_matriculas, [
+                {"turma_id": turma_id, "usuario_id": uid, "papel": "aluno", "criado_em": inicio}
+                for uid in uids
+            ])
+            resumo["turmas"][turma_id] = uids
+
+            if not desafios_rows or not perguntas_rows or not uids:
+                continue
+
+            # ---- acurácia por aluno x tópico ----
+            n_a, n_t = len(uids), len(topico_ids)
+            perfil = rng.integers(0, len(perfis), size=n_a)
+            desvio_perfil_topico = rng.normal(0.0, 0.10, size=(len(perfis), n_t))
+            desvio_aluno = rng.normal(0.0, 0.05, size=(n_a, 1))
+            acuracia = np.clip(perfis[perfil][:, None] + desvio_perfil_topico[perfil] + desvio_aluno, 0.02, 0.98)
+            for i, uid in enumerate(uids):
+                resumo["perfil_por_aluno"][uid] = int(perfil[i])
+
+            # ---- tentativas + interações (vetorizado por turma) ----
+            desafio_ids = np.array([d["id"] for d in desafios_rows], dtype=np.int64)
+            desafio_topico_pos = np.array([topico_ids.index(d["topico_id"]) for d in desafios_rows], dtype=np.int64)
+            perguntas_por_desafio_arr = np.array(
+                [r["id"] for r in perguntas_rows], dtype=np.int64
+            ).reshape(len(desafios_rows), perguntas_por_desafio)
+            correta_arr = np.array(
+                ["abcd".index(r["correta"]) for r in perguntas_rows], dtype=np.int64
+            ).reshape(len(desafios_rows), perguntas_por_desafio)
+
+            n_tent = min(int(tentativas_por_aluno), len(desafios_rows))
+            if n_tent <= 0:
+                continue
+
+            # escolha de desafios sem repetição: argsort de ruído uniforme
+            escolha = np.argsort(rng.random((n_a, len(desafios_rows))), axis=1)[:, :n_tent]
+            aluno_pos = np.repeat(np.arange(n_a), n_tent)
+            desafio_pos = escolha.reshape(-1)
+
+            tent_ids = np.arange(ids["tentativa"], ids["tentativa"] + len(desafio_pos), dtype=np.int64)
+            ids["tentativa"] += len(desafio_pos)
+            tent_inicio = np.sort(rng.integers(0, janela_s, size=(n_a, n_tent)), axis=1).reshape(-1)
+
+            aberta = np.zeros(len(desafio_pos), dtype=bool)
+            if abertas:
+                aberta[n_tent - 1::n_tent] = True
+
+            # matriz tentativas x perguntas
+            p_acerto = acuracia[aluno_pos, desafio_topico_pos[desafio_pos]]
+            acertos = rng.random((len(desafio_pos), perguntas_por_desafio)) < p_acerto[:, None]
+            acertos[aberta] = False
+            taxa = acertos.mean(axis=1)
+            n_corretas = acertos.sum(axis=1)
+
+            _inserir_em_lotes(conn, t_tentativas, [
+                {
+                    "id": int(tent_ids[i]),
+                    "usuario_id": int(uids[aluno_pos[i]]),
+                    "turma_id": turma_id,
+                    "desafio_id": int(desafio_ids[desafio_pos[i]]),
+                    "topico_id": int(topico_ids[desafio_topico_pos[desafio_pos[i]]]),
+                    "iniciado_em": inicio + timedelta(seconds=int(tent_inicio[i])),
+                    "finalizada": not bool(aberta[i]),
+                    "taxa_acerto_final": None if aberta[i] else float(taxa[i]),
+                    "dominou": None if aberta[i] else bool(taxa[i] >= 0.8),
+                    "respondidas": 0 if aberta[i] else perguntas_por_desafio,
+                    "corretas": 0 if aberta[i] else int(n_corretas[i]),
+                    "total_perguntas": perguntas_por_desafio,
+                    "proxima_pergunta_id": (
+                        int(perguntas_por_desafio_arr[desafio_pos[i], 0]) if aberta[i] else None
+                    ),
+                }
+                for i in range(len(desafio_pos))
+            ])
+
+            fechadas = np.nonzero(~aberta)[0]
+            if len(fechadas) == 0:
+                continue
+            linhas_t = np.repeat(fechadas, perguntas_por_desafio)
+            colunas_p = np.tile(np.arange(perguntas_por_desafio), len(fechadas))
+            ok = acertos[linhas_t, colunas_p]
+            certa = correta_arr[desafio_pos[linhas_t], colunas_p]
+            # errada: desloca a correta em 1..3 posições (mod 4)
+            errada = (certa + rng.integers(1, 4, size=len(certa))) % 4
+            alternativa = np.where(ok, certa, errada)
+            inter_ids = np.arange(ids["interacao"], ids["interacao"] + len(linhas_t), dtype=np.int64)
+            ids["interacao"] += len(linhas_t)
+            segundos = tent_inicio[linhas_t] + 30 * (colunas_p + 1)
+
+            inter_rows = [
+                {
+                    "id": int(inter_ids[i]),
+                    "tentativa_id": int(tent_ids[linhas_t[i]]),
+                    "pergunta_id": int(perguntas_por_desafio_arr[desafio_pos[linhas_t[i]], colunas_p[i]]),
+                    "topico_id": int(topico_ids[desafio_topico_pos[desafio_pos[linhas_t[i]]]]),
+                    "alternativa": "abcd"[int(alternativa[i])],
+                    "foi_correta": bool(ok[i]),
+                    "criado_em": inicio + timedelta(seconds=int(segundos[i])),
+                }
+                for i in range(len(linhas_t))
+            ]
+            _inserir_em_lotes(conn, t_interacoes, inter_rows)
+
+            cont["tentativas"] += len(desafio_pos)
+            cont["interacoes"] += len(inter_rows)
+
+        for k, v in (
+            ("turmas", turmas),
+            ("alunos", turmas * alunos_por_turma),
+            ("topicos", turmas * topicos_por_disciplina),
+            ("desafios", turmas * topicos_por_disciplina * desafios_por_topico),
+            ("perguntas", turmas * topicos_por_disciplina * desafios_por_topico * perguntas_por_desafio),
+        ):
+            cont[k] = v
+
+    # inserção direta não passa por contabilizar_resposta nem pelos eventos da sessão:
+    # resumos por período, domínio das turmas novas e KPIs do painel
+    from app.contadores import invalidar_contadores
+    from app.dominio import reajustar_dominios
+    from app.resumos import reconstruir_resumos
+    for turma_id, aluno_ids in resumo["turmas"].items():
+        reconstruir_resumos(turma_id)
+        reajustar_dominios(aluno_ids)
+    invalidar_contadores()
+    db.session.commit()
+
+    resumo["contagens"] = cont
+    return resumo
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Gera dados sintéticos em escala.")
+    ap.add_argument("--limpar", action="store_true", help="apaga TODOS os dados antes de gerar")
+    ap.add_argument("--turmas", type=int, default=2)
+    ap.add_argument("--alunos", type=int, default=30, help="alunos por turma")
+    ap.add_argument("--topicos", type=int, default=5, help="tópicos por disciplina (1 disciplina por turma)")
+    ap.add_argument("--desafios", type=int, default=4, help="desafios por tópico")
+    ap.add_argument("--perguntas", type=int, default=4, help="perguntas por desafio")
+    ap.add_argument("--tentativas", type=int, default=10, help="tentativas finalizadas por aluno")
+    ap.add_argument("--perfis", default="0.85,0.6,0.35", help="taxa de acerto média de cada perfil simulado")
+    ap.add_argument("--dias", type=int, default=120, help="janela de datas das interações")
+    ap.add_argument("--fim", default=None, help="data final da janela (AAAA-MM-DD); padrão: hoje")
+    ap.add_argument("--abertas", action="store_true", help="deixa a última tentativa de cada aluno aberta")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args(argv)
+
+    from app import create_app
+    from app.modelos import db
+
+    app = create_app()
+    with app.app_context():
+        if args.limpar:
+            limpar_banco(db)
+
+        t0 = time.perf_counter()
+        resumo = gerar(
+            db,
+            turmas=args.turmas,
+            alunos_por_turma=args.alunos,
+            topicos_por_disciplina=args.topicos,
+            desafios_por_topico=args.desafios,
+            perguntas_por_desafio=args.perguntas,
+            tentativas_por_aluno=args.tentativas,
+            perfis=[float(x) for x in args.perfis.split(",") if x.strip()],
+            dias=args.dias,
+            fim=datetime.strptime(args.fim, "%Y-%m-%d") if args.fim else None,
+            seed=args.seed,
+            abertas=args.abertas,
+        )
+        dt = time.perf_counter() - t0
+
+    c = resumo["contagens"]
+    print(f"OK em {dt:.1f}s")
+    for k in ("turmas", "alunos", "topicos", "desafios", "perguntas", "tentativas", "interacoes"):
+        print(f"  {k:<11} {c[k]}")
+    print("Senha de todos os alunos sintéticos: 123")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,3 +1,4 @@
+# Exemplo mínimo. Para volumes grandes (profiling/benchmarks) use gerar_dados.py.
 from werkzeug.security import generate_password_hash
 
 from app import create_app
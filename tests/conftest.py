@@ -0,0 +1,52 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+from flask import g
+from flask.testing import FlaskClient
+
+_PASTA = tempfile.mkdtemp(prefix="swm_testes_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_PASTA, 'testes.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.modelos import db  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
+
+
+@pytest.fixture
+def banco(app):
+    """Banco vazio por teste (mesmo app da sessão)."""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db
+        db.session.remove()
+
+
+class _Cliente(FlaskClient):
+    # o request reaproveita o app context do `banco` (e o g): sem isso o
+    # current_user do request anterior valeria para outro cliente
+    def open(self, *args, **kwargs):
+        g.pop("_login_user", None)
+        return super().open(*args, **kwargs)
+
+
+@pytest.fixture
+def logar(app):
+    """logar(usuario) -> test client com a sessão do usuário."""
+    def _logar(usuario):
+        cliente = _Cliente(app, app.response_class, use_cookies=True)
+        with cliente.session_transaction() as s:
+            s["_user_id"] = str(usuario.id)
+            s["_fresh"] = True
+        return cliente
+    return _logar
@@ -0,0 +1,145 @@
+# tests/test_agrupamento.py
+import numpy as np
+import pytest
+
+from app import agrupamento
+from app.agrupamento import casar_rotulos, grupos_da_turma
+from app.modelos import (
+    CentroideTurma, Desafio, Disciplina, Interacao, Matricula, Pergunta, TentativaDesafio, Topico, Turma, Usuario,
+)
+
+N_PERGUNTAS = 10
+# respostas erradas (tópico A, tópico B), de N_PERGUNTAS em cada
+FRACO_EM_B = [(1, 9), (2, 9), (1, 8), (2, 8)]
+FRACO_EM_A = [(9, 1), (9, 2), (8, 1), (8, 2)]
+
+
+@pytest.fixture(autouse=True)
+def _sem_varredura():
+    agrupamento._varreduras.clear()
+    yield
+    agrupamento._varreduras.clear()
+
+
+def _turma(db, n_alunos):
+    turma = Turma(nome="T", codigo="T1")
+    disc = Disciplina(nome="Cálculo")
+    db.session.add_all([turma, disc])
+    db.session.flush()
+    conteudo = []
+    for nome in ("A", "B"):
+        topico = Topico(nome=nome, disciplina_id=disc.id)
+        db.session.add(topico)
+        db.session.flush()
+        desafio = Desafio(topico_id=topico.id, titulo=nome)
+        db.session.add(desafio)
+        db.session.flush()
+        perguntas = [Pergunta(desafio_id=desafio.id, enunciado="?", alt_a="1", alt_b="2", correta="a")
+                     for _ in range(N_PERGUNTAS)]
+        db.session.add_all(perguntas)
+        conteudo.append((topico, desafio, perguntas))
+    alunos = [_aluno(db, turma, i) for i in range(n_alunos)]
+    db.session.commit()
+    return turma, alunos, conteudo
+
+
+def _aluno(db, turma, i):
+    aluno = Usuario(nome=f"Aluno {i}", email=f"a{i}@x", senha_hash="x")
+    db.session.add(aluno)
+    db.session.flush()
+    db.session.add(Matricula(turma_id=turma.id, usuario_id=aluno.id, papel="aluno"))
+    return aluno
+
+
+def _responder(db, turma, aluno, conteudo, erros):
+    """Uma tentativa finalizada por tópico; erros[j] = respostas erradas no tópico j."""
+    for (topico, desafio, perguntas), e in zip(conteudo, erros):
+        tent = TentativaDesafio(usuario_id=aluno.id, turma_id=turma.id, desafio_id=desafio.id,
+                                topico_id=topico.id, finalizada=True)
+        db.session.add(tent)
+        db.session.flush()
+        db.session.add_all(
+            Interacao(tentativa_id=tent.id, pergunta_id=p.id, topico_id=topico.id,
+                      alternativa="b" if i < e else "a", foi_correta=i >= e)
+            for i, p in enumerate(perguntas)
+        )
+    db.session.commit()
+
+
+def _dois_grupos(db):
+    turma, alunos, conteudo = _turma(db, 8)
+    for aluno, erros in zip(alunos, FRACO_EM_B + FRACO_EM_A):
+        _responder(db, turma, aluno, conteudo, erros)
+    return turma, alunos, conteudo
+
+
+def test_casar_rotulos_desfaz_a_permutacao():
+    antigos = np.array([[0.1, 0.9], [0.9, 0.1], [0.5, 0.5]])
+    novos = antigos[[2, 0, 1]] + 0.01
+    assert casar_rotulos(antigos, novos).tolist() == [2, 0, 1]
+
+
+def test_reajuste_e_atribuicao_online_mantem_o_numero_do_grupo(banco, app, monkeypatch):
+    turma, alunos, conteudo = _dois_grupos(banco)
+
+    primeiro = grupos_da_turma(turma.id, 2)
+    assert primeiro["reajustado"]
+    antes = primeiro["clusters"]
+    assert len({antes[a.id] for a in alunos[:4]}) == 1
+    assert len({antes[a.id] for a in alunos[4:]}) == 1
+    assert antes[alunos[0].id] != antes[alunos[4].id]
+
+    # aluno novo: vai para o centróide mais próximo, sem mexer nos demais
+    novo = _aluno(banco, turma, 8)
+    _responder(banco, turma, novo, conteudo, (1, 9))
+    online = grupos_da_turma(turma.id, 2)
+    assert not online["reajustado"] and online["online"] == 1
+    assert online["clusters"] == {**antes, novo.id: antes[alunos[0].id]}
+
+    # reajuste cujo k-means numera os grupos ao contrário: o casamento desfaz a troca
+    kmeans_original = agrupamento.kmeans_np
+    chamadas = []
+
+    def kmeans_invertido(X, k, **kw):
+        labels, C = kmeans_original(X, k, **kw)
+        chamadas.append(k)
+        return (k - 1) - labels, C[::-1].copy()
+
+    monkeypatch.setattr(agrupamento, "kmeans_np", kmeans_invertido)
+    monkeypatch.setitem(app.config, "AGRUPAMENTO_LIMIAR_ALTERADOS", 0.0)
+    _responder(banco, turma, alunos[0], conteudo, (1, 9))
+    depois = grupos_da_turma(turma.id, 2)
+    assert depois["reajustado"] and chamadas
+    assert depois["clusters"] == online["clusters"]
+
+
+def test_drift_acima_do_limiar_reajusta(banco, app, monkeypatch):
+    monkeypatch.setitem(app.config, "AGRUPAMENTO_LIMIAR_INERCIA", 0.25)
+    monkeypatch.setitem(app.config, "AGRUPAMENTO_LIMIAR_ALTERADOS", 0.3)
+    turma, alunos, conteudo = _dois_grupos(banco)
+    assert grupos_da_turma(turma.id, 2)["reajustado"]
+
+    # dados iguais: nada a fazer
+    r = grupos_da_turma(turma.id, 2)
+    assert not r["reajustado"] and r["online"] == 0
+
+    # um aluno reatribuído (1 <= 0.3 * 8): só atribuição online
+    _responder(banco, turma, alunos[0], conteudo, (1, 9))
+    r = grupos_da_turma(turma.id, 2)
+    assert not r["reajustado"] and r["online"] == 1
+    assert CentroideTurma.query.one().alterados == 1
+
+    # mais dois (acumulado 3 > 2.4): reajuste, contador zerado
+    for aluno, erros in zip(alunos[4:6], FRACO_EM_A):
+        _responder(banco, turma, aluno, conteudo, erros)
+    r = grupos_da_turma(turma.id, 2)
+    assert r["reajustado"]
+    estado = CentroideTurma.query.one()
+    assert estado.alterados == 0
+    base = estado.inercia_ajuste
+
+    # um aluno que vai para o meio (taxa 0.5 x 0.5): inércia média passa de 1.25x a do ajuste
+    _responder(banco, turma, alunos[1], conteudo, (8, 1))
+    r = grupos_da_turma(turma.id, 2)
+    assert r["reajustado"]
+    assert CentroideTurma.query.one().inercia_ajuste > base * 1.25
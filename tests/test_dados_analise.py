@@ -0,0 +1,60 @@
+# tests/test_dados_analise.py
+from app.dados_analise import limpar_cache, snapshot_turma
+from app.modelos import (
+    Desafio, Disciplina, Interacao, Matricula, Pergunta, TentativaDesafio, Topico, Turma, Usuario,
+)
+
+
+def test_snapshot_poe_cada_topico_na_sua_coluna(banco):
+    turma = Turma(nome="T", codigo="T1")
+    calculo, algebra = Disciplina(nome="Cálculo"), Disciplina(nome="Álgebra")
+    banco.session.add_all([turma, calculo, algebra])
+    banco.session.flush()
+
+    # ids em ordem diferente da ordem por nome, alternando disciplinas
+    nomes = [("Zeta", calculo), ("Alfa", algebra), ("Meio", calculo), ("Beta", algebra), ("Kappa", calculo)]
+    topicos = []
+    for nome, disc in nomes:
+        t = Topico(nome=nome, disciplina_id=disc.id)
+        banco.session.add(t)
+        banco.session.flush()
+        topicos.append(t)
+
+    alunos = [Usuario(nome=f"Aluno {i}", email=f"a{i}@x", senha_hash="x") for i in range(2)]
+    banco.session.add_all(alunos)
+    banco.session.flush()
+    banco.session.add_all(Matricula(turma_id=turma.id, usuario_id=a.id, papel="aluno") for a in alunos)
+
+    esperado = {}
+    for k, topico in enumerate(topicos):
+        desafio = Desafio(topico_id=topico.id, titulo=f"D{k}")
+        banco.session.add(desafio)
+        banco.session.flush()
+        n = k + 2
+        perguntas = [Pergunta(desafio_id=desafio.id, enunciado="?", alt_a="1", alt_b="2", correta="a") for _ in range(n)]
+        banco.session.add_all(perguntas)
+        banco.session.flush()
+        for i, aluno in enumerate(alunos):
+            tent = TentativaDesafio(usuario_id=aluno.id, turma_id=turma.id, desafio_id=desafio.id,
+                                    topico_id=topico.id, finalizada=True)
+            banco.session.add(tent)
+            banco.session.flush()
+            erros = (k + i) % n
+            banco.session.add_all(
+                Interacao(tentativa_id=tent.id, pergunta_id=p.id, topico_id=topico.id,
+                          alternativa="b" if j < erros else "a", foi_correta=j >= erros)
+                for j, p in enumerate(perguntas)
+            )
+            esperado[(aluno.id, topico.nome)] = (n, erros)
+    banco.session.commit()
+    limpar_cache()
+
+    snap = snapshot_turma(turma.id)
+    assert snap.topico_nomes == sorted(n for n, _ in nomes)
+    for aluno in alunos:
+        linhas = snap.dados_por_topico(aluno.id)
+        assert {(l["topico_nome"]): (l["total"], l["erros"]) for l in linhas} == {
+            nome: v for (aid, nome), v in esperado.items() if aid == aluno.id
+        }
+        for l in linhas:
+            assert l["topico_id"] == next(t.id for t in topicos if t.nome == l["topico_nome"])
@@ -0,0 +1,32 @@
+# tests/test_estatisticas_itens.py
+from app.estatisticas_itens import _rodar
+from app.modelos import EstatisticaPergunta, Interacao
+from app.servicos import abrir_tentativa, registrar_interacao
+
+from test_tentativas import _cenario
+
+
+def _estatisticas(db):
+    db.session.expire_all()
+    return {e.pergunta_id: (e.respostas, e.acertos) for e in EstatisticaPergunta.query.all()}
+
+
+def test_segundo_plano_preenche_atualiza_e_refaz(app, banco):
+    turma, aluno, desafio, perguntas = _cenario(banco, n_perguntas=2)
+    tentativa, _ = abrir_tentativa(aluno.id, turma.id, desafio)
+    registrar_interacao(tentativa.id, perguntas[0].id, "a")
+
+    # banco novo: tabela vazia, o worker faz a passada completa
+    _rodar(app)
+    assert _estatisticas(banco) == {perguntas[0].id: (1, 1)}
+
+    # resposta nova: incremental
+    registrar_interacao(tentativa.id, perguntas[1].id, "b")
+    _rodar(app)
+    assert _estatisticas(banco) == {perguntas[0].id: (1, 1), perguntas[1].id: (1, 0)}
+
+    # resposta apagada: a marca não vale mais, refaz tudo
+    Interacao.query.filter_by(pergunta_id=perguntas[0].id).delete()
+    banco.session.commit()
+    _rodar(app)
+    assert _estatisticas(banco) == {perguntas[1].id: (1, 0)}
@@ -0,0 +1,72 @@
+# tests/test_imagens.py
+import io
+import os
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from app import imagens
+from app.servicos import abrir_tentativa
+
+from test_tentativas import _cenario
+
+
+class _PoolParado:
+    """Pool que aceita e não roda: o worker ainda não chegou na imagem."""
+
+    def submit(self, *args, **kwargs):
+        pass
+
+
+def _upload(largura=3000, altura=2000, orientacao=None):
+    buf = io.BytesIO()
+    exif = Image.Exif()
+    if orientacao:
+        exif[0x0112] = orientacao
+    Image.new("RGB", (largura, altura), (200, 40, 40)).save(buf, "JPEG", exif=exif)
+    buf.seek(0)
+    return FileStorage(buf, filename="foto.jpg")
+
+
+def test_upload_grava_o_principal_e_o_tutor_usa_ate_as_variantes_ficarem_prontas(app, banco, logar, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "static_folder", str(tmp_path / "static"))
+    monkeypatch.setattr(app, "instance_path", str(tmp_path / "instance"))
+    monkeypatch.setattr(imagens, "_pool", _PoolParado())
+    monkeypatch.setattr(imagens, "_pendentes", set())
+    monkeypatch.setattr(imagens, "_manifestos", {})
+
+    rel = imagens.salvar_upload(_upload(orientacao=6))  # EXIF: girar 90°
+    principal = os.path.join(app.static_folder, *rel.split("/"))
+    with Image.open(principal) as img:
+        assert img.size == (1440, 2160)  # girado e reduzido à maior largura
+        assert not img.getexif()
+
+    turma, aluno, desafio, _perguntas = _cenario(banco)
+    desafio.enunciado_imagem = rel
+    banco.session.commit()
+    abrir_tentativa(aluno.id, turma.id, desafio)
+    cliente = logar(aluno)
+
+    r = cliente.get(f"/api/tutor/desafio/{desafio.id}")
+    d = r.get_json()["desafio"]
+    assert d["enunciado_imagem"] is None and d["enunciado_imagem_url"].endswith(rel.rsplit("/", 1)[1])
+    assert r.headers["Cache-Control"] == "no-store" and "ETag" not in r.headers
+    assert imagens.imagem_pendente(rel)
+
+    # worker terminou: variantes com a versão no nome, resposta cacheável
+    imagens._rodar(app, rel)
+    r = cliente.get(f"/api/tutor/desafio/{desafio.id}")
+    d = r.get_json()["desafio"]
+    assert f"-{imagens.versao(app.config)}-1440.jpg" in d["enunciado_imagem"]["url"]
+    assert r.headers["ETag"]
+
+
+def test_mudar_a_config_muda_o_nome_das_variantes(app, monkeypatch):
+    vistas = {imagens.versao(app.config)}
+    monkeypatch.setitem(app.config, "IMAGENS_QUALIDADE_WEBP", 60)
+    vistas.add(imagens.versao(app.config))
+    monkeypatch.setitem(app.config, "IMAGENS_LARGURAS", (480, 960))
+    vistas.add(imagens.versao(app.config))
+    monkeypatch.setattr(imagens, "VERSAO_RENDER", "2")
+    vistas.add(imagens.versao(app.config))
+    assert len(vistas) == 4
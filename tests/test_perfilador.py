@@ -0,0 +1,24 @@
+# tests/test_perfilador.py
+import threading
+
+from flask_login import login_user
+
+from app.modelos import Usuario
+
+
+def _perfilando():
+    return [t for t in threading.enumerate() if t.name == "perfilador"]
+
+
+def test_teardown_desliga_o_amostrador_quando_a_view_falha(app, banco):
+    admin = Usuario(nome="Admin", email="admin@x", senha_hash="x", is_admin=True)
+    banco.session.add(admin)
+    banco.session.commit()
+
+    with app.test_request_context("/admin/?_perfil=json"):
+        login_user(admin)
+        app.preprocess_request()
+        assert _perfilando()
+        # exceção na view: after_request não roda, só o teardown
+        app.do_teardown_request(RuntimeError("falhou"))
+    assert not _perfilando()
@@ -0,0 +1,28 @@
+# tests/test_rotas_tutor.py
+from app.modelos import Disciplina
+from app.servicos import matricular
+
+from test_tentativas import _cenario
+
+
+def test_proximo_manda_o_estado_e_o_conteudo_vem_do_get_com_etag(banco, logar):
+    turma, aluno, desafio, perguntas = _cenario(banco, n_perguntas=2)
+    turma.disciplinas.append(Disciplina.query.one())
+    banco.session.commit()
+    matricular(aluno.id, turma.id)
+
+    cliente = logar(aluno)
+
+    estado = cliente.post("/api/tutor/proximo", json={"turma_id": turma.id}).get_json()
+    assert estado["desafio"] == {"id": desafio.id, "versao": desafio.versao}
+    assert estado["pergunta_id"] == perguntas[0].id
+    assert "pergunta" not in estado
+
+    r = cliente.get(f"/api/tutor/desafio/{desafio.id}")
+    assert r.status_code == 200 and r.headers["ETag"]
+    conteudo = r.get_json()
+    assert [p["id"] for p in conteudo["perguntas"]] == [p.id for p in perguntas]
+    assert "correta" not in conteudo["perguntas"][0]
+
+    r2 = cliente.get(f"/api/tutor/desafio/{desafio.id}", headers={"If-None-Match": r.headers["ETag"]})
+    assert r2.status_code == 304
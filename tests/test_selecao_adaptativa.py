@@ -0,0 +1,109 @@
+# tests/test_selecao_adaptativa.py
+import pytest
+
+from app import selecao_adaptativa
+from app.modelos import Desafio, Disciplina, Pergunta, Topico
+from app.selecao_adaptativa import limpar_filas, proximo_desafio_adaptativo
+from app.servicos import abrir_tentativa, matricular, registrar_interacao
+
+from test_tentativas import _cenario
+
+
+@pytest.fixture
+def adaptativa(app, monkeypatch):
+    monkeypatch.setitem(app.config, "TUTOR_SELECAO", "adaptativa")
+    limpar_filas()
+    yield
+    limpar_filas()
+
+
+def test_turma_sem_disciplinas_nao_recebe_desafios_de_outras(banco, adaptativa, logar):
+    turma, aluno, desafio, _perguntas = _cenario(banco)  # desafio de uma disciplina não ligada à turma
+    matricular(aluno.id, turma.id)
+
+    assert proximo_desafio_adaptativo(aluno.id, turma.id) is None
+    r = logar(aluno).post("/api/tutor/proximo", json={"turma_id": turma.id}).get_json()
+    assert r["done"] is True
+
+    # ligou a disciplina: a fila antiga cai (catálogo da turma mudou) e o desafio aparece
+    turma.disciplinas.append(Disciplina.query.one())
+    banco.session.commit()
+    assert proximo_desafio_adaptativo(aluno.id, turma.id).id == desafio.id
+
+
+def _dois_topicos(db):
+    """Turma com a disciplina ligada: tópico "Limites" (2 desafios) e "Derivadas" (1)."""
+    turma, aluno, a1, _perguntas = _cenario(db, n_perguntas=2)
+    disc = Disciplina.query.one()
+    turma.disciplinas.append(disc)
+    a2 = Desafio(topico_id=a1.topico_id, titulo="D2")
+    topico_b = Topico(nome="Derivadas", disciplina_id=disc.id)
+    db.session.add_all([a2, topico_b])
+    db.session.flush()
+    b1 = Desafio(topico_id=topico_b.id, titulo="B1")
+    db.session.add(b1)
+    db.session.flush()
+    db.session.add_all(
+        Pergunta(desafio_id=d.id, enunciado="?", alt_a="1", alt_b="2", correta="a") for d in (a2, b1)
+    )
+    db.session.commit()
+    matricular(aluno.id, turma.id)
+    return turma, aluno, a1, a2, b1
+
+
+def test_resposta_reposiciona_o_topico_e_a_entrada_antiga_cai(banco, adaptativa):
+    turma, aluno, a1, a2, b1 = _dois_topicos(banco)
+
+    # domínios iguais (P inicial): empate pela ordem original, Limites primeiro
+    assert proximo_desafio_adaptativo(aluno.id, turma.id).id == a1.id
+    fila = selecao_adaptativa._filas[(aluno.id, turma.id)]
+
+    tentativa, _ = abrir_tentativa(aluno.id, turma.id, a1)
+    assert proximo_desafio_adaptativo(aluno.id, turma.id).id == a2.id  # a1 saiu da deque
+
+    # acerto em Limites: P(dominou) sobe, Derivadas passa à frente sem remontar a fila
+    registrar_interacao(tentativa.id, a1.perguntas[0].id, "a")
+    assert selecao_adaptativa._filas[(aluno.id, turma.id)] is fila
+    assert fila.versao[a1.topico_id] == 1
+    assert proximo_desafio_adaptativo(aluno.id, turma.id).id == b1.id
+    # a entrada de versão 0 de Limites (empatada no topo) foi descartada
+    assert (a1.topico_id, 0) not in {(t, v) for _p, t, v in fila.heap}
+    assert (a1.topico_id, 1) in {(t, v) for _p, t, v in fila.heap}
+
+    # erros em Derivadas: o tópico volta para trás de Limites
+    tentativa.finalizada = True
+    banco.session.commit()
+    tb, _ = abrir_tentativa(aluno.id, turma.id, b1)
+    registrar_interacao(tb.id, b1.perguntas[0].id, "b")
+    assert fila.versao[b1.topico_id] == 1
+    assert proximo_desafio_adaptativo(aluno.id, turma.id).id == a2.id
+
+
+def test_mudanca_no_catalogo_descarta_a_fila(banco, adaptativa):
+    turma, aluno, a1, a2, b1 = _dois_topicos(banco)
+    chave = (aluno.id, turma.id)
+
+    # desafio novo (flush)
+    proximo_desafio_adaptativo(aluno.id, turma.id)
+    assert chave in selecao_adaptativa._filas
+    b2 = Desafio(topico_id=b1.topico_id, titulo="B2")
+    banco.session.add(b2)
+    banco.session.flush()
+    banco.session.add(Pergunta(desafio_id=b2.id, enunciado="?", alt_a="1", alt_b="2", correta="a"))
+    banco.session.commit()
+    assert chave not in selecao_adaptativa._filas
+    assert b2.id in selecao_adaptativa._fila(*chave).desafios[b1.topico_id]
+
+    # DELETE em massa (não passa pelo flush): o desafio sem perguntas some da fila
+    Pergunta.query.filter_by(desafio_id=b2.id).delete()
+    banco.session.commit()
+    assert chave not in selecao_adaptativa._filas
+    assert b2.id not in selecao_adaptativa._fila(*chave).desafios[b1.topico_id]
+
+    # tentativa apagada: o desafio volta a ser servido
+    tentativa, _ = abrir_tentativa(aluno.id, turma.id, a1)
+    assert a1.id not in selecao_adaptativa._fila(*chave).desafios[a1.topico_id]
+    banco.session.delete(tentativa)
+    banco.session.commit()
+    assert chave not in selecao_adaptativa._filas
+    assert proximo_desafio_adaptativo(aluno.id, turma.id).id == a1.id
@@ -0,0 +1,130 @@
+# tests/test_tentativas.py
+from app.modelos import Desafio, Disciplina, Pergunta, TentativaDesafio, Topico, Turma, Usuario
+from app.servicos import abrir_tentativa, finalizar_tentativa, matricular, registrar_interacao
+
+
+def _cenario(db, n_perguntas=3):
+    turma = Turma(nome="T", codigo="T1")
+    aluno = Usuario(nome="A", email="a@x", senha_hash="x")
+    disc = Disciplina(nome="Cálculo")
+    db.session.add_all([turma, aluno, disc])
+    db.session.flush()
+    topico = Topico(nome="Limites", disciplina_id=disc.id)
+    db.session.add(topico)
+    db.session.flush()
+    desafio = Desafio(topico_id=topico.id, titulo="D")
+    db.session.add(desafio)
+    db.session.flush()
+    perguntas = [
+        Pergunta(desafio_id=desafio.id, enunciado=f"P{i}", alt_a="1", alt_b="2", correta="a", ordem=i)
+        for i in range(n_perguntas)
+    ]
+    db.session.add_all(perguntas)
+    db.session.commit()
+    return turma, aluno, desafio, perguntas
+
+
+def _responder_tudo(tentativa, perguntas):
+    for i, p in enumerate(perguntas):
+        assert not tentativa.finalizada
+        assert tentativa.proxima_pergunta_id == p.id
+        registrar_interacao(tentativa.id, p.id, "a")
+        assert tentativa.respondidas == i + 1
+
+
+def test_duas_tentativas_no_mesmo_desafio_exigem_todas_as_perguntas(banco):
+    turma, aluno, desafio, perguntas = _cenario(banco)
+
+    primeira, criada = abrir_tentativa(aluno.id, turma.id, desafio)
+    assert criada
+    _responder_tudo(primeira, perguntas)
+    assert primeira.finalizada and primeira.proxima_pergunta_id is None
+    finalizar_tentativa(primeira.id)
+
+    # respostas da primeira tentativa não contam na segunda
+    segunda, criada = abrir_tentativa(aluno.id, turma.id, desafio)
+    assert criada and segunda.id != primeira.id
+    assert segunda.proxima_pergunta_id == perguntas[0].id
+    _responder_tudo(segunda, perguntas)
+    assert segunda.finalizada
+    assert TentativaDesafio.query.filter_by(desafio_id=desafio.id).count() == 2
+
+
+def test_finalizar_conta_a_tentativa_uma_vez(banco):
+    from app.metricas import desafios_finalizados_total
+
+    turma, aluno, desafio, perguntas = _cenario(banco, n_perguntas=2)
+    tentativa, _ = abrir_tentativa(aluno.id, turma.id, desafio)
+    _responder_tudo(tentativa, perguntas)
+
+    antes = desafios_finalizados_total.valor(dominou="true")
+    finalizar_tentativa(tentativa.id)
+    finalizar_tentativa(tentativa.id)  # retry / outra aba
+    assert desafios_finalizados_total.valor(dominou="true") == antes + 1
+    assert tentativa.dominou is True and tentativa.taxa_acerto_final == 1.0
+
+
+def test_registrar_interacao_devolve_o_que_gravou(banco):
+    turma, aluno, desafio, perguntas = _cenario(banco, n_perguntas=2)
+    tentativa, _ = abrir_tentativa(aluno.id, turma.id, desafio)
+
+    r = registrar_interacao(tentativa.id, perguntas[0].id, "B")
+    assert r == {"tentativa_id": tentativa.id, "pergunta_id": perguntas[0].id, "alternativa": "b", "foi_correta": False}
+    assert (tentativa.respondidas, tentativa.corretas) == (1, 0)
+
+    # sobrescreve a resposta: acerto muda, contadores acompanham
+    r = registrar_interacao(tentativa.id, perguntas[0].id, "a")
+    assert r["foi_correta"] is True and r["alternativa"] == "a"
+    assert (tentativa.respondidas, tentativa.corretas) == (1, 1)
+
+
+def _admin(db):
+    admin = Usuario(nome="Admin", email="admin@x", senha_hash="x", is_admin=True)
+    db.session.add(admin)
+    db.session.commit()
+    return admin
+
+
+def test_pergunta_criada_no_meio_da_tentativa_entra_nela(banco, logar):
+    turma, aluno, desafio, perguntas = _cenario(banco, n_perguntas=2)
+    tentativa, _ = abrir_tentativa(aluno.id, turma.id, desafio)
+    registrar_interacao(tentativa.id, perguntas[0].id, "a")
+
+    r = logar(_admin(banco)).post("/admin/atividades/", data={
+        "action": "create_pergunta", "desafio_id": desafio.id, "enunciado": "Nova",
+        "alt_a": "1", "alt_b": "2", "correta": "a",
+    })
+    assert r.status_code == 302
+    nova = Pergunta.query.filter_by(enunciado="Nova").one()
+
+    banco.session.refresh(tentativa)
+    assert tentativa.total_perguntas == 3
+    registrar_interacao(tentativa.id, perguntas[1].id, "a")
+    assert not tentativa.finalizada and tentativa.proxima_pergunta_id == nova.id
+    registrar_interacao(tentativa.id, nova.id, "a")
+    assert tentativa.finalizada
+
+
+def test_pergunta_removida_fecha_a_tentativa_pelo_finalizar(banco, logar):
+    from app.metricas import desafios_finalizados_total
+
+    turma, aluno, desafio, perguntas = _cenario(banco, n_perguntas=3)
+    turma.disciplinas.append(Disciplina.query.one())
+    banco.session.commit()
+    matricular(aluno.id, turma.id)
+    tentativa, _ = abrir_tentativa(aluno.id, turma.id, desafio)
+    registrar_interacao(tentativa.id, perguntas[0].id, "a")
+    registrar_interacao(tentativa.id, perguntas[1].id, "a")
+
+    # remove a última que faltava (não é só a "próxima" que é notada)
+    admin = logar(_admin(banco))
+    admin.post("/admin/atividades/", data={"action": "delete_pergunta", "id": perguntas[2].id})
+    banco.session.refresh(tentativa)
+    assert (tentativa.total_perguntas, tentativa.proxima_pergunta_id) == (2, None)
+
+    antes = desafios_finalizados_total.valor(dominou="true")
+    r = logar(aluno).post("/api/tutor/proximo", json={"turma_id": turma.id}).get_json()
+    assert r["fim_do_desafio"] is True
+    banco.session.refresh(tentativa)
+    assert tentativa.finalizada and tentativa.dominou is True and tentativa.taxa_acerto_final == 1.0
+    assert desafios_finalizados_total.valor(dominou="true") == antes + 1